@@ -1,6 +1,58 @@
-import pathlib
+import importlib
+import os
 import sys
 
+DEFAULT_PROJECT_ROOT_MARKERS = (".git", "pyproject.toml")
+
+#Submodules are imported on first attribute access rather than with the
+#package, so "import sharedlib" stays cheap for callers that only need the
+#project head helpers below, and errcode users do not pay for pyrsistent.
+#pathlib is imported by the helpers themselves for the same reason.
+SUBMODULES = frozenset((
+    "conflict_resolution",
+    "errcode_catalog",
+    "errcode_decoder",
+    "errcode_events",
+    "errcode_locale",
+    "errcode_shared",
+    "errcode_suppression",
+    "errcode_telemetry",
+    "error_handling",
+    "project_management",
+))
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+def __dir__():
+    return sorted(set(globals().keys()) | SUBMODULES)
+
+#Lookups are cached per working directory. Every cached result
+#only holds for the directory it was computed from, so the
+#whole cache is dropped as soon as the working directory changes.
+__project_head_cache = {}
+__project_head_cache_cwd = None
+
+def __get_project_head_cache():
+    global __project_head_cache
+    global __project_head_cache_cwd
+
+    curr_dir = os.getcwd()
+    if curr_dir != __project_head_cache_cwd:
+        __project_head_cache = {}
+        __project_head_cache_cwd = curr_dir
+
+    return curr_dir, __project_head_cache
+
+def clear_project_head_cache():
+    global __project_head_cache
+    global __project_head_cache_cwd
+
+    __project_head_cache = {}
+    __project_head_cache_cwd = None
+
 def get_project_head(head_dir_name=None):
     if head_dir_name is None:
         raise ValueError("head_dir_name cannot be None.")
@@ -8,24 +60,74 @@ def get_project_head(head_dir_name=None):
     if type(head_dir_name) != str:
         raise ValueError("head_dir_name must be a str.")
 
+    curr_dir, cache = __get_project_head_cache()
+    key = ("head", head_dir_name)
+    retval = cache.get(key)
+    if retval is not None:
+        return retval
+
+    import pathlib
+    path_parts = pathlib.Path(curr_dir).parts
     index = -1
-    proj_head_path = None
-    curr_dir = pathlib.Path.cwd()
-    path_parts = curr_dir.parts
 
-    for i in range(0,len(path_parts)):
+    #We want the deepest match, so search from the end.
+    for i in range(len(path_parts) - 1, -1, -1):
         if path_parts[i] == head_dir_name:
             index = i
+            break
 
     if index < 0:
-        return False, None
-    index = index + 1
-    proj_head_path = pathlib.Path(path_parts[0])
+        retval = (False, None)
+    else:
+        retval = (True, pathlib.Path(*path_parts[:index + 1]))
+
+    cache[key] = retval
+    return retval
+
+#Walks upward from the current working directory until it finds
+#a directory containing at least one of the marker files/directories.
+#Only plain string operations are used while walking; a single Path
+#is built for the result.
+def find_project_root(markers=DEFAULT_PROJECT_ROOT_MARKERS):
+    if markers is None:
+        raise ValueError("markers cannot be None.")
+
+    if isinstance(markers, str):
+        markers = (markers,)
+    else:
+        markers = tuple(markers)
+
+    if len(markers) == 0:
+        raise ValueError("markers cannot be empty.")
+
+    for var in markers:
+        if type(var) != str:
+            raise ValueError("markers must only contain str values.")
+
+    curr_dir, cache = __get_project_head_cache()
+    key = ("markers", markers)
+    retval = cache.get(key)
+    if retval is not None:
+        return retval
 
-    for i in range (0,index):
-        proj_head_path = proj_head_path / path_parts[i]
-        
-    return True, proj_head_path
+    retval = (False, None)
+    candidate = curr_dir
+    while True:
+        found = False
+        for var in markers:
+            if os.path.exists(os.path.join(candidate, var)):
+                found = True
+                break
 
+        if found:
+            import pathlib
+            retval = (True, pathlib.Path(candidate))
+            break
 
+        parent = os.path.dirname(candidate)
+        if parent == candidate:
+            break
+        candidate = parent
 
+    cache[key] = retval
+    return retval
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import pathlib
+import random
+import sys
+import time
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import error_handling
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MOD_NAME = "bench_mod"
+
+#Like timeit, the collector is switched off while timing.
+def timed(function, *args):
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        function(*args)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+def lookupPerCall(handler, codes):
+    getMessage = handler.getMessage
+    return [getMessage(MOD_NAME, code) for code in codes]
+
+def lookupBatch(handler, codes):
+    return handler.getMessages(MOD_NAME, codes)
+
+def makeHandler(errcode_count, freeze):
+    handler = error_handling.ErrcodeHandler()
+    handler.registerErrcodes(
+        [(MOD_NAME, "ERR_{0}".format(i), "Errcode {0}".format(i), i) for i in range(0, errcode_count)])
+    if freeze is not None:
+        handler.freeze(compact = (freeze == "compact"))
+    return handler
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Compare per-call and batch errcode message lookups.")
+    parser.add_argument("--errcodes", type = int, default = 1000)
+    parser.add_argument("--lookups", type = int, default = 1000000)
+    parser.add_argument("--repeat", type = int, default = 3)
+    args = parser.parse_args(argv)
+
+    codes = [random.randrange(0, args.errcodes) for i in range(0, args.lookups)]
+    inputs = [("list", codes)]
+    if numpy is not None:
+        inputs.append(("numpy", numpy.array(codes, dtype = numpy.uint64)))
+
+    for freeze in (None, "columns", "compact"):
+        handler = makeHandler(args.errcodes, freeze)
+        per_call = min(timed(lookupPerCall, handler, codes) for i in range(0, args.repeat))
+        results = []
+        for (label, batch_codes) in inputs:
+            batch = min(timed(lookupBatch, handler, batch_codes) for i in range(0, args.repeat))
+            results.append("getMessages({0}) {1:>12,.0f} codes/s ({2:.1f}x)".format(
+                label, args.lookups / batch, per_call / batch))
+        print("{0:>8}: getMessage {1:>12,.0f} codes/s | {2}".format(
+            freeze or "dict", args.lookups / per_call, " | ".join(results)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import argparse
+import pathlib
+import sys
+import threading
+import time
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import error_handling
+
+MOD_NAME = "bench_mod"
+
+def populate(handler, count):
+    handler.registerErrcodes(
+        [(MOD_NAME, "ERR_{0}".format(i), "Errcode {0}".format(i), i) for i in range(0, count)])
+
+#Readers look up existing codes by number and name while one writer keeps
+#registering new ones. Every reader error is collected, so this doubles as a
+#stress test.
+def run(handler, readers, duration, preloaded):
+    stop = threading.Event()
+    errors = []
+    reads = [0] * readers
+    writes = [0]
+
+    def reader(slot):
+        count = 0
+        try:
+            while not stop.is_set():
+                for i in range(0, 100):
+                    number = (count + i) % preloaded
+                    handler.getMessage(MOD_NAME, number)
+                    handler.getMessage(MOD_NAME, "ERR_{0}".format(number))
+                count = count + 100
+        except Exception as err:
+            errors.append(err)
+        reads[slot] = count * 2
+
+    def writer():
+        count = 0
+        try:
+            while not stop.is_set():
+                number = preloaded + count
+                handler.registerErrcode(MOD_NAME, "ERR_{0}".format(number), "Errcode {0}".format(number), number)
+                count = count + 1
+        except Exception as err:
+            errors.append(err)
+        writes[0] = count
+
+    threads = [threading.Thread(target = reader, args = (i,)) for i in range(0, readers)]
+    threads.append(threading.Thread(target = writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return sum(reads) / duration, writes[0] / duration, errors
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Concurrent errcode lookup/registration stress and throughput benchmark.")
+    parser.add_argument("--readers", type = int, default = 4)
+    parser.add_argument("--duration", type = float, default = 2.0)
+    parser.add_argument("--preloaded", type = int, default = 10000)
+    args = parser.parse_args(argv)
+
+    for handler_class in (error_handling.ErrcodeHandler, error_handling.ConcurrentErrcodeHandler):
+        handler = handler_class()
+        populate(handler, args.preloaded)
+        read_rate, write_rate, errors = run(handler, args.readers, args.duration, args.preloaded)
+        print("{0:>25}: {1:>12,.0f} lookups/s | {2:>10,.0f} registrations/s | {3} reader/writer errors".format(
+            handler_class.__name__, read_rate, write_rate, len(errors)))
+        for err in errors[:5]:
+            print("    {0!r}".format(err))
+
+if __name__ == "__main__":
+    main()
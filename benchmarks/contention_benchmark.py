@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import pathlib
+import sys
+import threading
+import time
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import conflict_resolution
+
+#Commit throughput with many threads committing to one VersionedCommittable,
+#with optimistic compare-and-commit (retryCommit) next to a lock held over
+#the whole read-modify-write. Every thread bumps a counter of its own, or
+#with --shared-key all of them bump the same one; the retries column is the
+#number of lost races per commit. Like timeit, the collector is switched
+#off while timing.
+
+def optimistic(committable, lock, key, commits, calls):
+    def update(snapshot):
+        calls.append(None)
+        return {key: snapshot.get(key, 0) + 1}
+
+    for i in range(0, commits):
+        conflict_resolution.retryCommit(committable, update, 1000000)
+
+def locked(committable, lock, key, commits, calls):
+    for i in range(0, commits):
+        with lock:
+            calls.append(None)
+            committable.set(key, committable.get(key, 0) + 1)
+            committable.commit()
+
+def run(worker, threads, commits, shared_key):
+    committable = conflict_resolution.VersionedCommittable({"key{0}".format(i): 0 for i in range(0, 1000)})
+    lock = threading.Lock()
+    calls = []
+    workers = [threading.Thread(target = worker, args = (committable, lock, "shared" if shared_key else "thread{0}".format(i), commits, calls))
+               for i in range(0, threads)]
+
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+
+    total = threads * commits
+    if committable.getVersion() != total:
+        raise RuntimeError("Lost commits: {0} of {1} committed.".format(committable.getVersion(), total))
+    return elapsed, total, len(calls) - total
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Commit throughput under contention.")
+    parser.add_argument("--threads", type = int, nargs = "+", default = [1, 2, 4, 8, 16, 32])
+    parser.add_argument("--commits", type = int, default = 2000, help = "Commits per thread.")
+    parser.add_argument("--shared-key", action = "store_true", help = "All threads update the same key.")
+    args = parser.parse_args(argv)
+
+    for threads in args.threads:
+        for (label, worker) in (("compare-and-commit", optimistic), ("lock", locked)):
+            elapsed, total, retries = run(worker, threads, args.commits, args.shared_key)
+            print("{0:>3} threads {1:>18}: {2:>10.0f} commits/s | {3:>6.3f} retries per commit".format(
+                threads, label, total / elapsed, retries / total))
+
+if __name__ == "__main__":
+    main()
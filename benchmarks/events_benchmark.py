@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import errcode_events
+
+MOD_NAME = "bench_mod"
+
+#What recording an error costs the code that hit it: writing the event out
+#synchronously against pushing it into the pipeline.
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Error path cost of synchronous and pipelined event recording.")
+    parser.add_argument("--events", type = int, default = 200000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "events.jsonl")
+        with open(path, "a") as output:
+            start = time.perf_counter()
+            for i in range(0, args.events):
+                output.write(json.dumps({"mod_name": MOD_NAME, "errcode": i, "context": None,
+                                         "timestamp": time.time()}) + "\n")
+                output.flush()
+            synchronous = time.perf_counter() - start
+
+        sink = errcode_events.JSONLinesEventSink(path)
+        with errcode_events.ErrcodeEventPipeline(sink, capacity = args.events) as pipeline:
+            start = time.perf_counter()
+            for i in range(0, args.events):
+                pipeline.push(MOD_NAME, i)
+            pushed = time.perf_counter() - start
+        total = time.perf_counter() - start
+
+    print("synchronous write: {0:>6.0f} ns/event | push: {1:>6.0f} ns/event ({2:.1f}x) | push + drain: {3:.2f}s, {4} dropped".format(
+        synchronous / args.events * 1e9, pushed / args.events * 1e9, synchronous / pushed, total, pipeline.dropped))
+
+if __name__ == "__main__":
+    main()
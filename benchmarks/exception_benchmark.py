@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import argparse
+import pathlib
+import sys
+import timeit
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import error_handling
+
+MOD_NAME = "bench_mod"
+
+#Raises from "depth" frames down, so unwinding is part of the cost.
+def nested(depth, function):
+    if depth <= 1:
+        function()
+    else:
+        nested(depth - 1, function)
+
+def raiseAndCatch(depth, function, catch):
+    try:
+        nested(depth, function)
+    except catch:
+        pass
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Raise-and-catch cost of errcode exceptions.")
+    parser.add_argument("--number", type = int, default = 200000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    parser.add_argument("--depth", type = int, default = 1)
+    args = parser.parse_args(argv)
+
+    handler = error_handling.ErrcodeHandler()
+    handler.registerErrcode(MOD_NAME, "InvalidField", "Field {0} is invalid", 1)
+    invalid_field = handler.getErrcodeException(MOD_NAME, "InvalidField")
+    invalid_field_light = handler.getErrcodeException(MOD_NAME, "InvalidField", lightweight = True)
+
+    def handFormatted():
+        raise ValueError(handler.getMessage(MOD_NAME, 1).format("name"))
+
+    def cachedClass():
+        raise invalid_field("name")
+
+    def lightweightClass():
+        raise invalid_field_light("name")
+
+    def viaHandler():
+        handler.raiseErrcode(MOD_NAME, 1, "name")
+
+    cases = (
+        ("getMessage + ValueError", handFormatted, ValueError),
+        ("raiseErrcode", viaHandler, error_handling.ErrcodeException),
+        ("cached class", cachedClass, error_handling.ErrcodeException),
+        ("lightweight class", lightweightClass, error_handling.ErrcodeException),
+    )
+
+    print("raise and catch, {0} frame(s) deep:".format(args.depth))
+    baseline = None
+    for (label, function, catch) in cases:
+        best = min(timeit.repeat(lambda: raiseAndCatch(args.depth, function, catch),
+                                 number = args.number, repeat = args.repeat))
+        per_raise = best / args.number * 1e9
+        if baseline is None:
+            baseline = per_raise
+        print("    {0:>24}: {1:>8.0f} ns | {2:.2f}x".format(label, per_raise, baseline / per_raise))
+
+if __name__ == "__main__":
+    main()
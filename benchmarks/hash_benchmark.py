@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import pathlib
+import sys
+import time
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import conflict_resolution
+
+#Content hash cost per commit: hashed from the parent's hash and the delta,
+#next to hashing every entry again, and the cost of comparing two hashed
+#snapshots. Like timeit, the collector is switched off while timing.
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Cost of content hashing versioned snapshots.")
+    parser.add_argument("--keys", type = int, default = 100000)
+    parser.add_argument("--versions", type = int, default = 50)
+    parser.add_argument("--changes", type = int, default = 10, help = "Keys changed per commit.")
+    args = parser.parse_args(argv)
+
+    committable = conflict_resolution.VersionedCommittable({"key{0}".format(i): [i, str(i)] for i in range(0, args.keys)})
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        committable.getSnapshot().getContentHash()
+        initial = time.perf_counter() - start
+
+        snapshots = []
+        start = time.perf_counter()
+        for version in range(0, args.versions):
+            for i in range(0, args.changes):
+                committable.set("key{0}".format((version * args.changes + i) % args.keys), -version)
+            snapshots.append(committable.commit())
+        incremental = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for snapshot in snapshots[:5]:
+            conflict_resolution.contentHash(dict(snapshot))
+        full = (time.perf_counter() - start) / min(5, len(snapshots))
+
+        start = time.perf_counter()
+        for snapshot in snapshots:
+            snapshot == snapshots[0]
+        compare = time.perf_counter() - start
+    finally:
+        gc.enable()
+
+    print("{0:>28}: {1:>10.1f} ms".format("first full hash", initial * 1e3))
+    print("{0:>28}: {1:>10.1f} us".format("commit with incremental hash", incremental / args.versions * 1e6))
+    print("{0:>28}: {1:>10.1f} ms".format("full rehash per version", full * 1e3))
+    print("{0:>28}: {1:>10.3f} us".format("equality check", compare / args.versions * 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import argparse
+import compileall
+import os
+import pathlib
+import subprocess
+import sys
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+
+#Cold-import budget check.
+#
+#Every module is imported in a fresh interpreter with -X importtime, and
+#the best cumulative time of --repeat runs is held against its budget. The
+#modules a cheap import must not pull in are checked as well; that part does
+#not depend on the speed of the machine.
+#Exits with 1 when a budget is exceeded or a forbidden module is imported.
+
+PACKAGE_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+#Milliseconds, with about twice the headroom of a development machine.
+BUDGETS = {
+    "sharedlib": 5.0,
+    "sharedlib.error_handling": 40.0,
+    "sharedlib.project_management": 120.0,
+}
+
+FORBIDDEN = {
+    "sharedlib": ("pathlib", "pyrsistent", "sharedlib.error_handling", "sharedlib.project_management"),
+    "sharedlib.error_handling": ("pyrsistent", "asyncio", "random", "string", "traceback"),
+    "sharedlib.project_management": ("unittest.mock",),
+}
+
+def importTime(module, env):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import {0}".format(module)],
+                            capture_output = True, text = True, env = env, check = True)
+    imported = set()
+    cumulative = None
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        imported.add(name)
+        if name == module:
+            cumulative = int(fields[1]) / 1000.0
+    return cumulative, imported
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Check the cold-import time of sharedlib against its budget.")
+    parser.add_argument("--repeat", type = int, default = 5)
+    parser.add_argument("--scale", type = float, default = 1.0,
+                        help = "Multiply every budget, e.g. for slow CI machines.")
+    args = parser.parse_args(argv)
+
+    #Timings must not include compiling, which PYTHONDONTWRITEBYTECODE would
+    #otherwise repeat on every run.
+    compileall.compile_dir(str(PACKAGE_DIR), quiet = 1)
+    env = dict(os.environ, PYTHONPATH = os.pathsep.join(sys.path))
+
+    failures = []
+    for (module, budget) in BUDGETS.items():
+        best = None
+        imported = set()
+        for i in range(0, args.repeat):
+            cumulative, imported = importTime(module, env)
+            if best is None or cumulative < best:
+                best = cumulative
+
+        budget = budget * args.scale
+        status = "ok"
+        if best > budget:
+            status = "OVER BUDGET"
+            failures.append(module)
+        print("{0:>30}: {1:>7.1f} ms (budget {2:>6.1f} ms) {3}".format(module, best, budget, status))
+
+        for name in FORBIDDEN.get(module, ()):
+            if name in imported:
+                print("{0:>30}  imports {1}".format("", name))
+                failures.append("{0} -> {1}".format(module, name))
+
+    if len(failures) > 0:
+        print("Import budget exceeded: {0}".format(", ".join(failures)))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
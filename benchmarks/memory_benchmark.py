@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import pathlib
+import sys
+import tracemalloc
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import error_handling
+
+MOD_NAME = "bench_mod"
+DISTINCT_MESSAGES = 100
+
+#The Errcode layout before __slots__: every record carries its own __dict__.
+class DictErrcode(error_handling.Errcode):
+    pass
+
+#Messages are rebuilt per row, so equal messages are equal but distinct
+#objects, as they would be when read from a file or a database.
+def makeRows(count):
+    return [
+        (MOD_NAME, "ERR_{0}".format(i), "".join(["Errcode failure ", str(i % DISTINCT_MESSAGES)]), i)
+        for i in range(0, count)
+    ]
+
+def measure(count, errcode_class, intern_strings, freeze):
+    original_errcode = error_handling.Errcode
+    original_intern = error_handling.ErrcodeHandler.INTERN_STRINGS
+    error_handling.Errcode = errcode_class
+    error_handling.ErrcodeHandler.INTERN_STRINGS = intern_strings
+    try:
+        gc.collect()
+        tracemalloc.start()
+        handler = error_handling.ErrcodeHandler()
+        rows = makeRows(count)
+        handler.registerErrcodes(rows)
+        if freeze is not None:
+            handler.freeze(compact = (freeze == "compact"))
+        rows = None
+        gc.collect()
+        retval = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        handler = None
+        return retval
+    finally:
+        error_handling.Errcode = original_errcode
+        error_handling.ErrcodeHandler.INTERN_STRINGS = original_intern
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Resident memory of the errcode registry per storage layout.")
+    parser.add_argument("--counts", type = int, nargs = "+", default = [100000, 1000000])
+    args = parser.parse_args(argv)
+
+    layouts = (
+        ("dict Errcode (before)", DictErrcode, False, None),
+        ("slotted Errcode", error_handling.Errcode, False, None),
+        ("slotted + interned", error_handling.Errcode, True, None),
+        ("frozen columns", error_handling.Errcode, False, "columns"),
+        ("frozen + interned", error_handling.Errcode, True, "columns"),
+        ("frozen compact", error_handling.Errcode, False, "compact"),
+    )
+
+    for count in args.counts:
+        print("{0:,} codes, {1} distinct messages:".format(count, DISTINCT_MESSAGES))
+        baseline = None
+        for (label, errcode_class, intern_strings, freeze) in layouts:
+            used = measure(count, errcode_class, intern_strings, freeze)
+            if baseline is None:
+                baseline = used
+            print("    {0:>22}: {1:>8.1f} MiB | {2:>6.1f} bytes/code | {3:>5.2f}x of before".format(
+                label, used / (1024 * 1024), used / count, used / baseline))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import pathlib
+import sys
+import time
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import conflict_resolution
+
+#Three-way merge of two forks of a big map that each changed a few keys,
+#through every diff path: recorded deltas, shared hash buckets of the PMaps
+#and a key by key comparison of dicts. Only the recorded deltas scale with
+#the size of the change; the bucket path still visits every bucket. Like
+#timeit, the collector is switched off while timing.
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Three-way merge cost per diff path.")
+    parser.add_argument("--keys", type = int, default = 1000000)
+    parser.add_argument("--changes", type = int, default = 10, help = "Keys changed on each side.")
+    args = parser.parse_args(argv)
+
+    committable = conflict_resolution.VersionedCommittable({i: i for i in range(0, args.keys)})
+    base = committable.getSnapshot()
+    fork = committable.fork()
+    for i in range(0, args.changes):
+        committable.set(i, "ours")
+        fork.set(args.keys - i - 1, "theirs")
+    committable.set(args.keys // 2, "ours")
+    fork.set(args.keys // 2, "theirs")
+    ours = committable.commit()
+    theirs = fork.commit()
+
+    cases = (
+        ("recorded deltas", (base, ours, theirs)),
+        ("shared PMap buckets", (base.data, ours.data, theirs.data)),
+        ("dicts", (dict(base), dict(ours), dict(theirs))),
+    )
+    for (label, snapshots) in cases:
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = conflict_resolution.threeWayMerge(*snapshots)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        print("{0:>20}: {1:>10.3f} ms | {2} applied, {3} conflict(s)".format(
+            label, elapsed * 1e3, len(result.applied), len(result.conflicts)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import pathlib
+import sys
+import time
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import error_handling
+
+def makeRows(count, mod_name, with_numbers):
+    rows = []
+    for i in range(0, count):
+        if with_numbers:
+            rows.append((mod_name, "ERR_{0}".format(i), "Errcode {0}".format(i), i))
+        else:
+            rows.append((mod_name, "ERR_{0}".format(i), "Errcode {0}".format(i)))
+    return rows
+
+#Like timeit, the collector is switched off while timing.
+def timed(function, *args):
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        function(*args)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+def registerPerCall(rows):
+    handler = error_handling.ErrcodeHandler()
+    for row in rows:
+        handler.registerErrcode(*row)
+
+def registerBulk(rows):
+    error_handling.ErrcodeHandler().registerErrcodes(rows)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Compare per-call and bulk errcode registration throughput.")
+    parser.add_argument("--count", type = int, default = 100000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args(argv)
+
+    for with_numbers in (True, False):
+        rows = makeRows(args.count, "bench_mod", with_numbers)
+        per_call = min(timed(registerPerCall, rows) for i in range(0, args.repeat))
+        bulk = min(timed(registerBulk, rows) for i in range(0, args.repeat))
+        label = "explicit numbers" if with_numbers else "allocated numbers"
+        print("{0:>18}: registerErrcode {1:>12,.0f} codes/s | registerErrcodes {2:>12,.0f} codes/s | {3:.2f}x".format(
+            label, args.count / per_call, args.count / bulk, per_call / bulk))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+import argparse
+import compileall
+import gc
+import json
+import os
+import pathlib
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import error_handling
+
+#Errcode registry benchmark suite with a stored baseline.
+#
+#Every metric is a cost, so lower is better:
+#  register/<n>       ns per code, registerErrcodes of n codes in one module
+#  name_lookup/<n>    ns per getMessage by name in a module of n codes
+#  number_lookup/<n>  ns per getMessage by number in a module of n codes
+#  generate/<allocator>/<n>
+#                     ns per generated number in a module already holding n
+#                     codes, numbered densely from 1 so sequential and
+#                     probing allocators run into them
+#  memory/<n>         bytes per code held by a handler of n codes
+#  import             ms to import sharedlib.error_handling in a fresh
+#                     interpreter, -X importtime
+#  calibration        ms of a fixed dict workload that does not touch the
+#                     registry
+#
+#Timings are compared after scaling by the calibration ratio, so a machine
+#that is slower or busier as a whole does not show up as a regression.
+#
+#Usage:
+#    regression_suite.py --save     measure and store the baseline
+#    regression_suite.py            measure and compare with the baseline;
+#                                   exits with 1 when a metric is more than
+#                                   --threshold worse than its baseline
+#
+#Baselines are only comparable on the machine and Python they were taken
+#with, which are recorded in the file.
+
+MOD_NAME = "bench_mod"
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+DEFAULT_BASELINE = pathlib.Path(__file__).resolve().parent / "baseline.json"
+LOOKUPS = 100000
+GENERATED = 5000
+
+ALLOCATORS = (
+    ("random", error_handling.RandomErrcodeAllocator),
+    ("sequential", error_handling.SequentialErrcodeAllocator),
+    ("hash", error_handling.HashErrcodeAllocator),
+    ("packed", error_handling.ModulePackedErrcodeAllocator),
+)
+
+def makeRows(count):
+    return [(MOD_NAME, "ERR_{0}".format(i), "Errcode {0}".format(i), i) for i in range(1, count + 1)]
+
+def makeHandler(count, allocator = None):
+    handler = error_handling.ErrcodeHandler(allocator)
+    handler.registerErrcodes(makeRows(count))
+    return handler
+
+#Best of "repeat" runs of function(), in seconds. Like timeit, the collector
+#is switched off while timing.
+def timed(function, repeat):
+    best = None
+    for i in range(0, repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def measureRegister(count, repeat):
+    rows = makeRows(count)
+    return timed(lambda: error_handling.ErrcodeHandler().registerErrcodes(rows), repeat) / count * 1e9
+
+def measureLookups(count, repeat):
+    handler = makeHandler(count)
+    picker = random.Random(count)
+    numbers = [picker.randint(1, count) for i in range(0, LOOKUPS)]
+    names = ["ERR_{0}".format(x) for x in numbers]
+    getMessage = handler.getMessage
+
+    def lookup(inputs):
+        for errcode_input in inputs:
+            getMessage(MOD_NAME, errcode_input)
+
+    return (timed(lambda: lookup(names), repeat) / LOOKUPS * 1e9,
+            timed(lambda: lookup(numbers), repeat) / LOOKUPS * 1e9)
+
+def measureGenerate(count, allocator_class, repeat):
+    #Each run needs a module at the same occupancy, so the handlers are
+    #built up front and the registrations of a run only add GENERATED codes.
+    handlers = [makeHandler(count, allocator_class()) for i in range(0, repeat)]
+
+    def generate():
+        handler = handlers.pop()
+        for i in range(0, GENERATED):
+            handler.registerErrcode(MOD_NAME, "NEW_{0}".format(i), "Generated")
+
+    return timed(generate, repeat) / GENERATED * 1e9
+
+def measureMemory(count):
+    rows = makeRows(count)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        handler = error_handling.ErrcodeHandler()
+        handler.registerErrcodes(rows)
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    handler = None
+    return used / count
+
+#Cumulative import time of sharedlib.error_handling and everything it pulls
+#in, from the -X importtime report of a fresh interpreter. The "sharedlib"
+#row is only the package __init__, nested under sharedlib.error_handling,
+#so the row of the module itself is the one to read.
+def measureImport(repeat):
+    #Timings must not include compiling, which PYTHONDONTWRITEBYTECODE would
+    #otherwise repeat on every run.
+    compileall.compile_dir(str(pathlib.Path(__file__).resolve().parent.parent), quiet = 1)
+    env = dict(os.environ, PYTHONPATH = os.pathsep.join(sys.path))
+    best = None
+    for i in range(0, repeat):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import sharedlib.error_handling"],
+                                capture_output = True, text = True, env = env, check = True)
+        cumulative = 0
+        for line in result.stderr.splitlines():
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == "sharedlib.error_handling":
+                cumulative = int(fields[1])
+        if best is None or cumulative < best:
+            best = cumulative
+    return best / 1000.0
+
+def calibrate():
+    table = {}
+    for i in range(0, 200000):
+        table[i] = i
+    for i in range(0, 200000):
+        table.get(i)
+
+def runSuite(sizes, repeat):
+    metrics = {}
+    calibration = timed(calibrate, repeat)
+    for count in sizes:
+        #The biggest sizes take seconds per run, so they are repeated less.
+        runs = repeat if count < 1000000 else 1
+        metrics["register/{0}".format(count)] = measureRegister(count, runs)
+        name_lookup, number_lookup = measureLookups(count, repeat)
+        metrics["name_lookup/{0}".format(count)] = name_lookup
+        metrics["number_lookup/{0}".format(count)] = number_lookup
+        for (label, allocator_class) in ALLOCATORS:
+            metrics["generate/{0}/{1}".format(label, count)] = measureGenerate(count, allocator_class, runs)
+        metrics["memory/{0}".format(count)] = measureMemory(count)
+        print("measured {0:,} codes".format(count), file = sys.stderr)
+    metrics["import"] = measureImport(repeat)
+    metrics["calibration"] = min(calibration, timed(calibrate, repeat)) * 1e3
+    return metrics
+
+def describeMachine():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+    }
+
+#Returns the names of the metrics more than "threshold" (a fraction) worse
+#than their baseline value, printing every metric on the way.
+def compare(metrics, baseline, threshold):
+    speed = 1.0
+    if baseline.get("calibration", 0) > 0:
+        speed = metrics["calibration"] / baseline["calibration"]
+        print("machine speed factor vs baseline: {0:.2f}x".format(speed))
+
+    regressions = []
+    for (name, value) in metrics.items():
+        reference = baseline.get(name)
+        if reference is None or reference <= 0:
+            print("{0:>28}: {1:>12.1f}            (no baseline)".format(name, value))
+            continue
+
+        ratio = value / reference
+        if name != "calibration" and not name.startswith("memory/"):
+            ratio = ratio / speed
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("{0:>28}: {1:>12.1f} {2:>12.1f} {3:>6.2f}x{4}".format(name, value, reference, ratio, flag))
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Errcode registry benchmark suite with regression checks.")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = DEFAULT_SIZES)
+    parser.add_argument("--repeat", type = int, default = 5)
+    parser.add_argument("--baseline", default = str(DEFAULT_BASELINE))
+    parser.add_argument("--threshold", type = float, default = 0.25,
+                        help = "Fraction a metric may worsen before it counts as a regression.")
+    parser.add_argument("--save", action = "store_true", help = "Store the results as the new baseline.")
+    args = parser.parse_args(argv)
+
+    metrics = runSuite(args.sizes, args.repeat)
+    if args.save:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump({"machine": describeMachine(), "metrics": metrics}, baseline_file, indent = 2, sort_keys = True)
+            baseline_file.write("\n")
+        for (name, value) in metrics.items():
+            print("{0:>28}: {1:>12.1f}".format(name, value))
+        return 0
+
+    try:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        baseline = {"machine": None, "metrics": {}}
+    if baseline["machine"] is not None and baseline["machine"] != describeMachine():
+        print("warning: the baseline was taken on {0}".format(baseline["machine"]), file = sys.stderr)
+
+    print("{0:>28}  {1:>12} {2:>12} {3:>7}".format("metric", "current", "baseline", "ratio"))
+    regressions = compare(metrics, baseline["metrics"], args.threshold)
+    if len(regressions) > 0:
+        print("{0} regression(s) beyond {1:.0%}: {2}".format(len(regressions), args.threshold, ", ".join(regressions)))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import argparse
+import multiprocessing
+import pathlib
+import sys
+import time
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import error_handling
+from sharedlib import errcode_shared
+
+MOD_NAME = "bench_mod"
+
+#Memory only this process holds, in KiB (Linux).
+def privateMemory():
+    total = 0
+    with open("/proc/self/smaps_rollup") as smaps:
+        for line in smaps:
+            if line.startswith("Private_"):
+                total = total + int(line.split()[1])
+    return total
+
+def makeRows(count):
+    return [(MOD_NAME, "Errcode{0}".format(i), "Message of errcode {0}".format(i), i) for i in range(1, count + 1)]
+
+#Builds the registry the way a worker would, then looks every errcode up.
+def startWorker(mode, count):
+    before = privateMemory()
+    start = time.perf_counter()
+    if mode == "register":
+        handler = error_handling.ErrcodeHandler()
+        handler.registerErrcodes(makeRows(count))
+        handler.freeze(compact = True)
+    else:
+        errcode_shared.installFromEnvironment()
+        handler = error_handling.ErrcodeHandler.instance
+    elapsed = time.perf_counter() - start
+    handler.getMessages(MOD_NAME, range(1, count + 1))
+    return elapsed, privateMemory() - before
+
+#Start-up time and private memory of spawned workers that register the
+#errcodes themselves, next to workers attaching to the published registry.
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Worker start-up with a shared errcode registry.")
+    parser.add_argument("--errcodes", type = int, default = 100000)
+    parser.add_argument("--workers", type = int, default = 4)
+    args = parser.parse_args(argv)
+
+    handler = error_handling.ErrcodeHandler()
+    handler.registerErrcodes(makeRows(args.errcodes))
+    context = multiprocessing.get_context("spawn")
+    with errcode_shared.publishRegistry(handler) as published:
+        print("{0} errcodes, {1} KiB segment".format(args.errcodes, published.size // 1024))
+        for mode in ("register", "attach"):
+            with context.Pool(args.workers) as pool:
+                results = pool.starmap(startWorker, [(mode, args.errcodes)] * args.workers)
+            print("{0:>8}: {1:>8.1f} ms start-up, {2:>8} KiB private per worker".format(
+                mode, max(x[0] for x in results) * 1e3, max(x[1] for x in results)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+import argparse
+import pathlib
+import sys
+import timeit
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import error_handling
+from sharedlib import errcode_suppression
+
+MOD_NAME = "bench_mod"
+
+#Cost of an occurrence that gets suppressed, next to a bare dict probe and
+#to reporting it with a message lookup.
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Per-occurrence cost of errcode suppression.")
+    parser.add_argument("--number", type = int, default = 1000000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args(argv)
+
+    handler = error_handling.ErrcodeHandler()
+    handler.registerErrcode(MOD_NAME, "Failed", "Dependency {0} failed", 1)
+    states = {(MOD_NAME, 1): None}
+
+    cases = [("dict probe", lambda: states.get((MOD_NAME, 1))),
+             ("getMessage + format", lambda: handler.getMessage(MOD_NAME, 1).format("db"))]
+    for policy in errcode_suppression.POLICIES:
+        suppressor = errcode_suppression.ErrcodeSuppressor(policy = policy, rate = 1)
+        suppressor.allow(MOD_NAME, 1)
+        cases.append(("suppressed ({0})".format(policy), lambda suppressor = suppressor: suppressor.allow(MOD_NAME, 1)))
+
+    for (label, function) in cases:
+        best = min(timeit.repeat(function, number = args.number, repeat = args.repeat))
+        print("{0:>22}: {1:>6.0f} ns".format(label, best / args.number * 1e9))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+import argparse
+import pathlib
+import sys
+import timeit
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import error_handling
+from sharedlib import errcode_telemetry
+
+MOD_NAME = "bench_mod"
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Per-lookup overhead of errcode telemetry.")
+    parser.add_argument("--number", type = int, default = 1000000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args(argv)
+
+    handler = error_handling.ErrcodeHandler()
+    handler.registerErrcodes([(MOD_NAME, "ERR_{0}".format(i), "Errcode {0}".format(i), i) for i in range(0, 100)])
+    telemetry = errcode_telemetry.ErrcodeTelemetry(handler)
+
+    def lookups():
+        return min(timeit.repeat(lambda: handler.getMessage(MOD_NAME, 42),
+                                 number = args.number, repeat = args.repeat)) / args.number * 1e9
+
+    off = lookups()
+    telemetry.enable()
+    on = lookups()
+    telemetry.disable()
+    disabled = lookups()
+
+    print("getMessage: {0:.0f} ns before enable | {1:.0f} ns enabled (+{2:.0f} ns) | {3:.0f} ns after disable".format(
+        off, on, on - off, disabled))
+
+if __name__ == "__main__":
+    main()
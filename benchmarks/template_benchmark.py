@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+import argparse
+import pathlib
+import sys
+import timeit
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import error_handling
+
+MOD_NAME = "bench_mod"
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Cost of filling in errcode message templates.")
+    parser.add_argument("--number", type = int, default = 300000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args(argv)
+
+    handler = error_handling.ErrcodeHandler()
+    handler.registerErrcode(MOD_NAME, "OpenFailed", "Cannot open {path}: error {code} for user {user}", 1, template = True)
+    template = handler.getErrcode(MOD_NAME, 1).template
+
+    cases = (
+        ("getMessage + format", lambda: handler.getMessage(MOD_NAME, 1).format(path = "/etc/x", code = 5, user = "bob")),
+        ("renderMessage", lambda: handler.renderMessage(MOD_NAME, 1, path = "/etc/x", code = 5, user = "bob")),
+        ("template.render", lambda: template.render(path = "/etc/x", code = 5, user = "bob")),
+        ("deferMessage, unread", lambda: handler.deferMessage(MOD_NAME, 1, path = "/etc/x", code = 5, user = "bob")),
+    )
+    for (label, function) in cases:
+        best = min(timeit.repeat(function, number = args.number, repeat = args.repeat))
+        print("{0:>22}: {1:>6.0f} ns".format(label, best / args.number * 1e9))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import pathlib
+import sys
+import time
+import tracemalloc
+
+sys.path.append(pathlib.Path(__file__).resolve().parent.parent.parent.__str__())
+from sharedlib import conflict_resolution
+
+#Memory kept per retained version and time per commit, for a
+#VersionedCommittable next to keeping a full dict copy per version. Like
+#timeit, the collector is switched off while building the versions.
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Memory and commit cost of versioned snapshots.")
+    parser.add_argument("--keys", type = int, default = 100000)
+    parser.add_argument("--versions", type = int, default = 200)
+    parser.add_argument("--changes", type = int, default = 10, help = "Keys changed per commit.")
+    args = parser.parse_args(argv)
+
+    data = {"key{0}".format(i): i for i in range(0, args.keys)}
+    changed = [["key{0}".format((v * args.changes + i) % args.keys) for i in range(0, args.changes)]
+               for v in range(0, args.versions)]
+
+    def snapshots(committable):
+        retained = [committable.getSnapshot()]
+        for (version, keys) in enumerate(changed):
+            for key in keys:
+                committable.set(key, -version)
+            retained.append(committable.commit())
+        return retained
+
+    def copies(current):
+        retained = [current]
+        for (version, keys) in enumerate(changed):
+            current = dict(current)
+            for key in keys:
+                current[key] = -version
+            retained.append(current)
+        return retained
+
+    cases = (("dict copy per version", copies, lambda: dict(data)),
+             ("VersionedCommittable", snapshots, lambda: conflict_resolution.VersionedCommittable(data)))
+    for (label, build, initial) in cases:
+        gc.collect()
+        tracemalloc.start()
+        first = initial()
+        before = tracemalloc.get_traced_memory()[0]
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            retained = build(first)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        retained = None
+        first = None
+        print("{0:>22}: {1:>8.1f} MiB initial | {2:>9.1f} KiB per further version | {3:>8.1f} us per commit".format(
+            label, before / (1024 * 1024), used / args.versions / 1024, elapsed / args.versions * 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,9 @@
-import pyrsistent
+import collections.abc
+import hashlib
+import itertools
+import operator
+import threading
+import weakref
 
 class ImmutableObjectWriteError(Exception):
     def __init__(self):
@@ -20,6 +25,80 @@ class Freezable:
     def freeze(self):
         pass
 
+#Read-only view of a mapping, for handing out committed data without
+#copying it, neither when wrapping nor when reading. Writes raise
+#ImmutableObjectWriteError.
+#The view is shallow: nested values are only as immutable as their own
+#types make them. It also follows the wrapped mapping, so the owner must
+#stop writing to that mapping once it has wrapped it. copy() returns a
+#mutable dict for callers that need one.
+class ReadOnlyMapping(collections.abc.Mapping):
+    __slots__ = ("__data",)
+
+    def __init__(self, data = None):
+        if data is None:
+            raise ValueError("data cannot be None.")
+
+        if isinstance(data, ReadOnlyMapping):
+            data = data.__data
+        self.__data = data
+
+    def __getitem__(self, key):
+        return self.__data[key]
+
+    def __iter__(self):
+        return iter(self.__data)
+
+    def __len__(self):
+        return len(self.__data)
+
+    def __contains__(self, key):
+        return key in self.__data
+
+    def get(self, key, default = None):
+        return self.__data.get(key, default)
+
+    def keys(self):
+        return self.__data.keys()
+
+    def values(self):
+        return self.__data.values()
+
+    def items(self):
+        return self.__data.items()
+
+    def __eq__(self, other):
+        if isinstance(other, ReadOnlyMapping):
+            other = other.__data
+        return self.__data == other
+
+    def __repr__(self):
+        return "ReadOnlyMapping({0!r})".format(self.__data)
+
+    def copy(self):
+        return dict(self.__data)
+
+    def __setitem__(self, key, value):
+        raise ImmutableObjectWriteError()
+
+    def __delitem__(self, key):
+        raise ImmutableObjectWriteError()
+
+    def pop(self, key, *default):
+        raise ImmutableObjectWriteError()
+
+    def popitem(self):
+        raise ImmutableObjectWriteError()
+
+    def clear(self):
+        raise ImmutableObjectWriteError()
+
+    def update(self, *args, **kwargs):
+        raise ImmutableObjectWriteError()
+
+    def setdefault(self, key, default = None):
+        raise ImmutableObjectWriteError()
+
 #Committable is for when object state needs
 #to be snapshotted in some way, shape, or form.
 #Exactly what it means to commit an object depends
@@ -57,19 +136,30 @@ class ReadOnlyAfterCommitCommittable(Committable):
         super().__init__()
         self.__ro_committable_metadata = {}
         self.__ro_committable_metadata["committed"] = False
+        #Whoever puts the first entry here gets to commit; see commit().
+        self.__ro_committable_claims = {}
+        self.__ro_committable_content_hash = None
 
         if self.onVerifyKwargs(**kwargs):
            self.onInitialize(**kwargs)
         else:
             raise self.KwargVerificationError("onVerifyKwargs returned False, indicating general failure.")
 
+    #dict.setdefault is atomic, so of several threads committing at once
+    #exactly one gets past the claim; the others get DoubleCommitError, as
+    #they would after the commit. A failed onCommit gives the claim back.
     def commit(self):
-        if self.__ro_committable_metadata["committed"] == True:
+        claim = object()
+        if self.__ro_committable_claims.setdefault("commit", claim) is not claim:
             raise DoubleCommitError()
 
-        self.onCommit()
+        try:
+            self.onCommit()
+        except BaseException:
+            del self.__ro_committable_claims["commit"]
+            raise
         self.__ro_committable_metadata["committed"] = True
-        self.__ro_committable_metadata = pyrsistent.freeze(self.__ro_committable_metadata)
+        self.__ro_committable_metadata = ReadOnlyMapping(self.__ro_committable_metadata)
 
     #Keep people from shooting themselves in the foot.
     def onVerifyKwargs(self, **kwargs):
@@ -86,3 +176,986 @@ class ReadOnlyAfterCommitCommittable(Committable):
 
     def isReadOnly(self):
         return self.isCommitted()
+
+    #What the content hash covers. Defaults to every attribute other than
+    #the commit bookkeeping; override it to leave out state that may still
+    #change after commit.
+    def getContentState(self):
+        prefix = "_ReadOnlyAfterCommitCommittable__"
+        return {key: value for (key, value) in vars(self).items() if not key.startswith(prefix)}
+
+    #Computed on the first call after commit() and kept from then on, so
+    #commit() itself never fails on hashing. Before the commit it is
+    #recomputed on every call, as the object may still change.
+    #Raises ValueError for committables whose content state refers back to
+    #them, e.g. two committables holding each other.
+    def getContentHash(self):
+        retval = self.__ro_committable_content_hash
+        if retval is not None:
+            return retval
+
+        hashing = getattr(_content_hashing, "active", None)
+        if hashing is None:
+            hashing = set()
+            _content_hashing.active = hashing
+        if id(self) in hashing:
+            raise ValueError("sharedlib.conflict_resolution: Cannot content hash {0!r}: its content refers back to it.".format(self))
+
+        committed = self.isCommitted()
+        hashing.add(id(self))
+        try:
+            retval = contentHash(self.getContentState())
+        finally:
+            hashing.discard(id(self))
+        if committed:
+            self.__ro_committable_content_hash = retval
+        return retval
+
+    def contentEquals(self, other = None):
+        if other is None:
+            raise ValueError("other cannot be None.")
+        return (type(self) is type(other) and self.getContentHash() == other.getContentHash() and
+                _sameContent(self, other))
+
+#Ids of the committables being hashed by this thread, to catch cycles.
+_content_hashing = threading.local()
+
+#Marks a key that is absent on one side of a change, e.g. the old value of
+#an added key.
+class _Missing:
+    def __repr__(self):
+        return "MISSING"
+
+    def __reduce__(self):
+        return "MISSING"
+
+MISSING = _Missing()
+
+#Content hashing.
+#
+#contentHash(value) is a 128-bit Merkle hash of a value and everything in
+#it, stable across processes (unlike hash(), which is salted per process
+#for str). Mappings and sets hash to the XOR of their entries, so one entry
+#can be swapped without touching the others; sequences and PClass records
+#hash their parts in order.
+#XOR is linear, so colliding mappings are easy to build on purpose: a hash
+#mismatch proves the contents differ, but a match is only confirmed by
+#_sameContent, which compares the values themselves by the same rules.
+#Hashes of pyrsistent containers (PMap, PVector, PSet, PBag and PClass)
+#are cached per object for as long as the object lives, so a structure that
+#shares most of its subtrees with one hashed before only hashes the paths
+#that changed. Values of types not handled here are hashed by repr(), which
+#is only as stable as that repr.
+
+HASH_SIZE = 16
+
+__MAP_TAG = int.from_bytes(hashlib.blake2b(b"map", digest_size = HASH_SIZE).digest(), "big")
+__SET_TAG = int.from_bytes(hashlib.blake2b(b"set", digest_size = HASH_SIZE).digest(), "big")
+
+#id(value) -> (weak reference, hash); entries go away with their value.
+__cached_hashes = {}
+
+def __digest(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size = HASH_SIZE).digest(), "big")
+
+def __tagged(tag, data):
+    return b"".join((tag, str(len(data)).encode("ascii"), b":", data))
+
+#Scalars are encoded directly; anything else by its hash.
+#Numbers that compare equal encode the same, as they hash the same in
+#Python: True, 1 and 1.0 are all the integer 1.
+def __encode(value):
+    value_type = type(value)
+    if value_type is str:
+        return __tagged(b"s", value.encode("utf-8", "surrogatepass"))
+    if value_type is int or value_type is bool:
+        return __tagged(b"i", str(int(value)).encode("ascii"))
+    if value is None:
+        return __tagged(b"c", b"None")
+    if value_type is float:
+        if value.is_integer():
+            return __tagged(b"i", str(int(value)).encode("ascii"))
+        return __tagged(b"f", repr(value).encode("ascii"))
+    if value_type is bytes:
+        return __tagged(b"b", value)
+    if value is MISSING:
+        return b"m"
+    return __tagged(b"h", contentHash(value).to_bytes(HASH_SIZE, "big"))
+
+def _entryHash(key, value):
+    return __digest(b"".join((b"e", __encode(key), __encode(value))))
+
+def __computeHash(value):
+    import pyrsistent
+
+    #Cheapest checks first; the ABC checks below are slow.
+    if isinstance(value, (list, tuple, pyrsistent.PVector)):
+        return __digest(b"".join([b"l"] + [__encode(x) for x in value]))
+
+    if isinstance(value, (Snapshot, ReadOnlyAfterCommitCommittable)):
+        return value.getContentHash()
+
+    if isinstance(value, pyrsistent.PClass):
+        fields = sorted(value._pclass_fields)
+        parts = [__encode(type(value).__qualname__)]
+        parts.extend(__encode(getattr(value, name, MISSING)) for name in fields)
+        return __digest(b"".join([b"r"] + parts))
+
+    if isinstance(value, collections.abc.Mapping):
+        retval = __MAP_TAG
+        for (key, item) in value.items():
+            retval = retval ^ _entryHash(key, item)
+        return retval
+
+    if isinstance(value, (collections.abc.Set, pyrsistent.PBag)):
+        retval = __SET_TAG
+        for item in value:
+            retval = retval ^ __digest(b"".join((b"n", __encode(item))))
+        return retval
+
+    import enum
+    import pathlib
+    if isinstance(value, enum.Enum):
+        return __digest(b"".join((b"x", __encode(type(value).__qualname__), __encode(value.name))))
+    if isinstance(value, pathlib.PurePath):
+        return __digest(b"".join((b"p", __encode(str(value)))))
+    if isinstance(value, (str, int, float, bytes)) or value is None or value is MISSING:
+        return __digest(__encode(value))
+    return __digest(b"".join((b"o", __encode(type(value).__qualname__), __encode(repr(value)))))
+
+#Compares two values by the rules contentHash hashes them by, without
+#hashing: sequences of either kind item by item, numbers that compare equal
+#as equal, snapshots and committables by their content.
+def _sameContent(value, other):
+    import pyrsistent
+
+    if value is other:
+        return True
+
+    if isinstance(value, Snapshot):
+        value = value.data
+    elif isinstance(value, ReadOnlyAfterCommitCommittable):
+        value = value.getContentState()
+    if isinstance(other, Snapshot):
+        other = other.data
+    elif isinstance(other, ReadOnlyAfterCommitCommittable):
+        other = other.getContentState()
+
+    scalars = (str, int, float, bytes, bool, type(None), _Missing)
+    if type(value) in scalars or type(other) in scalars:
+        return type(value) in scalars and type(other) in scalars and __encode(value) == __encode(other)
+
+    sequences = (list, tuple, pyrsistent.PVector)
+    if isinstance(value, sequences) or isinstance(other, sequences):
+        return (isinstance(value, sequences) and isinstance(other, sequences) and
+                len(value) == len(other) and all(map(_sameContent, value, other)))
+
+    if isinstance(value, pyrsistent.PClass) or isinstance(other, pyrsistent.PClass):
+        if not (isinstance(value, pyrsistent.PClass) and isinstance(other, pyrsistent.PClass)):
+            return False
+        fields = sorted(value._pclass_fields)
+        return (type(value).__qualname__ == type(other).__qualname__ and
+                fields == sorted(other._pclass_fields) and
+                all(_sameContent(getattr(value, name, MISSING), getattr(other, name, MISSING)) for name in fields))
+
+    if isinstance(value, collections.abc.Mapping) or isinstance(other, collections.abc.Mapping):
+        if not (isinstance(value, collections.abc.Mapping) and isinstance(other, collections.abc.Mapping)):
+            return False
+        if len(value) != len(other):
+            return False
+        for (key, item) in value.items():
+            if key not in other or not _sameContent(item, other[key]):
+                return False
+        return True
+
+    unordered = (collections.abc.Set, pyrsistent.PBag)
+    if isinstance(value, unordered) or isinstance(other, unordered):
+        if not (isinstance(value, unordered) and isinstance(other, unordered)):
+            return False
+        if isinstance(value, pyrsistent.PBag) or isinstance(other, pyrsistent.PBag):
+            return collections.Counter(value) == collections.Counter(other)
+        return len(value) == len(other) and all(item in other for item in value)
+
+    import enum
+    import pathlib
+    if isinstance(value, enum.Enum) or isinstance(other, enum.Enum):
+        return (isinstance(value, enum.Enum) and isinstance(other, enum.Enum) and
+                type(value).__qualname__ == type(other).__qualname__ and value.name == other.name)
+    if isinstance(value, pathlib.PurePath) or isinstance(other, pathlib.PurePath):
+        return (isinstance(value, pathlib.PurePath) and isinstance(other, pathlib.PurePath) and
+                str(value) == str(other))
+    return type(value).__qualname__ == type(other).__qualname__ and repr(value) == repr(other)
+
+def __dropCachedHash(key):
+    def drop(reference):
+        __cached_hashes.pop(key, None)
+    return drop
+
+def contentHash(value = MISSING):
+    import pyrsistent
+
+    value_type = type(value)
+    if value_type is str or value_type is int or value_type is bytes or value_type is float or value_type is bool:
+        return __digest(__encode(value))
+    if not isinstance(value, (pyrsistent.PMap, pyrsistent.PVector, pyrsistent.PSet, pyrsistent.PBag, pyrsistent.PClass)):
+        return __computeHash(value)
+
+    cached = __cached_hashes.get(id(value))
+    if cached is not None and cached[0]() is value:
+        return cached[1]
+
+    retval = __computeHash(value)
+    try:
+        reference = weakref.ref(value, __dropCachedHash(id(value)))
+    except TypeError:
+        return retval
+    __cached_hashes[id(value)] = (reference, retval)
+    return retval
+
+#Immutable version of a VersionedCommittable. Reads go to a pyrsistent PMap
+#that shares every unchanged part with the snapshots before and after it,
+#so holding on to old versions is cheap.
+#version: 0 for the initial contents, then one more per commit.
+#parent: the snapshot this one was committed on top of, None for the first.
+#delta: {key: (old value, new value)} of the commit that made this
+#snapshot, with MISSING for an added or removed key.
+#Two snapshots compare by content (see contentHash): once the hashes are
+#known, snapshots that differ are told apart in O(1), and a matching hash is
+#confirmed item by item, as mapping hashes can be made to collide. Against
+#any other mapping a snapshot compares item by item. hash() agrees with
+#both, and with the PMaps a snapshot equals, by being the hash of the PMap,
+#which pyrsistent computes once per map. getContentHash() is a cheap cache
+#key where colliding contents built on purpose are not a concern.
+class Snapshot(ReadOnlyMapping):
+    __slots__ = ("data", "version", "parent", "delta", "content_hash", "__weakref__")
+
+    def __init__(self, data = None, version = None, parent = None, delta = None):
+        if data is None:
+            raise ValueError("data cannot be None.")
+
+        if version is None:
+            raise ValueError("version cannot be None.")
+
+        super().__init__(data)
+        self.data = data
+        self.version = version
+        self.parent = parent
+        self.delta = ReadOnlyMapping({} if delta is None else delta)
+        self.content_hash = None
+
+    def __repr__(self):
+        return "Snapshot(version={0}, {1} keys)".format(self.version, len(self.data))
+
+    #Computed once. When the parent's hash is known, only the entries of
+    #the delta are rehashed; otherwise every entry is.
+    def getContentHash(self):
+        if self.content_hash is None:
+            parent = self.parent
+            if parent is not None and parent.content_hash is not None:
+                retval = parent.content_hash
+                for (key, (old, new)) in self.delta.items():
+                    if old is not MISSING:
+                        retval = retval ^ _entryHash(key, old)
+                    if new is not MISSING:
+                        retval = retval ^ _entryHash(key, new)
+            else:
+                retval = contentHash(self.data)
+            self.content_hash = retval
+        return self.content_hash
+
+    def __eq__(self, other):
+        if isinstance(other, Snapshot):
+            if self is other or self.data is other.data:
+                return True
+            return self.getContentHash() == other.getContentHash() and _sameContent(self.data, other.data)
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return hash(self.data)
+
+    #Snapshots from this one back to the first, newest first.
+    def getLineage(self):
+        snapshot = self
+        while snapshot is not None:
+            yield snapshot
+            snapshot = snapshot.parent
+
+#Committable that can be committed over and over. Changes are made to a
+#working copy and every commit() turns them into a new immutable Snapshot;
+#the snapshots before it stay readable.
+#
+#The working copy is a pyrsistent evolver over the latest snapshot, so a
+#commit only builds the parts of the map that changed. Memory grows with
+#the size of each delta, not with the number of versions times the number
+#of keys. Values are frozen with pyrsistent.freeze when they are set, so
+#nested dicts, lists and sets become immutable too.
+#
+#Readers take a snapshot and keep using it for as long as they like, with
+#no locking, while writers go on committing. Changes to the working copy
+#are serialized by a lock.
+#
+#Every version is claimed exactly once: the snapshot for version n + 1 is
+#put into a {version: snapshot} dict with dict.setdefault, which is atomic,
+#and whoever gets there first wins. compareAndCommit() builds on a version
+#the caller read earlier and takes no lock at all; a writer that lost the
+#race gets a CommitConflict naming the winner and can retry on top of it
+#(see retryCommit).
+#
+#History is kept until it is pruned: every snapshot links to its parent, so
+#the latest one keeps all versions before it alive. prune(before_version)
+#drops the versions before "before_version" and cuts the parent link there;
+#with max_versions, commits prune on their own to keep at most that many
+#versions. Readers holding a pruned snapshot can go on using it, but it can
+#no longer be looked up by version, and merges that need history from
+#before the cut find no common ancestor.
+class VersionedCommittable(Committable):
+    def __init__(self, data = None, max_versions = None):
+        super().__init__()
+        import pyrsistent
+
+        if max_versions is not None and max_versions < 1:
+            raise ValueError("max_versions must be at least 1.")
+
+        self.__freeze = pyrsistent.freeze
+        self.__lock = threading.Lock()
+        self.__prune_lock = threading.Lock()
+        self.__max_versions = max_versions
+        initial = pyrsistent.pmap({key: pyrsistent.freeze(value) for (key, value) in ({} if data is None else data).items()})
+        self.__setFirst(Snapshot(initial, 0))
+
+    def __setFirst(self, snapshot):
+        self.__first = snapshot
+        self.__head = snapshot
+        self.__claims = {snapshot.version: snapshot}
+        self.__base = snapshot
+        self.__evolver = snapshot.data.evolver()
+        self.__pending = {}
+
+    #A new VersionedCommittable whose first snapshot is the latest snapshot
+    #of this one, e.g. for concurrent edits that get merged back later.
+    @classmethod
+    def fromSnapshot(cls, snapshot = None, max_versions = None):
+        if snapshot is None:
+            raise ValueError("snapshot cannot be None.")
+
+        retval = cls.__new__(cls)
+        VersionedCommittable.__init__(retval, None, max_versions)
+        retval.__setFirst(snapshot)
+        return retval
+
+    def fork(self):
+        return type(self).fromSnapshot(self.getSnapshot(), self.__max_versions)
+
+    #Reads see the uncommitted changes.
+    def get(self, key = None, default = None):
+        try:
+            return self.__evolver[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self.__evolver
+
+    def __len__(self):
+        return len(self.__evolver)
+
+    def set(self, key = None, value = None):
+        if key is None:
+            raise ValueError("key cannot be None.")
+
+        value = self.__freeze(value)
+        with self.__lock:
+            self.__record(key, value)
+            self.__evolver[key] = value
+
+    def remove(self, key = None):
+        if key is None:
+            raise ValueError("key cannot be None.")
+
+        with self.__lock:
+            if key not in self.__evolver:
+                raise KeyError(key)
+            self.__record(key, MISSING)
+            del self.__evolver[key]
+
+    def update(self, data = None):
+        if data is None:
+            raise ValueError("data cannot be None.")
+
+        for (key, value) in data.items():
+            self.set(key, value)
+
+    def __record(self, key, value):
+        change = self.__pending.get(key)
+        if change is None:
+            self.__pending[key] = (self.get(key, MISSING), value)
+        else:
+            self.__pending[key] = (change[0], value)
+
+    def hasChanges(self):
+        return len(self.__pending) > 0
+
+    #{key: (committed value, working value)} of the uncommitted changes.
+    def getPendingDelta(self):
+        return {key: change for (key, change) in self.__pending.items() if _isChange(change[0], change[1])}
+
+    #Drops the uncommitted changes. The working copy starts over from the
+    #latest snapshot.
+    def discard(self):
+        with self.__lock:
+            self.__base = self.getSnapshot()
+            self.__evolver = self.__base.data.evolver()
+            self.__pending = {}
+
+    #Turns the working copy into a new snapshot and returns it. Without any
+    #change since the last commit, the latest snapshot is returned and no
+    #version is added.
+    #When other commits got in since the working copy was started, the
+    #changes are first rebased onto the latest snapshot (see rebase).
+    #Raises CommitConflictError, keeping the changes, only when one of them
+    #touches a key those commits changed to something else.
+    def commit(self):
+        with self.__lock:
+            while True:
+                self.__rebase(None)
+                base = self.__base
+                delta = {key: change for (key, change) in self.__pending.items() if _isChange(change[0], change[1])}
+                if len(delta) == 0:
+                    self.__pending = {}
+                    self.__evolver = base.data.evolver()
+                    return base
+
+                snapshot = Snapshot(self.__evolver.persistent(), base.version + 1, base, delta)
+                if self.__claim(snapshot) is snapshot:
+                    self.__pending = {}
+                    self.__base = snapshot
+                    self.__evolver = snapshot.data.evolver()
+                    return snapshot
+
+    #Replays the uncommitted changes on top of the latest snapshot, as if
+    #they had been made there, and returns that snapshot. A change to a key
+    #that the commits in between set to a different value is a
+    #MergeConflict, with the working value as ours and the committed one as
+    #theirs; it is handed to "policy" like in threeWayMerge. If any is left
+    #unresolved, CommitConflictError is raised naming the keys, and the
+    #working copy is left as it was.
+    def rebase(self, policy = None):
+        with self.__lock:
+            return self.__rebase(policy)
+
+    def __rebase(self, policy):
+        base = self.__base
+        latest = self.getSnapshot()
+        if latest is base:
+            return latest
+
+        if policy is None:
+            policy = keepUnresolved
+        committed = diffSnapshots(base, latest)
+        replay = {}
+        unresolved = []
+        for (key, (old, new)) in self.__pending.items():
+            if not _isChange(old, new):
+                continue
+            change = committed.get(key)
+            if change is not None and not _sameValue(change[1], new):
+                conflict = MergeConflict(key, old, new, change[1])
+                conflict.resolution = policy(conflict)
+                if conflict.resolution is UNRESOLVED:
+                    unresolved.append(key)
+                    continue
+                new = self.__freeze(conflict.resolution)
+            replay[key] = new
+        if len(unresolved) > 0:
+            raise CommitConflictError(CommitConflict(base.version, latest, unresolved))
+
+        evolver = latest.data.evolver()
+        pending = {}
+        for (key, new) in replay.items():
+            old = evolver[key] if key in evolver else MISSING
+            if new is MISSING:
+                if old is not MISSING:
+                    del evolver[key]
+            else:
+                evolver[key] = new
+            pending[key] = (old, new)
+        self.__base = latest
+        self.__evolver = evolver
+        self.__pending = pending
+        return latest
+
+    #Commits "changes", {key: value, or MISSING to remove the key}, on top
+    #of version "expected_version" without touching the working copy, and
+    #returns the new snapshot. If another commit already took the version
+    #after "expected_version", nothing is committed and the CommitConflict
+    #is returned instead. Takes no lock.
+    def compareAndCommit(self, expected_version = None, changes = None):
+        if expected_version is None:
+            raise ValueError("expected_version cannot be None.")
+        if changes is None:
+            raise ValueError("changes cannot be None.")
+
+        claims = self.__claims
+        winner = claims.get(expected_version + 1)
+        if winner is not None:
+            return CommitConflict(expected_version, winner)
+        #A pruned version has newer ones after it, so its writer lost too.
+        #__first moves before the claims go, so a missing claim below it
+        #always means pruned.
+        base = claims.get(expected_version)
+        if base is None:
+            if expected_version < self.__first.version:
+                return CommitConflict(expected_version, self.getSnapshot())
+            raise KeyError("Unknown version: {0}".format(expected_version))
+
+        evolver = base.data.evolver()
+        delta = {}
+        for (key, value) in changes.items():
+            if key is None:
+                raise ValueError("key cannot be None.")
+            old = evolver[key] if key in evolver else MISSING
+            if value is MISSING:
+                if old is not MISSING:
+                    del evolver[key]
+                    delta[key] = (old, MISSING)
+                continue
+            value = self.__freeze(value)
+            if _isChange(old, value):
+                evolver[key] = value
+                delta[key] = (old, value)
+        if len(delta) == 0:
+            return base
+
+        snapshot = Snapshot(evolver.persistent(), expected_version + 1, base, delta)
+        winner = self.__claim(snapshot)
+        if winner is not snapshot:
+            return CommitConflict(expected_version, winner)
+        return snapshot
+
+    #Returns the snapshot that holds snapshot.version, which is "snapshot"
+    #itself only if it got there first.
+    def __claim(self, snapshot):
+        claims = self.__claims
+        winner = claims.setdefault(snapshot.version, snapshot)
+        if winner is not snapshot:
+            return winner
+
+        #prune() moves __first before it removes any claim, so a claim that
+        #only went through because its version had been pruned shows here.
+        if self.__first.version >= snapshot.version:
+            if claims.get(snapshot.version) is snapshot:
+                del claims[snapshot.version]
+            return self.getSnapshot()
+
+        parent = snapshot.parent
+        if parent is not None and parent.content_hash is not None:
+            snapshot.getContentHash()
+
+        max_versions = self.__max_versions
+        if max_versions is not None and snapshot.version - self.__first.version >= max_versions:
+            #Whoever is pruning already will catch up; no one waits here.
+            if self.__prune_lock.acquire(blocking = False):
+                try:
+                    self.__prune(snapshot.version - max_versions + 1)
+                finally:
+                    self.__prune_lock.release()
+        return snapshot
+
+    #Drops the versions before "before_version", never the latest one, and
+    #returns how many were dropped. The snapshot of "before_version" becomes
+    #the first and loses its parent, so the dropped snapshots are freed once
+    #no reader holds them.
+    def prune(self, before_version = None):
+        if before_version is None:
+            raise ValueError("before_version cannot be None.")
+
+        with self.__prune_lock:
+            return self.__prune(before_version)
+
+    def __prune(self, before_version):
+        first = self.__first
+        before_version = min(before_version, self.getSnapshot().version)
+        if before_version <= first.version:
+            return 0
+
+        claims = self.__claims
+        kept = claims[before_version]
+        parent = kept.parent
+        if parent is not None and parent.content_hash is not None:
+            kept.getContentHash()
+        self.__first = kept
+        for version in range(first.version, before_version):
+            claims.pop(version, None)
+        kept.parent = None
+        return before_version - first.version
+
+    #The latest snapshot, or the one of "version".
+    #__head is only a hint: it may lag behind after concurrent commits, or
+    #even point at a pruned snapshot, so the claims after it are followed to
+    #the newest one.
+    def getSnapshot(self, version = None):
+        claims = self.__claims
+        if version is None:
+            latest = self.__head
+            first = self.__first
+            if latest.version < first.version:
+                latest = first
+            following = claims.get(latest.version + 1)
+            while following is not None:
+                latest = following
+                following = claims.get(latest.version + 1)
+            self.__head = latest
+            return latest
+
+        snapshot = claims.get(version)
+        if snapshot is None:
+            raise KeyError("Unknown version: {0}".format(version))
+        return snapshot
+
+    def getVersion(self):
+        return self.getSnapshot().version
+
+    def getVersions(self):
+        return list(range(self.__first.version, self.getVersion() + 1))
+
+    #Merges "snapshot", e.g. the latest snapshot of a fork, into the working
+    #copy and returns the MergeResult; commit() then records the merge. The
+    #base is the newest snapshot both lines of commits share. Conflicts
+    #left unresolved by "policy" keep the value of this committable.
+    def merge(self, snapshot = None, policy = None):
+        if snapshot is None:
+            raise ValueError("snapshot cannot be None.")
+
+        if self.hasChanges():
+            raise ValueError("Commit or discard the working changes before merging.")
+
+        self.discard()
+        ours = self.getSnapshot()
+        base = findCommonAncestor(ours, snapshot)
+        if base is None:
+            raise ValueError("snapshot shares no history with this committable.")
+
+        result = threeWayMerge(base, ours, snapshot, policy)
+        for (key, change) in result.applied.items():
+            if change[1] is MISSING:
+                self.remove(key)
+            else:
+                self.set(key, change[1])
+        return result
+
+#What a writer that lost a compare-and-commit gets: the version it
+#expected to build on, and the snapshot that took the next version first,
+#or the latest one. keys: for a failed rebase, the keys that conflict.
+class CommitConflict:
+    __slots__ = ("expected_version", "snapshot", "keys")
+
+    def __init__(self, expected_version, snapshot, keys = None):
+        self.expected_version = expected_version
+        self.snapshot = snapshot
+        self.keys = keys
+
+    def __repr__(self):
+        return "CommitConflict(expected_version={0}, committed={1!r}, keys={2!r})".format(
+            self.expected_version, self.snapshot, self.keys)
+
+class CommitConflictError(Exception):
+    def __init__(self, conflict):
+        self.conflict = conflict
+        message = "sharedlib.conflict_resolution: Version {0} was committed by someone else; commit based on version {1} refused.".format(
+            conflict.snapshot.version, conflict.expected_version)
+        if conflict.keys:
+            message = "{0} Conflicting keys: {1!r}".format(message, conflict.keys)
+        super().__init__(message)
+
+RETRY_ATTEMPTS = 100
+
+#Optimistic read-modify-write: calls update(snapshot) with the latest
+#snapshot, commits the {key: value or MISSING} it returns on top of that
+#snapshot, and starts over when another commit got in first. update may be
+#called several times and must not have side effects.
+#Returns the committed snapshot, or raises CommitConflictError after
+#"attempts" lost races.
+def retryCommit(committable = None, update = None, attempts = RETRY_ATTEMPTS):
+    if committable is None:
+        raise ValueError("committable cannot be None.")
+    if update is None:
+        raise ValueError("update cannot be None.")
+    if attempts < 1:
+        raise ValueError("attempts must be at least 1.")
+
+    result = None
+    for i in range(0, attempts):
+        snapshot = committable.getSnapshot()
+        result = committable.compareAndCommit(snapshot.version, update(snapshot))
+        if not isinstance(result, CommitConflict):
+            return result
+    raise CommitConflictError(result)
+
+#Merging.
+#
+#threeWayMerge(base, ours, theirs) reconciles two sets of edits made on top
+#of a common base. Diffs are taken the cheapest way available:
+#  - identical snapshots, or snapshots over the same map, differ in nothing;
+#  - when base is an ancestor of the other snapshot, the deltas recorded by
+#    the commits in between are combined, so the cost is the size of the
+#    change, not of the map. This is the only path whose work is bounded by
+#    the change;
+#  - otherwise, for two PMaps with the same number of hash buckets, the
+#    buckets are compared by identity and only the ones that differ are
+#    unpacked. That is still one step per bucket, O(n) with a small
+#    constant: pyrsistent's C pvector does not expose its trie, so shared
+#    subtrees cannot be skipped as a whole;
+#  - any other mapping, or PMaps resized to different bucket counts, are
+#    compared key by key.
+#A key changed on both sides to different values is a conflict. It is
+#handed to the policy, which returns the value to keep (MISSING to remove
+#the key) or UNRESOLVED.
+
+#Returned by a policy that leaves a conflict unresolved.
+class _Unresolved:
+    def __repr__(self):
+        return "UNRESOLVED"
+
+    def __reduce__(self):
+        return "UNRESOLVED"
+
+UNRESOLVED = _Unresolved()
+
+class MergeConflict:
+    __slots__ = ("key", "base", "ours", "theirs", "resolution")
+
+    def __init__(self, key = None, base = MISSING, ours = MISSING, theirs = MISSING):
+        self.key = key
+        self.base = base
+        self.ours = ours
+        self.theirs = theirs
+        self.resolution = UNRESOLVED
+
+    def isResolved(self):
+        return self.resolution is not UNRESOLVED
+
+    def __eq__(self, other):
+        if not isinstance(other, MergeConflict):
+            return NotImplemented
+        return ((self.key, self.base, self.ours, self.theirs, self.resolution) ==
+                (other.key, other.base, other.ours, other.theirs, other.resolution))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "MergeConflict(key={0!r}, base={1!r}, ours={2!r}, theirs={3!r}, resolution={4!r})".format(
+            self.key, self.base, self.ours, self.theirs, self.resolution)
+
+class MergeConflictError(Exception):
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__("sharedlib.conflict_resolution: Merge failed with {0} conflict(s), first on key: {1!r}".format(
+            len(conflicts), conflicts[0].key))
+
+#snapshot: the merged Snapshot, a child of "ours".
+#applied: {key: (value in ours, merged value)} of what the merge changed
+#on top of ours.
+#conflicts: the conflicts left unresolved; resolved: the others.
+class MergeResult:
+    def __init__(self, snapshot, applied, conflicts, resolved):
+        self.snapshot = snapshot
+        self.applied = applied
+        self.conflicts = conflicts
+        self.resolved = resolved
+
+    def hasConflicts(self):
+        return len(self.conflicts) > 0
+
+#Policies.
+def keepUnresolved(conflict):
+    return UNRESOLVED
+
+def preferOurs(conflict):
+    return conflict.ours
+
+def preferTheirs(conflict):
+    return conflict.theirs
+
+#Raises MergeConflictError on the first conflict.
+def failOnConflict(conflict):
+    raise MergeConflictError([conflict])
+
+#Policy that picks the policy per key from "policies", and "default" for
+#the keys it does not list.
+def keyPolicy(policies = None, default = keepUnresolved):
+    if policies is None:
+        raise ValueError("policies cannot be None.")
+
+    def policy(conflict):
+        return policies.get(conflict.key, default)(conflict)
+
+    return policy
+
+def _sameValue(a, b):
+    return a is b or a == b
+
+#Whether replacing "old" by "new" changes the map. Equal values of other
+#types, like 1 and 1.0, count as a change: the map does hold a new value.
+def _isChange(old, new):
+    return old is not new and (type(old) is not type(new) or old != new)
+
+#The newest snapshot in the history of both "a" and "b", or None.
+def findCommonAncestor(a = None, b = None):
+    if a is None or b is None:
+        raise ValueError("snapshots cannot be None.")
+
+    while a is not None and b is not None and a is not b:
+        if a.version >= b.version:
+            a = a.parent
+        else:
+            b = b.parent
+    return a if a is b else None
+
+def __lineageDelta(base, other):
+    deltas = []
+    while other is not None and other is not base and other.version > base.version:
+        deltas.append(other.delta)
+        other = other.parent
+    if other is not base:
+        return None
+
+    combined = {}
+    for delta in reversed(deltas):
+        for (key, change) in delta.items():
+            previous = combined.get(key)
+            combined[key] = change if previous is None else (previous[0], change[1])
+    return {key: change for (key, change) in combined.items() if not _sameValue(change[0], change[1])}
+
+#PMap._buckets is private to pyrsistent (a pvector of None or lists of
+#(key, value) pairs, checked up to 0.20). Anything else falls back to the
+#key by key comparison; conflict_resolution_tests pins the versions.
+def __bucketDelta(base, other):
+    base_buckets = getattr(base, "_buckets", None)
+    other_buckets = getattr(other, "_buckets", None)
+    if base_buckets is None or other_buckets is None:
+        return None
+    try:
+        if len(base_buckets) != len(other_buckets):
+            return None
+    except TypeError:
+        return None
+
+    delta = {}
+    changed = itertools.compress(zip(base_buckets, other_buckets), map(operator.is_not, base_buckets, other_buckets))
+    for (base_bucket, other_bucket) in changed:
+        try:
+            old = dict(base_bucket or ())
+            new = dict(other_bucket or ())
+        except (TypeError, ValueError):
+            return None
+        for (key, value) in new.items():
+            previous = old.pop(key, MISSING)
+            if not _sameValue(previous, value):
+                delta[key] = (previous, value)
+        for (key, value) in old.items():
+            delta[key] = (value, MISSING)
+    return delta
+
+def __mappingDelta(base, other):
+    delta = {}
+    for (key, value) in other.items():
+        previous = base.get(key, MISSING)
+        if not _sameValue(previous, value):
+            delta[key] = (previous, value)
+    for (key, value) in base.items():
+        if key not in other:
+            delta[key] = (value, MISSING)
+    return delta
+
+#{key: (value in base, value in other)} for every key that differs, with
+#MISSING for a key absent on one side.
+def diffSnapshots(base = None, other = None):
+    if base is None:
+        raise ValueError("base cannot be None.")
+
+    if other is None:
+        raise ValueError("other cannot be None.")
+
+    if base is other:
+        return {}
+
+    if isinstance(base, Snapshot) and isinstance(other, Snapshot):
+        delta = __lineageDelta(base, other)
+        if delta is not None:
+            return delta
+    if isinstance(base, Snapshot):
+        base = base.data
+    if isinstance(other, Snapshot):
+        other = other.data
+    if base is other:
+        return {}
+
+    import pyrsistent
+    if isinstance(base, pyrsistent.PMap) and isinstance(other, pyrsistent.PMap):
+        delta = __bucketDelta(base, other)
+        if delta is not None:
+            return delta
+    return __mappingDelta(base, other)
+
+#Three-way merge of "theirs" into "ours"; see above. Snapshots, PMaps and
+#other mappings are accepted. Returns a MergeResult whose snapshot starts
+#from ours, so it shares the unchanged parts of the map with it.
+#policy: called with each MergeConflict, keepUnresolved by default.
+def threeWayMerge(base = None, ours = None, theirs = None, policy = None):
+    if base is None:
+        raise ValueError("base cannot be None.")
+
+    if ours is None:
+        raise ValueError("ours cannot be None.")
+
+    if theirs is None:
+        raise ValueError("theirs cannot be None.")
+
+    if policy is None:
+        policy = keepUnresolved
+
+    import pyrsistent
+    if not isinstance(ours, Snapshot):
+        data = ours if isinstance(ours, pyrsistent.PMap) else pyrsistent.pmap(ours)
+        ours = Snapshot(data, 0)
+
+    theirs_delta = diffSnapshots(base, theirs)
+    if len(theirs_delta) == 0:
+        return MergeResult(ours, {}, [], [])
+    ours_delta = diffSnapshots(base, ours)
+
+    applied = {}
+    conflicts = []
+    resolved = []
+    for (key, (old, new)) in theirs_delta.items():
+        change = ours_delta.get(key)
+        if change is None:
+            applied[key] = (ours.get(key, MISSING), new)
+            continue
+
+        if _sameValue(change[1], new):
+            continue
+
+        conflict = MergeConflict(key, old, change[1], new)
+        conflict.resolution = policy(conflict)
+        if conflict.resolution is UNRESOLVED:
+            conflicts.append(conflict)
+            continue
+
+        resolved.append(conflict)
+        if not _sameValue(conflict.resolution, change[1]):
+            applied[key] = (change[1], pyrsistent.freeze(conflict.resolution))
+
+    if len(applied) == 0:
+        return MergeResult(ours, applied, conflicts, resolved)
+
+    evolver = ours.data.evolver()
+    for (key, change) in applied.items():
+        if change[1] is MISSING:
+            del evolver[key]
+        else:
+            evolver[key] = change[1]
+    snapshot = Snapshot(evolver.persistent(), ours.version + 1, ours, applied)
+    if ours.content_hash is not None:
+        snapshot.getContentHash()
+    return MergeResult(snapshot, applied, conflicts, resolved)
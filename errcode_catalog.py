@@ -0,0 +1,459 @@
+import bisect
+import collections.abc
+import hashlib
+import mmap
+import numbers
+import struct
+import sys
+
+from .error_handling import Errcode as Errcode
+from .error_handling import ErrcodeHandleError as ErrcodeHandleError
+from .error_handling import ErrcodeHandler as ErrcodeHandler
+from .error_handling import _findDistinct
+from .error_handling import _numpyFor
+from .error_handling import _searchSortedColumn
+
+#Catalog layout (every table 8 byte aligned):
+#
+#  header:        magic, version, byte order, module count - little-endian
+#  module table:  one MODULE_ENTRY per module, sorted by module name
+#  per module:    numbers - u64 errcode numbers, sorted
+#                 records - u64 (name offset, message offset, name length,
+#                           message length) per errcode, in number order
+#                 hashes  - u64 name hashes, sorted
+#                 slots   - u32 record index per name hash, in hash order
+#  string blob:   every module name, errcode name and message, UTF-8 encoded
+#
+#Every offset is absolute from the start of the catalog, so a catalog can be
+#read in place from any buffer: a mapped file, bytes or shared memory. The
+#tables are read through typed memoryviews, so searching them runs in C.
+#That makes them native byte order: the module table and the per module
+#tables are written in the byte order of the machine that built the catalog,
+#which the header records, and a machine of the other order rejects it.
+CATALOG_MAGIC = b"SLEC"
+CATALOG_VERSION = 3
+BYTE_ORDERS = {"little": 1, "big": 2}
+
+HEADER = struct.Struct("<4sHHQ")
+#name offset, name length, count, numbers offset, records offset, hashes offset, slots offset
+MODULE_ENTRY = struct.Struct("=QQQQQQQ")
+RECORD_FIELDS = 4
+WORD_SIZE = 8
+SLOT_SIZE = 4
+
+class ErrcodeCatalogError(ErrcodeHandleError):
+    def __init__(self, message = None):
+        if message is None:
+            raise ValueError("message cannot be None")
+
+        super().__init__("sharedlib.errcode_catalog: {0}".format(message))
+
+def hashName(name):
+    return int.from_bytes(hashlib.blake2b(name, digest_size = WORD_SIZE).digest(), "little")
+
+def _align(offset):
+    return (offset + WORD_SIZE - 1) & ~(WORD_SIZE - 1)
+
+class _StringBlob:
+    def __init__(self):
+        self.chunks = []
+        self.offsets = {}
+        self.size = 0
+
+    #Identical strings are stored once.
+    def add(self, data):
+        offset = self.offsets.get(data)
+        if offset is None:
+            offset = self.size
+            self.offsets[data] = offset
+            self.chunks.append(data)
+            self.size = self.size + len(data)
+        return offset
+
+def buildCatalog(handler = None):
+    if handler is None:
+        raise ValueError("handler cannot be None.")
+
+    blob = _StringBlob()
+    modules = []
+    for mod_name in sorted(handler.modules.keys()):
+        if type(mod_name) != str:
+            raise ErrcodeCatalogError("Only str module names can be stored in a catalog: {0!r}".format(mod_name))
+
+        module = handler.modules[mod_name]
+        ordered = sorted(module.errcodes.keys())
+        records = []
+        hashed = []
+        for slot in range(0, len(ordered)):
+            number = ordered[slot]
+            if (not isinstance(number, numbers.Integral) or
+                number < ErrcodeHandler.RNG_MIN_INT_VALUE or
+                number > ErrcodeHandler.RNG_MAX_INT_VALUE):
+                raise ErrcodeCatalogError("Errcode number is outside of the storable range: {0!r}".format(number))
+
+            errcode = module.errcodes[number]
+            name = errcode.name.encode("utf-8")
+            message = errcode.message.encode("utf-8")
+            records.append((blob.add(name), blob.add(message), len(name), len(message)))
+            hashed.append((hashName(name), slot))
+
+        hashed.sort()
+        mod_name_bytes = mod_name.encode("utf-8")
+        modules.append(((blob.add(mod_name_bytes), len(mod_name_bytes)), ordered, records, hashed))
+
+    #Lay out the tables first; the blob goes at the end.
+    offset = HEADER.size + (MODULE_ENTRY.size * len(modules))
+    table_offsets = []
+    for (name, ordered, records, hashed) in modules:
+        count = len(ordered)
+        numbers_offset = offset
+        records_offset = numbers_offset + (WORD_SIZE * count)
+        hashes_offset = records_offset + (WORD_SIZE * RECORD_FIELDS * count)
+        slots_offset = hashes_offset + (WORD_SIZE * count)
+        offset = _align(slots_offset + (SLOT_SIZE * count))
+        table_offsets.append((numbers_offset, records_offset, hashes_offset, slots_offset))
+    blob_offset = offset
+
+    buffer = bytearray(blob_offset + blob.size)
+    HEADER.pack_into(buffer, 0, CATALOG_MAGIC, CATALOG_VERSION, BYTE_ORDERS[sys.byteorder], len(modules))
+
+    entry_offset = HEADER.size
+    for i in range(0, len(modules)):
+        (name_offset, name_length), ordered, records, hashed = modules[i]
+        numbers_offset, records_offset, hashes_offset, slots_offset = table_offsets[i]
+        count = len(ordered)
+        MODULE_ENTRY.pack_into(buffer, entry_offset,
+            blob_offset + name_offset, name_length, count,
+            numbers_offset, records_offset, hashes_offset, slots_offset)
+        entry_offset = entry_offset + MODULE_ENTRY.size
+
+        struct.pack_into("={0}Q".format(count), buffer, numbers_offset, *ordered)
+        flat_records = []
+        for (errcode_name_offset, message_offset, errcode_name_length, message_length) in records:
+            flat_records.extend((blob_offset + errcode_name_offset, blob_offset + message_offset,
+                                 errcode_name_length, message_length))
+        struct.pack_into("={0}Q".format(len(flat_records)), buffer, records_offset, *flat_records)
+        struct.pack_into("={0}Q".format(count), buffer, hashes_offset, *[x[0] for x in hashed])
+        struct.pack_into("={0}I".format(count), buffer, slots_offset, *[x[1] for x in hashed])
+
+    buffer[blob_offset:] = b"".join(blob.chunks)
+    return bytes(buffer)
+
+def writeCatalog(handler = None, path = None):
+    if handler is None:
+        raise ValueError("handler cannot be None.")
+
+    if path is None:
+        raise ValueError("path cannot be None.")
+
+    data = buildCatalog(handler)
+    with open(path, "wb") as catalog_file:
+        catalog_file.write(data)
+
+    return len(data)
+
+def loadCatalog(path = None):
+    if path is None:
+        raise ValueError("path cannot be None.")
+
+    with open(path, "rb") as catalog_file:
+        try:
+            mapped = mmap.mmap(catalog_file.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            raise ErrcodeCatalogError("Catalog file is empty: {0}".format(path))
+
+    try:
+        return ErrcodeCatalog(mapped)
+    except BaseException:
+        mapped.close()
+        raise
+
+#One module of an ErrcodeCatalog. Offers the same interface as an
+#ErrcodeModule, so it can stand in for one inside an ErrcodeHandler
+#(see ErrcodeHandler.freeze(compact = True)). Everything is read from the
+#catalog buffer on demand.
+class CatalogErrcodeModule:
+
+    class _ErrcodesView(collections.abc.Mapping):
+        def __init__(self, module):
+            self.module = module
+
+        def __getitem__(self, number):
+            slot = self.module.findNumber(number)
+            if slot < 0:
+                raise KeyError(number)
+            return self.module.readErrcode(slot)
+
+        def __iter__(self):
+            return iter(self.module.numbers)
+
+        def __len__(self):
+            return self.module.count
+
+        def __contains__(self, number):
+            return self.module.findNumber(number) >= 0
+
+    class _NamesView(collections.abc.Mapping):
+        def __init__(self, module):
+            self.module = module
+
+        def __getitem__(self, name):
+            slot = self.module.findName(name)
+            if slot < 0:
+                raise KeyError(name)
+            return self.module.numbers[slot]
+
+        def __iter__(self):
+            for slot in self.module.slots:
+                yield self.module.readName(slot)
+
+        def __len__(self):
+            return self.module.count
+
+        def __contains__(self, name):
+            return self.module.findName(name) >= 0
+
+    #Messages by slot, decoded on first access. Returned by getMessageIndices
+    #so a batch only decodes the messages it actually uses.
+    class _MessagesView(collections.abc.Sequence):
+        def __init__(self, module):
+            self.module = module
+            self.decoded = {}
+
+        def __getitem__(self, slot):
+            message = self.decoded.get(slot)
+            if message is None:
+                if slot < 0 or slot >= self.module.count:
+                    raise IndexError(slot)
+                message = self.module.readMessage(slot)
+                self.decoded[slot] = message
+            return message
+
+        def __len__(self):
+            return self.module.count
+
+    #The table ranges are checked by ErrcodeCatalog before this runs.
+    def __init__(self, catalog, count, numbers_offset, records_offset, hashes_offset, slots_offset):
+        self.catalog = catalog
+        self.count = count
+        self.numbers = None
+        self.records = None
+        self.hashes = None
+        self.slots = None
+        view = catalog.view
+        self.numbers = view[numbers_offset:numbers_offset + (WORD_SIZE * count)].cast("Q")
+        self.records = view[records_offset:records_offset + (WORD_SIZE * RECORD_FIELDS * count)].cast("Q")
+        self.hashes = view[hashes_offset:hashes_offset + (WORD_SIZE * count)].cast("Q")
+        self.slots = view[slots_offset:slots_offset + (SLOT_SIZE * count)].cast("I")
+        #Compiled templates by slot, for catalogs made by ErrcodeHandler.freeze().
+        self.templates = {}
+        self.errcodes = self._ErrcodesView(self)
+        self.errcodes_key_name = self._NamesView(self)
+
+    def release(self):
+        for view in (self.numbers, self.records, self.hashes, self.slots):
+            if view is not None:
+                view.release()
+
+    #Strings are range checked when read, so a damaged record fails its own
+    #lookup instead of slicing short.
+    def readString(self, offset, length):
+        view = self.catalog.view
+        if offset + length > len(view):
+            raise ErrcodeCatalogError("String at offset {0} runs past the end of the catalog.".format(offset))
+        try:
+            return str(view[offset:offset + length], "utf-8")
+        except UnicodeDecodeError:
+            raise ErrcodeCatalogError("String at offset {0} is not valid UTF-8.".format(offset))
+
+    def readName(self, slot):
+        base = slot * RECORD_FIELDS
+        return self.readString(self.records[base], self.records[base + 2])
+
+    def readMessage(self, slot):
+        base = slot * RECORD_FIELDS
+        return self.readString(self.records[base + 1], self.records[base + 3])
+
+    def readErrcode(self, slot):
+        return Errcode(self.readName(slot), self.readMessage(slot), self.numbers[slot], self.templates.get(slot))
+
+    #Both return the slot (index in number order) of the match, or -1.
+    #Integral floats find their errcode, as they do in a dict module.
+    def findNumber(self, number):
+        if not isinstance(number, numbers.Integral):
+            if not isinstance(number, numbers.Real):
+                return -1
+            try:
+                integral = int(number)
+            except (ValueError, OverflowError):
+                return -1
+            if integral != number:
+                return -1
+            number = integral
+
+        slot = bisect.bisect_left(self.numbers, number)
+        if slot < self.count and self.numbers[slot] == number:
+            return slot
+        return -1
+
+    def findName(self, name):
+        if not isinstance(name, str):
+            return -1
+
+        key = name.encode("utf-8")
+        key_hash = hashName(key)
+        index = bisect.bisect_left(self.hashes, key_hash)
+        view = self.catalog.view
+        records = self.records
+        while index < self.count and self.hashes[index] == key_hash:
+            slot = self.slots[index]
+            if slot >= self.count:
+                raise ErrcodeCatalogError("Name slot {0} is out of range.".format(slot))
+            base = slot * RECORD_FIELDS
+            offset = records[base]
+            if records[base + 2] == len(key) and view[offset:offset + len(key)] == key:
+                return slot
+            index = index + 1
+        return -1
+
+    def getMessage(self, errcode_input):
+        if isinstance(errcode_input, str):
+            slot = self.findName(errcode_input)
+            if slot < 0:
+                raise ValueError("errcode_input is not registered with any errcode.")
+
+        elif isinstance(errcode_input, numbers.Number):
+            slot = self.findNumber(errcode_input)
+            if slot < 0:
+                raise KeyError(errcode_input)
+        else:
+            raise ValueError("errcode is neither a valid name nor is it a number.")
+
+        return self.readMessage(slot)
+
+    #See ErrcodeModule.getMessageIndices. The indices are slots.
+    def getMessageIndices(self, errcode_inputs):
+        numpy = _numpyFor(errcode_inputs)
+        if numpy is not None:
+            slots = _searchSortedColumn(numpy, self.numbers, errcode_inputs)
+            if slots is not None:
+                return self._MessagesView(self), slots
+        return self._MessagesView(self), _findDistinct(errcode_inputs, self.findNumber)
+
+#Read-only errcode registry backed by a catalog buffer.
+#Mirrors the lookup side of ErrcodeHandler. Only the small module table is
+#decoded up front; errcodes are read from the buffer on every lookup.
+class ErrcodeCatalog:
+    def __init__(self, buffer = None):
+        if buffer is None:
+            raise ValueError("buffer cannot be None.")
+
+        if len(buffer) < HEADER.size:
+            raise ErrcodeCatalogError("Buffer is too small to hold a catalog.")
+
+        magic, version, byte_order, module_count = HEADER.unpack_from(buffer, 0)
+        if magic != CATALOG_MAGIC:
+            raise ErrcodeCatalogError("Buffer does not contain an errcode catalog.")
+
+        if version != CATALOG_VERSION:
+            raise ErrcodeCatalogError("Unsupported catalog version: {0}".format(version))
+
+        if byte_order != BYTE_ORDERS[sys.byteorder]:
+            raise ErrcodeCatalogError("Catalog was built on a machine of another byte order.")
+
+        size = len(buffer)
+        if HEADER.size + (MODULE_ENTRY.size * module_count) > size:
+            raise ErrcodeCatalogError("Module table runs past the end of the catalog.")
+
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.modules = {}
+        #Views made so far must be released before a failed load can close
+        #the buffer.
+        try:
+            entry_offset = HEADER.size
+            for i in range(0, module_count):
+                (name_offset, name_length, count, numbers_offset,
+                 records_offset, hashes_offset, slots_offset) = MODULE_ENTRY.unpack_from(buffer, entry_offset)
+                tables = ((name_offset, name_length), (numbers_offset, WORD_SIZE * count),
+                          (records_offset, WORD_SIZE * RECORD_FIELDS * count),
+                          (hashes_offset, WORD_SIZE * count), (slots_offset, SLOT_SIZE * count))
+                for (offset, length) in tables:
+                    if offset + length > size:
+                        raise ErrcodeCatalogError("Module {0} of the catalog runs past its end.".format(i))
+
+                try:
+                    mod_name = str(self.view[name_offset:name_offset + name_length], "utf-8")
+                except UnicodeDecodeError:
+                    raise ErrcodeCatalogError("Module {0} has a name that is not valid UTF-8.".format(i))
+                self.modules[mod_name] = CatalogErrcodeModule(self, count, numbers_offset,
+                                                              records_offset, hashes_offset, slots_offset)
+                entry_offset = entry_offset + MODULE_ENTRY.size
+        except BaseException as err:
+            self.__releaseViews()
+            self.buffer = None
+            if isinstance(err, (TypeError, ValueError)) and not isinstance(err, ErrcodeCatalogError):
+                raise ErrcodeCatalogError("Damaged catalog: {0}".format(err))
+            raise
+
+    def __releaseViews(self):
+        for module in self.modules.values():
+            module.release()
+        self.view.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #Views into the buffer have to be released before a mapped file or a
+    #shared memory segment can be closed.
+    def close(self):
+        if self.buffer is None:
+            return
+
+        self.__releaseViews()
+        close = getattr(self.buffer, "close", None)
+        if close is not None:
+            close()
+        self.buffer = None
+
+    def getModuleNames(self):
+        return list(self.modules.keys())
+
+    def __getModule(self, mod_name, errcode_input):
+        if mod_name is None:
+            raise ValueError("mod_name cannot be None")
+
+        if errcode_input is None:
+            raise ValueError("errcode_input cannot be None.")
+
+        if self.buffer is None:
+            raise ErrcodeCatalogError("Catalog has been closed.")
+
+        module = self.modules.get(mod_name)
+        if module is None:
+            raise ErrcodeHandleError("mod_name is not associated with a registered module.")
+
+        return module
+
+    def getErrcode(self, mod_name = None, errcode_input = None):
+        module = self.__getModule(mod_name, errcode_input)
+        if isinstance(errcode_input, str):
+            slot = module.findName(errcode_input)
+            if slot < 0:
+                raise ValueError("errcode_input is not registered with any errcode.")
+            return module.readErrcode(slot)
+        return module.errcodes[errcode_input]
+
+    def getMessage(self, mod_name = None, errcode_input = None):
+        return self.__getModule(mod_name, errcode_input).getMessage(errcode_input)
+
+    #Batch lookups; see ErrcodeHandler.getMessageIndices and getMessages.
+    def getMessageIndices(self, mod_name = None, errcode_inputs = None):
+        return self.__getModule(mod_name, errcode_inputs).getMessageIndices(errcode_inputs)
+
+    def getMessages(self, mod_name = None, errcode_inputs = None, default = None, strict = True):
+        messages, indices = self.getMessageIndices(mod_name, errcode_inputs)
+        return ErrcodeHandler.resolveMessages(mod_name, errcode_inputs, messages, indices, default, strict)
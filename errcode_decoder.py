@@ -0,0 +1,286 @@
+import argparse
+import importlib
+import mmap
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+from .error_handling import ErrcodeHandleError as ErrcodeHandleError
+from .error_handling import ErrcodeHandler as ErrcodeHandler
+
+#Rewrites the errcodes found in log files into their names and messages.
+#
+#The log is memory-mapped and cut into chunks that end on a line boundary.
+#Each chunk is rewritten with a single regular expression substitution, so
+#the scanning runs in C and Python code only runs per errcode found; the
+#replacement text is built once per distinct errcode. In parallel mode the
+#chunks are handed to worker processes that map the file themselves, and
+#the results are written back in order.
+#
+#Usage: python -m sharedlib.errcode_decoder LOG (--catalog PATH | --registry MODULE[:ATTRIBUTE]) [options]
+
+#Matches "errcode=<number>" or "errcode=<mod_name>:<number>".
+#Patterns should start with a literal: the regex engine then searches for it
+#with a fast scan, while a leading \b or lookbehind makes it several times
+#slower.
+DEFAULT_PATTERN = rb"errcode=(?:(?P<module>[\w.]+):)?(?P<number>\d+)"
+DEFAULT_TEMPLATE = "{match} ({mod_name}.{name}: {message})"
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+class ErrcodeDecoderError(ErrcodeHandleError):
+    def __init__(self, message = None):
+        if message is None:
+            raise ValueError("message cannot be None")
+
+        super().__init__("sharedlib.errcode_decoder: {0}".format(message))
+
+#Decodes errcodes in log data using any registry with a "modules" dict:
+#an ErrcodeHandler, a frozen one or an ErrcodeCatalog.
+#pattern: bytes regular expression with a "number" group and an optional
+#"module" group. Without a module in the match, mod_name is used, or the
+#errcode is looked up in every module and only decoded when exactly one
+#module has it.
+#template: str.format template with match, mod_name, name, message and number.
+#Errcodes that cannot be decoded are left as they are.
+class ErrcodeLogDecoder:
+    def __init__(self, registry = None, mod_name = None, pattern = DEFAULT_PATTERN, template = DEFAULT_TEMPLATE):
+        if registry is None:
+            raise ValueError("registry cannot be None.")
+
+        if pattern is None:
+            raise ValueError("pattern cannot be None.")
+
+        if template is None:
+            raise ValueError("template cannot be None.")
+
+        if mod_name is not None and mod_name not in registry.modules:
+            raise ErrcodeDecoderError("mod_name is not associated with a registered module: {0}".format(mod_name))
+
+        self.registry = registry
+        self.mod_name = mod_name
+        self.pattern = re.compile(pattern)
+        if "number" not in self.pattern.groupindex:
+            raise ErrcodeDecoderError("pattern must have a group named \"number\".")
+        self.template = template
+
+        #match bytes -> replacement bytes, or None when it cannot be decoded.
+        self.replacements = {}
+        self.decoded = 0
+        self.unknown = 0
+
+    def __findErrcode(self, mod_name, number):
+        if mod_name is not None:
+            module = self.registry.modules.get(mod_name)
+            if module is None:
+                return None, None
+            return mod_name, module.errcodes.get(number)
+
+        found = None
+        for (candidate, module) in self.registry.modules.items():
+            errcode = module.errcodes.get(number)
+            if errcode is not None:
+                if found is not None:
+                    return None, None
+                found = (candidate, errcode)
+        if found is None:
+            return None, None
+        return found
+
+    def __replacement(self, match):
+        number = int(match.group("number"))
+        mod_name = self.mod_name
+        if "module" in self.pattern.groupindex and match.group("module") is not None:
+            mod_name = match.group("module").decode("utf-8", "replace")
+
+        mod_name, errcode = self.__findErrcode(mod_name, number)
+        if errcode is None:
+            return None
+
+        return self.template.format(
+            match = match.group(0).decode("utf-8", "replace"),
+            mod_name = mod_name,
+            name = errcode.name,
+            message = errcode.message,
+            number = number).encode("utf-8")
+
+    def __substitute(self, match):
+        token = match.group(0)
+        try:
+            replacement = self.replacements[token]
+        except KeyError:
+            replacement = self.__replacement(match)
+            self.replacements[token] = replacement
+
+        if replacement is None:
+            self.unknown = self.unknown + 1
+            return token
+        self.decoded = self.decoded + 1
+        return replacement
+
+    #data: bytes or any buffer, such as a memoryview into a mapped file.
+    def decode(self, data = None):
+        if data is None:
+            raise ValueError("data cannot be None.")
+
+        return self.pattern.sub(self.__substitute, data)
+
+#Yields (start, stop) ranges of roughly chunk_size bytes that end right after
+#a newline, or at the end of the buffer.
+def splitLines(buffer = None, chunk_size = DEFAULT_CHUNK_SIZE, start = 0, stop = None):
+    if buffer is None:
+        raise ValueError("buffer cannot be None.")
+
+    if chunk_size is None or chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive number.")
+
+    if stop is None:
+        stop = len(buffer)
+
+    while start < stop:
+        end = start + chunk_size
+        if end >= stop:
+            end = stop
+        else:
+            newline = buffer.find(b"\n", end - 1, stop)
+            end = stop if newline < 0 else newline + 1
+        yield start, end
+        start = end
+
+#Loads the registry named on the command line. Returns (registry, catalog),
+#where catalog is the ErrcodeCatalog to close afterwards, if any.
+def loadRegistry(catalog_path = None, registry_name = None):
+    if catalog_path is not None:
+        from . import errcode_catalog
+        catalog = errcode_catalog.loadCatalog(catalog_path)
+        return catalog, catalog
+
+    if registry_name is None:
+        raise ValueError("Either catalog_path or registry_name is required.")
+
+    #"package.module" registers its errcodes with ErrcodeHandler.instance
+    #when imported; "package.module:attribute" names a handler of its own.
+    module_name, separator, attribute = registry_name.partition(":")
+    module = importlib.import_module(module_name)
+    if separator:
+        return getattr(module, attribute), None
+    return ErrcodeHandler.instance, None
+
+#Per worker process state; see _initWorker.
+_worker_decoder = None
+_worker_buffers = {}
+
+def _initWorker(catalog_path, registry_name, mod_name, pattern, template):
+    global _worker_decoder
+    registry, catalog = loadRegistry(catalog_path, registry_name)
+    _worker_decoder = ErrcodeLogDecoder(registry, mod_name, pattern, template)
+
+def _decodeRange(task):
+    path, start, stop = task
+    mapped = _worker_buffers.get(path)
+    if mapped is None:
+        with open(path, "rb") as log_file:
+            mapped = mmap.mmap(log_file.fileno(), 0, access = mmap.ACCESS_READ)
+        _worker_buffers[path] = mapped
+
+    decoded = _worker_decoder.decoded
+    unknown = _worker_decoder.unknown
+    with memoryview(mapped) as view:
+        data = _worker_decoder.decode(view[start:stop])
+    return data, _worker_decoder.decoded - decoded, _worker_decoder.unknown - unknown
+
+#Decodes the log at "path" into the binary file object "output".
+#jobs: worker processes to use; 1 decodes in this process.
+#Returns (bytes read, errcodes decoded, errcodes left undecoded).
+def decodeFile(path = None, output = None, decoder = None, jobs = 1, chunk_size = DEFAULT_CHUNK_SIZE,
+               catalog_path = None, registry_name = None):
+    if path is None:
+        raise ValueError("path cannot be None.")
+
+    if output is None:
+        raise ValueError("output cannot be None.")
+
+    if decoder is None:
+        raise ValueError("decoder cannot be None.")
+
+    if os.path.getsize(path) == 0:
+        return 0, 0, 0
+
+    with open(path, "rb") as log_file:
+        mapped = mmap.mmap(log_file.fileno(), 0, access = mmap.ACCESS_READ)
+
+    try:
+        #Sequential access lets the kernel read ahead aggressively.
+        if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+        size = len(mapped)
+        if jobs <= 1:
+            decoded = decoder.decoded
+            unknown = decoder.unknown
+            with memoryview(mapped) as view:
+                for (start, stop) in splitLines(mapped, chunk_size):
+                    output.write(decoder.decode(view[start:stop]))
+            return size, decoder.decoded - decoded, decoder.unknown - unknown
+
+        #Workers cannot be handed the registry itself, so they load their own
+        #from the same source.
+        if catalog_path is None and registry_name is None:
+            raise ValueError("catalog_path or registry_name is required when jobs > 1.")
+
+        tasks = [(path, start, stop) for (start, stop) in splitLines(mapped, chunk_size)]
+    finally:
+        mapped.close()
+
+    decoded = 0
+    unknown = 0
+    initargs = (catalog_path, registry_name, decoder.mod_name, decoder.pattern.pattern, decoder.template)
+    with multiprocessing.Pool(jobs, _initWorker, initargs) as pool:
+        for (data, chunk_decoded, chunk_unknown) in pool.imap(_decodeRange, tasks):
+            output.write(data)
+            decoded = decoded + chunk_decoded
+            unknown = unknown + chunk_unknown
+    return size, decoded, unknown
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Rewrite errcodes in a log file into their names and messages.")
+    parser.add_argument("log", help = "log file to decode")
+    source = parser.add_mutually_exclusive_group(required = True)
+    source.add_argument("--catalog", help = "errcode catalog file, see sharedlib.errcode_catalog")
+    source.add_argument("--registry", help = "module that registers the errcodes, as package.module[:handler_attribute]")
+    parser.add_argument("--module", dest = "mod_name", help = "module of errcodes that are not module-qualified in the log")
+    parser.add_argument("--pattern", default = DEFAULT_PATTERN.decode("ascii"),
+                        help = "regular expression with a \"number\" group and an optional \"module\" group")
+    parser.add_argument("--format", dest = "template", default = DEFAULT_TEMPLATE,
+                        help = "replacement, using {match}, {mod_name}, {name}, {message} and {number}")
+    parser.add_argument("-o", "--output", help = "output file (default: standard output)")
+    parser.add_argument("-j", "--jobs", type = int, default = 1, help = "worker processes (default: 1)")
+    parser.add_argument("--chunk-size", type = int, default = DEFAULT_CHUNK_SIZE, help = "bytes per chunk")
+    parser.add_argument("--stats", action = "store_true", help = "print throughput to standard error")
+    args = parser.parse_args(argv)
+
+    registry, catalog = loadRegistry(args.catalog, args.registry)
+    try:
+        decoder = ErrcodeLogDecoder(registry, args.mod_name, args.pattern.encode("utf-8"), args.template)
+        output = sys.stdout.buffer if args.output is None else open(args.output, "wb")
+        try:
+            start = time.perf_counter()
+            size, decoded, unknown = decodeFile(args.log, output, decoder, args.jobs, args.chunk_size,
+                                                args.catalog, args.registry)
+            output.flush()
+            elapsed = time.perf_counter() - start
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+    finally:
+        if catalog is not None:
+            catalog.close()
+
+    if args.stats:
+        print("{0:,} bytes in {1:.2f}s ({2:,.1f} MiB/s), {3:,} errcodes decoded, {4:,} left undecoded".format(
+            size, elapsed, size / (1024 * 1024) / max(elapsed, 1e-9), decoded, unknown), file = sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+import asyncio
+import atexit
+import collections
+import json
+import threading
+import time
+
+from . import error_handling
+from .error_handling import ErrcodeHandleError as ErrcodeHandleError
+
+#Asynchronous error-event pipeline.
+#
+#Producers push (mod_name, errcode, context) events into a bounded ring
+#buffer and return immediately; a background thread, or an asyncio task,
+#takes them out in batches and hands each batch to a sink. Recording an
+#error is therefore a deque append, and the sink's I/O happens off the
+#error path.
+#
+#When the buffer is full, the policy decides what happens:
+#  DROP_OLDEST - the oldest event is overwritten (a plain ring buffer)
+#  DROP_NEWEST - the new event is discarded
+#  BLOCK       - the producer waits for room, up to block_timeout seconds,
+#                and the event is discarded if none frees up
+#Discarded events are counted in "dropped". The count is exact for a single
+#producer and may undercount when several producers drop at the same time.
+#
+#Pending events are flushed by close(), at interpreter exit and by
+#error_handling.die().
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+class ErrcodeEventError(ErrcodeHandleError):
+    def __init__(self, message = None):
+        if message is None:
+            raise ValueError("message cannot be None")
+
+        super().__init__("sharedlib.errcode_events: {0}".format(message))
+
+#Events travel through the buffer as plain tuples, which are cheaper to
+#create on the error path than objects:
+#(mod_name, errcode, context, timestamp).
+EVENT_FIELDS = ("mod_name", "errcode", "context", "timestamp")
+
+#Sink that appends every event to a file as a line of JSON.
+class JSONLinesEventSink:
+    def __init__(self, path = None, output = None):
+        if path is None and output is None:
+            raise ValueError("Either path or output is required.")
+
+        self.output = output if output is not None else open(path, "a")
+        self.owned = output is None
+
+    def __call__(self, batch):
+        self.output.write("".join(
+            json.dumps(dict(zip(EVENT_FIELDS, event)), default = str) + "\n" for event in batch))
+
+    def flush(self):
+        self.output.flush()
+
+    def close(self):
+        if self.owned:
+            self.output.close()
+        else:
+            self.output.flush()
+
+class ErrcodeEventPipeline:
+    #sink: callable taking a list of event tuples; it may also have flush()
+    #and close(). capacity: events held at most. batch_size: events per sink
+    #call, and the fill level that wakes the consumer early.
+    #flush_interval: seconds the consumer sleeps between batches otherwise.
+    def __init__(self, sink = None, capacity = 65536, policy = DROP_OLDEST,
+                 batch_size = 1024, flush_interval = 0.1, block_timeout = None):
+        if sink is None:
+            raise ValueError("sink cannot be None.")
+
+        if policy not in POLICIES:
+            raise ValueError("policy must be one of: {0}".format(", ".join(POLICIES)))
+
+        if capacity is None or capacity <= 0:
+            raise ValueError("capacity must be a positive number.")
+
+        if batch_size is None or batch_size <= 0:
+            raise ValueError("batch_size must be a positive number.")
+
+        self.sink = sink
+        self.capacity = capacity
+        self.policy = policy
+        self.batch_size = min(batch_size, capacity)
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+
+        #A deque with maxlen is the ring buffer: appending to a full one
+        #drops from the other end, and both ends are atomic under the GIL.
+        self.buffer = collections.deque(maxlen = capacity if policy == DROP_OLDEST else None)
+        self.wakeup = threading.Event()
+        self.room = threading.Condition()
+        self.drain_lock = threading.RLock()
+
+        self.dropped = 0
+        self.written = 0
+        self.sink_errors = 0
+        self.last_sink_error = None
+
+        self.thread = None
+        self.task = None
+        self.closed = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __register(self):
+        error_handling.registerShutdownHook(self.flush)
+        atexit.register(self.close)
+
+    #Starts the background consumer thread.
+    def start(self):
+        if self.closed:
+            raise ErrcodeEventError("Pipeline has been closed.")
+
+        if self.thread is not None or self.task is not None:
+            return
+
+        self.thread = threading.Thread(target = self.__run, name = "errcode-events", daemon = True)
+        self.thread.start()
+        self.__register()
+
+    #Consumes the buffer from an asyncio task instead of a thread. The sink
+    #runs in the loop's default executor, so it may block.
+    def startAsync(self, loop = None):
+        if self.closed:
+            raise ErrcodeEventError("Pipeline has been closed.")
+
+        if self.thread is not None or self.task is not None:
+            return self.task
+
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        self.task = loop.create_task(self.__runAsync())
+        self.__register()
+        return self.task
+
+    #Queues an event. Returns False when it was discarded: because of the
+    #policy, or because the pipeline is closed.
+    def push(self, mod_name = None, errcode = None, context = None):
+        buffer = self.buffer
+        if self.closed:
+            self.dropped = self.dropped + 1
+            return False
+
+        if len(buffer) >= self.capacity:
+            if self.policy == DROP_NEWEST:
+                self.dropped = self.dropped + 1
+                return False
+            elif self.policy == DROP_OLDEST:
+                self.dropped = self.dropped + 1
+            elif not self.__waitForRoom():
+                self.dropped = self.dropped + 1
+                return False
+
+        buffer.append((mod_name, errcode, context, time.time()))
+        if len(buffer) >= self.batch_size and not self.wakeup.is_set():
+            self.wakeup.set()
+        return True
+
+    def __waitForRoom(self):
+        self.wakeup.set()
+        if self.closed:
+            return False
+
+        #Without a consumer nobody will make room; drain here instead.
+        if self.thread is None and self.task is None:
+            self.drain()
+            return True
+
+        with self.room:
+            return self.room.wait_for(lambda: len(self.buffer) < self.capacity, self.block_timeout)
+
+    def __write(self, batch):
+        try:
+            self.sink(batch)
+            self.written = self.written + len(batch)
+        except Exception as err:
+            self.sink_errors = self.sink_errors + 1
+            self.last_sink_error = err
+
+    #Hands every pending event to the sink, batch_size at a time, in the
+    #calling thread. Returns the number of events taken out.
+    def drain(self):
+        retval = 0
+        with self.drain_lock:
+            popleft = self.buffer.popleft
+            batch_size = self.batch_size
+            while True:
+                batch = []
+                append = batch.append
+                try:
+                    for i in range(0, batch_size):
+                        append(popleft())
+                except IndexError:
+                    pass
+                if len(batch) == 0:
+                    break
+                self.__write(batch)
+                retval = retval + len(batch)
+                if self.policy == BLOCK:
+                    with self.room:
+                        self.room.notify_all()
+        return retval
+
+    def __run(self):
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.drain()
+
+    async def __runAsync(self):
+        loop = asyncio.get_running_loop()
+        while not self.closed:
+            if len(self.buffer) > 0:
+                await loop.run_in_executor(None, self.drain)
+            await asyncio.sleep(self.flush_interval)
+
+    #Writes out everything pending and flushes the sink.
+    def flush(self):
+        self.drain()
+        flush = getattr(self.sink, "flush", None)
+        if flush is not None:
+            try:
+                flush()
+            except Exception as err:
+                self.sink_errors = self.sink_errors + 1
+                self.last_sink_error = err
+
+    #Stops the consumer, flushes what is left and closes the sink.
+    def close(self, timeout = None):
+        if self.closed:
+            return
+
+        self.closed = True
+        self.wakeup.set()
+        with self.room:
+            self.room.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+        if self.task is not None:
+            self.task.cancel()
+
+        self.flush()
+        error_handling.unregisterShutdownHook(self.flush)
+        atexit.unregister(self.close)
+        close = getattr(self.sink, "close", None)
+        if close is not None:
+            close()
+
+    def getStats(self):
+        return {
+            "pending": len(self.buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "sink_errors": self.sink_errors,
+        }
@@ -0,0 +1,169 @@
+import os
+import threading
+
+from . import errcode_catalog
+from .error_handling import ErrcodeHandleError as ErrcodeHandleError
+from .error_handling import ErrcodeHandler as ErrcodeHandler
+
+#Per-locale errcode message catalogs.
+#
+#Every locale is an errcode catalog file (see errcode_catalog) holding the
+#translated messages under the same module and errcode names as the
+#registry. Nothing is read until a locale is first looked up; the file is
+#then memory-mapped, so only the pages holding the messages actually used
+#are read, and processes sharing a catalog file share its page cache.
+#
+#A lookup walks the fallback chain of the requested locale, e.g. "pt_BR"
+#-> "pt" -> default locale, and the first locale that has a translation
+#wins. Results, misses included, are cached per locale.
+#
+#Usage:
+#    handler.setLocaleCatalogs(ErrcodeLocaleCatalogs("/usr/share/myapp/errcodes"))
+#    handler.getMessage("my_mod", "NotFound", locale = "pt_BR")
+
+CATALOG_SUFFIX = ".catalog"
+
+class ErrcodeLocaleError(ErrcodeHandleError):
+    def __init__(self, message = None):
+        if message is None:
+            raise ValueError("message cannot be None")
+
+        super().__init__("sharedlib.errcode_locale: {0}".format(message))
+
+#rows: (mod_name, name, message) with the translated message, or the
+#4-tuples accepted by ErrcodeHandler.registerErrcodes.
+def writeLocaleCatalog(path = None, rows = None):
+    if path is None:
+        raise ValueError("path cannot be None.")
+
+    if rows is None:
+        raise ValueError("rows cannot be None.")
+
+    handler = ErrcodeHandler()
+    handler.registerErrcodes(rows)
+    return errcode_catalog.writeCatalog(handler, path)
+
+#"pt-BR.UTF-8" -> "pt_BR"
+def normalizeLocale(locale = None):
+    if locale is None:
+        raise ValueError("locale cannot be None.")
+
+    return locale.split(".")[0].split("@")[0].replace("-", "_")
+
+class ErrcodeLocaleCatalogs:
+    #directory: optional directory of "<locale>.catalog" files, listed (but
+    #not read) up front. default_locale: last entry of every fallback chain.
+    def __init__(self, directory = None, default_locale = None):
+        self.paths = {}
+        self.fallbacks = {}
+        self.default_locale = None if default_locale is None else normalizeLocale(default_locale)
+
+        self.catalogs = {}
+        self.caches = {}
+        self.chains = {}
+        self.load_lock = threading.Lock()
+
+        if directory is not None:
+            for file_name in os.listdir(directory):
+                if file_name.endswith(CATALOG_SUFFIX):
+                    self.addLocale(file_name[:-len(CATALOG_SUFFIX)], os.path.join(directory, file_name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def addLocale(self, locale = None, path = None):
+        if locale is None:
+            raise ValueError("locale cannot be None.")
+
+        if path is None:
+            raise ValueError("path cannot be None.")
+
+        self.paths[normalizeLocale(locale)] = path
+        self.chains = {}
+
+    #Locales tried after "locale" itself and before its parent language.
+    def setFallbacks(self, locale = None, fallbacks = None):
+        if locale is None:
+            raise ValueError("locale cannot be None.")
+
+        if fallbacks is None:
+            raise ValueError("fallbacks cannot be None.")
+
+        self.fallbacks[normalizeLocale(locale)] = [normalizeLocale(x) for x in fallbacks]
+        self.chains = {}
+
+    def getLocales(self):
+        return sorted(self.paths.keys())
+
+    def isLoaded(self, locale = None):
+        return normalizeLocale(locale) in self.catalogs
+
+    #Known locales to try for "locale", in order.
+    def getFallbackChain(self, locale = None):
+        chain = self.chains.get(locale)
+        if chain is not None:
+            return chain
+
+        normalized = normalizeLocale(locale)
+        candidates = [normalized]
+        candidates.extend(self.fallbacks.get(normalized, ()))
+        parts = normalized.split("_")
+        for i in range(len(parts) - 1, 0, -1):
+            candidates.append("_".join(parts[:i]))
+        if self.default_locale is not None:
+            candidates.append(self.default_locale)
+
+        chain = tuple(x for x in dict.fromkeys(candidates) if x in self.paths)
+        self.chains[locale] = chain
+        return chain
+
+    def __getCatalog(self, locale):
+        catalog = self.catalogs.get(locale)
+        if catalog is not None:
+            return catalog
+
+        with self.load_lock:
+            catalog = self.catalogs.get(locale)
+            if catalog is None:
+                try:
+                    catalog = errcode_catalog.loadCatalog(self.paths[locale])
+                except (OSError, errcode_catalog.ErrcodeCatalogError) as err:
+                    raise ErrcodeLocaleError("Unable to load the catalog of locale {0}: {1}".format(locale, err))
+                self.caches[locale] = {}
+                self.catalogs[locale] = catalog
+        return catalog
+
+    #Returns the translated message, or None when no locale of the chain
+    #has one.
+    def getMessage(self, locale = None, mod_name = None, name = None):
+        if locale is None:
+            raise ValueError("locale cannot be None.")
+
+        key = (mod_name, name)
+        for candidate in self.getFallbackChain(locale):
+            cache = self.caches.get(candidate)
+            if cache is not None and key in cache:
+                message = cache[key]
+            else:
+                catalog = self.__getCatalog(candidate)
+                message = None
+                module = catalog.modules.get(mod_name)
+                if module is not None:
+                    slot = module.findName(name)
+                    if slot >= 0:
+                        message = module.readMessage(slot)
+                self.caches[candidate][key] = message
+
+            if message is not None:
+                return message
+        return None
+
+    def close(self):
+        with self.load_lock:
+            for catalog in self.catalogs.values():
+                catalog.close()
+            self.catalogs = {}
+            self.caches = {}
@@ -0,0 +1,180 @@
+import multiprocessing
+import os
+import sys
+from multiprocessing import shared_memory
+
+from . import errcode_catalog
+from .error_handling import ErrcodeHandleError as ErrcodeHandleError
+from .error_handling import ErrcodeHandler as ErrcodeHandler
+
+#Errcode registry shared between processes.
+#
+#The parent registers its errcodes once and publishes them as an errcode
+#catalog (see errcode_catalog) in a multiprocessing.shared_memory segment.
+#Workers attach to the segment instead of registering, and get a frozen
+#handler whose lookups read the shared tables in place: N workers share one
+#copy of the registry and skip registration at spawn.
+#
+#Parent:
+#    published = errcode_shared.publishRegistry(ErrcodeHandler.instance)
+#    ... start workers, which inherit the segment name through the
+#    ... environment, then after they exited:
+#    published.close()
+#
+#Worker:
+#    if not errcode_shared.installFromEnvironment():
+#        registerMyErrcodes()
+#
+#Templates (see MessageTemplate) are not part of a catalog, so attached
+#handlers only have plain messages.
+
+ENVIRONMENT_VARIABLE = "SHAREDLIB_ERRCODE_REGISTRY"
+
+#Segments published by this process.
+published_names = set()
+
+class ErrcodeSharedError(ErrcodeHandleError):
+    def __init__(self, message = None):
+        if message is None:
+            raise ValueError("message cannot be None")
+
+        super().__init__("sharedlib.errcode_shared: {0}".format(message))
+
+#The published segment, owned by the parent. close() removes it; workers
+#that are still attached keep their mapping until they close it.
+class SharedErrcodeRegistry:
+    def __init__(self, shm, size):
+        self.shm = shm
+        self.name = shm.name
+        self.size = size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.shm is None:
+            return
+
+        if os.environ.get(ENVIRONMENT_VARIABLE) == self.name:
+            del os.environ[ENVIRONMENT_VARIABLE]
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        published_names.discard(self.name)
+        self.shm = None
+
+#A frozen ErrcodeHandler reading a published registry.
+class SharedErrcodeHandler(ErrcodeHandler):
+    def __init__(self, shm = None, catalog = None, view = None):
+        if shm is None:
+            raise ValueError("shm cannot be None.")
+
+        if catalog is None:
+            raise ValueError("catalog cannot be None.")
+
+        super().__init__()
+        self.shm = shm
+        self.catalog = catalog
+        self.view = view
+        self.modules = dict(catalog.modules)
+        self.frozen = True
+
+    #There is no reverse index in the shared tables; every module is
+    #searched instead.
+    def findErrcode(self, number = None):
+        if number is None:
+            raise ValueError("number cannot be None.")
+
+        found = [(mod_name, module) for (mod_name, module) in self.modules.items() if number in module.errcodes]
+        if len(found) == 0:
+            raise ValueError("number is not registered with any errcode.")
+
+        if len(found) > 1:
+            raise ErrcodeHandleError("Errcode {0} is registered by more than one module: {1}".format(
+                number, ", ".join(sorted(str(x[0]) for x in found))))
+
+        return found[0][0], found[0][1].errcodes[number]
+
+    #Lookups fail once the handler is closed.
+    def close(self):
+        if self.shm is None:
+            return
+
+        self.modules = {}
+        self.catalog.close()
+        if self.view is not None:
+            self.view.release()
+        self.shm.close()
+        self.shm = None
+
+#Copies the registry of "handler" into a new shared memory segment.
+#export: also store the segment name in the environment, where workers
+#started afterwards find it (see installFromEnvironment).
+def publishRegistry(handler = None, name = None, export = True):
+    if handler is None:
+        raise ValueError("handler cannot be None.")
+
+    data = errcode_catalog.buildCatalog(handler)
+    shm = shared_memory.SharedMemory(name = name, create = True, size = max(len(data), 1))
+    try:
+        shm.buf[:len(data)] = data
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+
+    published_names.add(shm.name)
+    if export:
+        os.environ[ENVIRONMENT_VARIABLE] = shm.name
+    return SharedErrcodeRegistry(shm, len(data))
+
+def _attachSegment(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name = name, track = False)
+
+    #Before Python 3.13 attaching also registers the segment with the
+    #resource tracker, which removes it when the tracker exits. Workers
+    #started through multiprocessing, and the publisher itself, share the
+    #tracker of the publisher, where the segment is already registered.
+    #Any other process gets its own tracker and has to take the segment back
+    #out of it, or its exit would remove the segment under the feet of the
+    #publisher and the other workers.
+    shm = shared_memory.SharedMemory(name = name)
+    if name not in published_names and multiprocessing.parent_process() is None:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+#Attaches to a published registry. The catalog is read through a read-only
+#view of the segment, so workers cannot change it.
+def attachRegistry(name = None):
+    if name is None:
+        raise ValueError("name cannot be None.")
+
+    try:
+        shm = _attachSegment(name)
+    except FileNotFoundError:
+        raise ErrcodeSharedError("No published errcode registry named {0}".format(name))
+
+    try:
+        view = shm.buf.toreadonly()
+        catalog = errcode_catalog.ErrcodeCatalog(view)
+    except BaseException:
+        shm.close()
+        raise
+    return SharedErrcodeHandler(shm, catalog, view)
+
+#Makes ErrcodeHandler.instance the registry published by the parent, if
+#there is one. Returns whether it did.
+def installFromEnvironment():
+    name = os.environ.get(ENVIRONMENT_VARIABLE)
+    if name is None:
+        return False
+
+    ErrcodeHandler.instance = attachRegistry(name)
+    return True
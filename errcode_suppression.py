@@ -0,0 +1,162 @@
+import threading
+import time
+
+#Rate limiting and deduplication of repeated errcodes.
+#
+#An ErrcodeSuppressor decides per (mod_name, errcode) whether an occurrence
+#should be reported. Callers ask allow() before paying for the message
+#lookup, the formatting and the I/O of a report. Occurrences that are held
+#back are counted, and once per window a summary record with that count is
+#handed to "emit".
+#
+#Two policies:
+#  window - the first "burst" occurrences per window are allowed, the rest
+#           of the window is suppressed.
+#  token  - a token bucket refilled at "rate" per second that holds up to
+#           "burst" tokens. It is implemented as a generic cell rate
+#           algorithm, so a key only stores the time its next occurrence
+#           may pass instead of a token count to refill.
+#
+#Each key keeps a single "gate" time before which every occurrence is
+#suppressed. A suppressed occurrence therefore costs a dict probe, a clock
+#read and an increment; only allowed occurrences and window rollovers take
+#the slow path, which runs under a lock.
+
+WINDOW = "window"
+TOKEN = "token"
+POLICIES = (WINDOW, TOKEN)
+
+#Per key state, kept in a list so the fast path can update it in place.
+GATE = 0
+SUPPRESSED = 1
+WINDOW_START = 2
+WINDOW_END = 3
+PASSED = 4
+ARRIVAL = 5 #Theoretical arrival time of the token policy.
+
+class ErrcodeSuppressor:
+    #emit: called with a summary dict per key and window that suppressed
+    #anything: {"mod_name", "errcode", "suppressed", "window_start", "window_end"}.
+    #window: seconds per summary window, and the dedupe window of the window
+    #policy. burst: occurrences allowed back to back. rate: tokens per
+    #second for the token policy. clock: monotonic time source in seconds.
+    def __init__(self, emit = None, policy = WINDOW, window = 60.0, burst = 1, rate = None, clock = time.monotonic):
+        if policy not in POLICIES:
+            raise ValueError("policy must be one of: {0}".format(", ".join(POLICIES)))
+
+        if window is None or window <= 0:
+            raise ValueError("window must be a positive number.")
+
+        if burst is None or burst < 1:
+            raise ValueError("burst must be at least 1.")
+
+        if policy == TOKEN and (rate is None or rate <= 0):
+            raise ValueError("rate must be a positive number for the token policy.")
+
+        if clock is None:
+            raise ValueError("clock cannot be None.")
+
+        self.emit = emit
+        self.policy = policy
+        self.window = window
+        self.burst = burst
+        self.rate = rate
+        self.clock = clock
+        if policy == TOKEN:
+            self.interval = 1.0 / rate
+            self.tolerance = (burst - 1) * self.interval
+
+        self.states = {}
+        self.lock = threading.Lock()
+
+    #Returns True when this occurrence should be reported.
+    def allow(self, mod_name = None, errcode = None):
+        key = (mod_name, errcode)
+        state = self.states.get(key)
+        now = self.clock()
+        if state is not None and now < state[GATE]:
+            state[SUPPRESSED] = state[SUPPRESSED] + 1
+            return False
+
+        with self.lock:
+            return self.__admit(key, now)
+
+    def __admit(self, key, now):
+        state = self.states.get(key)
+        if state is None:
+            state = [now, 0, now, now + self.window, 0, now]
+            self.states[key] = state
+        elif now >= state[WINDOW_END]:
+            self.__summarize(key, state)
+            state[SUPPRESSED] = 0
+            state[WINDOW_START] = now
+            state[WINDOW_END] = now + self.window
+            state[PASSED] = 0
+
+        if self.policy == WINDOW:
+            if state[PASSED] >= self.burst:
+                state[SUPPRESSED] = state[SUPPRESSED] + 1
+                state[GATE] = state[WINDOW_END]
+                return False
+            state[PASSED] = state[PASSED] + 1
+            state[GATE] = state[WINDOW_END] if state[PASSED] >= self.burst else now
+            return True
+
+        #Another thread may have moved the gate since the fast path.
+        gate = state[ARRIVAL] - self.tolerance
+        if now < gate:
+            state[SUPPRESSED] = state[SUPPRESSED] + 1
+            state[GATE] = min(gate, state[WINDOW_END])
+            return False
+        state[ARRIVAL] = max(state[ARRIVAL], now) + self.interval
+        state[PASSED] = state[PASSED] + 1
+        state[GATE] = min(state[ARRIVAL] - self.tolerance, state[WINDOW_END])
+        return True
+
+    def __summarize(self, key, state):
+        if state[SUPPRESSED] == 0 or self.emit is None:
+            return
+
+        self.emit({
+            "mod_name": key[0],
+            "errcode": key[1],
+            "suppressed": state[SUPPRESSED],
+            "window_start": state[WINDOW_START],
+            "window_end": state[WINDOW_END],
+        })
+
+    #Emits the summaries of every window that has ended and forgets keys
+    #that went quiet, so memory stays bounded by the active keys. Windows
+    #otherwise only roll over on the next occurrence of their key, so call
+    #this periodically. force: also summarize windows still in progress,
+    #e.g. before exiting.
+    def collect(self, force = False):
+        now = self.clock()
+        with self.lock:
+            for (key, state) in list(self.states.items()):
+                if force or now >= state[WINDOW_END]:
+                    self.__summarize(key, state)
+                    state[SUPPRESSED] = 0
+                    if now >= state[WINDOW_END] and now >= state[ARRIVAL]:
+                        del self.states[key]
+
+    def getSuppressed(self, mod_name = None, errcode = None):
+        state = self.states.get((mod_name, errcode))
+        if state is None:
+            return 0
+        return state[SUPPRESSED]
+
+    #Wraps a report(mod_name, errcode, ...) function so it only runs for
+    #allowed occurrences. The wrapper returns None for suppressed ones.
+    def wrap(self, report = None):
+        if report is None:
+            raise ValueError("report cannot be None.")
+
+        allow = self.allow
+
+        def suppressed(mod_name = None, errcode = None, *args, **kwargs):
+            if allow(mod_name, errcode):
+                return report(mod_name, errcode, *args, **kwargs)
+            return None
+
+        return suppressed
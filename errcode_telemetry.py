@@ -0,0 +1,230 @@
+import collections
+import json
+import threading
+import weakref
+
+from .error_handling import ErrcodeHandleError as ErrcodeHandleError
+
+#Occurrence counters for the errcodes of an ErrcodeHandler.
+#
+#While enabled, the handler's getMessage, getMessages and raiseErrcode are
+#shadowed by counting wrappers stored on the instance. Disabling removes
+#them again, so a handler without telemetry runs the plain class methods and
+#pays nothing at all.
+#
+#Every thread counts into a dict of its own, so counting never takes a lock;
+#the dicts are only merged when the counts are read. When a thread goes away
+#its dict is folded into a retired total and dropped, so a pool that keeps
+#replacing its workers does not grow the counters.
+
+class ErrcodeTelemetryError(ErrcodeHandleError):
+    def __init__(self, message = None):
+        if message is None:
+            raise ValueError("message cannot be None")
+
+        super().__init__("sharedlib.errcode_telemetry: {0}".format(message))
+
+#threading.local runs __init__ again in every thread that uses it, which
+#gives each thread its dict without a check on the counting path.
+#The finalizer runs once the thread's Thread object is gone, which for a
+#finished thread nobody holds on to is right after it exits.
+class _ThreadShard(threading.local):
+    def __init__(self, counters):
+        self.counts = {}
+        counters().addShard(self.counts)
+        weakref.finalize(threading.current_thread(), _retireShard, counters, self.counts)
+
+def _retireShard(counters, counts):
+    counters = counters()
+    if counters is not None:
+        counters.retireShard(counts)
+
+class ThreadCounters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.shards = {} #id(counts) -> counts of a live thread.
+        self.retired = {}
+        self.local = _ThreadShard(weakref.ref(self))
+
+    def addShard(self, counts):
+        with self.lock:
+            self.shards[id(counts)] = counts
+
+    def retireShard(self, counts):
+        with self.lock:
+            if self.shards.pop(id(counts), None) is None:
+                return
+            retired = self.retired
+            for (key, count) in counts.items():
+                retired[key] = retired.get(key, 0) + count
+
+    def add(self, key, count = 1):
+        counts = self.local.counts
+        counts[key] = counts.get(key, 0) + count
+
+    def addAll(self, counted):
+        counts = self.local.counts
+        for (key, count) in counted.items():
+            counts[key] = counts.get(key, 0) + count
+
+    #Counts of threads that have exited are kept in the retired total, so no
+    #count is lost.
+    def merge(self):
+        with self.lock:
+            shards = list(self.shards.values())
+            retval = dict(self.retired)
+
+        for shard in shards:
+            for (key, count) in dict(shard).items():
+                retval[key] = retval.get(key, 0) + count
+        return retval
+
+    #Counts added by other threads while resetting may survive it.
+    def reset(self):
+        with self.lock:
+            self.retired.clear()
+            for shard in self.shards.values():
+                shard.clear()
+
+class ErrcodeTelemetry:
+    METRIC_PREFIX = "sharedlib_errcode"
+
+    def __init__(self, handler = None):
+        if handler is None:
+            raise ValueError("handler cannot be None.")
+
+        self.handler = handler
+        self.lookups = ThreadCounters()
+        self.raises = ThreadCounters()
+        self.enabled = False
+
+    def isEnabled(self):
+        return self.enabled
+
+    def enable(self):
+        if self.enabled:
+            return
+
+        if "getMessage" in vars(self.handler):
+            raise ErrcodeTelemetryError("handler is already instrumented.")
+
+        handler = self.handler
+        handler_class = type(handler)
+        getMessage = handler_class.getMessage
+        getMessages = handler_class.getMessages
+        raiseErrcode = handler_class.raiseErrcode
+        lookups = self.lookups.local
+        add_lookups = self.lookups.addAll
+        add_raise = self.raises.add
+
+        #The hottest path, so the counting is inlined.
+        def countedGetMessage(mod_name=None, errcode_input=None, locale=None):
+            counts = lookups.counts
+            key = (mod_name, errcode_input)
+            counts[key] = counts.get(key, 0) + 1
+            return getMessage(handler, mod_name, errcode_input, locale)
+
+        def countedGetMessages(mod_name=None, errcode_inputs=None, default=None, strict=True):
+            retval = getMessages(handler, mod_name, errcode_inputs, default, strict)
+            tolist = getattr(errcode_inputs, "tolist", None)
+            counted = collections.Counter(errcode_inputs if tolist is None else tolist())
+            add_lookups({(mod_name, code): count for (code, count) in counted.items()})
+            return retval
+
+        def countedRaiseErrcode(mod_name=None, errcode_input=None, *args, **context):
+            add_raise((mod_name, errcode_input))
+            return raiseErrcode(handler, mod_name, errcode_input, *args, **context)
+
+        handler.getMessage = countedGetMessage
+        handler.getMessages = countedGetMessages
+        handler.raiseErrcode = countedRaiseErrcode
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+
+        for name in ("getMessage", "getMessages", "raiseErrcode"):
+            vars(self.handler).pop(name, None)
+        self.enabled = False
+
+    def reset(self):
+        self.lookups.reset()
+        self.raises.reset()
+
+    #Counts are keyed by the errcode as it was passed in, so names are
+    #resolved to numbers here. Unknown errcodes keep the key they were
+    #counted under and have no name.
+    def __resolve(self, mod_name, errcode_input):
+        module = self.handler.modules.get(mod_name)
+        if module is None:
+            return errcode_input, None
+
+        number = errcode_input
+        if isinstance(errcode_input, str):
+            number = module.errcodes_key_name.get(errcode_input)
+            if number is None:
+                return errcode_input, None
+
+        try:
+            errcode = module.errcodes.get(number)
+        except TypeError:
+            errcode = None
+        if errcode is None:
+            return errcode_input, None
+        return errcode.number, errcode.name
+
+    #Returns one record per (module, errcode) seen, sorted by module and
+    #errcode: {"module", "errcode", "name", "lookups", "raises"}.
+    def snapshot(self):
+        records = {}
+        for (field, counters) in (("lookups", self.lookups), ("raises", self.raises)):
+            for ((mod_name, errcode_input), count) in counters.merge().items():
+                number, name = self.__resolve(mod_name, errcode_input)
+                record = records.get((mod_name, number))
+                if record is None:
+                    record = {"module": mod_name, "errcode": number, "name": name, "lookups": 0, "raises": 0}
+                    records[(mod_name, number)] = record
+                record[field] = record[field] + count
+
+        return sorted(records.values(), key = lambda x: (str(x["module"]), str(x["errcode"])))
+
+    def toJSON(self, indent = None):
+        return json.dumps({"errcodes": self.snapshot()}, indent = indent, default = str)
+
+    @staticmethod
+    def __label(value):
+        return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    #Prometheus text exposition format, one counter per errcode.
+    def toPrometheus(self):
+        records = self.snapshot()
+        lines = []
+        for (field, description) in (("lookups", "Errcode message lookups."), ("raises", "Errcode exceptions raised.")):
+            metric = "{0}_{1}_total".format(self.METRIC_PREFIX, field)
+            lines.append("# HELP {0} {1}".format(metric, description))
+            lines.append("# TYPE {0} counter".format(metric))
+            for record in records:
+                if record[field] == 0:
+                    continue
+                labels = "module=\"{0}\",errcode=\"{1}\"".format(
+                    self.__label(record["module"]), self.__label(record["errcode"]))
+                if record["name"] is not None:
+                    labels = labels + ",name=\"{0}\"".format(self.__label(record["name"]))
+                lines.append("{0}{{{1}}} {2}".format(metric, labels, record[field]))
+        return "\n".join(lines) + "\n"
+
+    #Writes the counts to a local file; export_format is "json" or "prometheus".
+    def export(self, path = None, export_format = "json"):
+        if path is None:
+            raise ValueError("path cannot be None.")
+
+        if export_format == "json":
+            data = self.toJSON(indent = 2)
+        elif export_format == "prometheus":
+            data = self.toPrometheus()
+        else:
+            raise ValueError("export_format must be \"json\" or \"prometheus\".")
+
+        with open(path, "w") as export_file:
+            export_file.write(data)
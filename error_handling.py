@@ -1,6 +1,20 @@
+import array
+import collections.abc
+import hashlib
+import itertools
 import numbers
-import random
+import operator
+import os
 import sys
+import threading
+import time
+
+from .conflict_resolution import Freezable as Freezable
+from .conflict_resolution import ImmutableObjectWriteError as ImmutableObjectWriteError
+
+#random, string and traceback are imported by the code paths that need them
+#(random numbers, templates and shutdown), keeping them out of the import
+#time of every errcode user.
 
 class ErrcodeHandleError(Exception):
     def __init__(self, message = None):
@@ -9,9 +23,175 @@ class ErrcodeHandleError(Exception):
 
         super().__init__(message)
 
+#Raised by the batch lookups for all the codes of a batch that are not
+#registered, instead of stopping at the first one.
+#"positions" are indices into the batch and "errcodes" the codes found there.
+class UnknownErrcodesError(ErrcodeHandleError):
+    REPORTED_ERRCODES = 10
+
+    def __init__(self, mod_name = None, positions = None, errcodes = None):
+        if positions is None:
+            raise ValueError("positions cannot be None.")
+
+        if errcodes is None:
+            raise ValueError("errcodes cannot be None.")
+
+        self.mod_name = mod_name
+        self.positions = positions
+        self.errcodes = errcodes
+        distinct = list(dict.fromkeys(errcodes))
+        shown = ", ".join(str(x) for x in distinct[:self.REPORTED_ERRCODES])
+        if len(distinct) > self.REPORTED_ERRCODES:
+            shown = shown + ", ..."
+        super().__init__("{0} errcode(s) ({1} distinct) are not registered with module {2}: {3}".format(
+            len(positions), len(distinct), mod_name, shown))
+
+
+#NumPy is optional and never imported here. A caller holding an array has
+#already imported it, so it is picked up from sys.modules.
+def _numpyFor(value):
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and isinstance(value, numpy.ndarray):
+        return numpy
+    return None
+
+#Vectorized slot lookup of an integer array in a sorted unsigned 64 bit
+#column. Returns an int64 array of slots, -1 where a code is missing, or None
+#when the codes are not integers.
+def _searchSortedColumn(numpy, column, codes):
+    if codes.dtype.kind not in "iu":
+        return None
+
+    column = numpy.frombuffer(column, dtype = numpy.uint64)
+    if len(column) == 0:
+        return numpy.full(codes.shape, -1, dtype = numpy.int64)
+
+    keys = codes.astype(numpy.uint64)
+    slots = numpy.searchsorted(column, keys)
+    numpy.minimum(slots, len(column) - 1, out = slots)
+    found = column[slots] == keys
+    if codes.dtype.kind == "i":
+        found &= codes >= 0
+    return numpy.where(found, slots, -1).astype(numpy.int64)
+
+#Fallback for the batch lookups: resolves every distinct code once with
+#"find" (code -> slot or -1) and maps the batch through the result.
+def _findDistinct(errcode_inputs, find):
+    numpy = _numpyFor(errcode_inputs)
+    if numpy is not None:
+        distinct, inverse = numpy.unique(errcode_inputs, return_inverse = True)
+        slots = numpy.fromiter(map(find, distinct.tolist()), dtype = numpy.int64, count = len(distinct))
+        return slots[inverse.reshape(errcode_inputs.shape)]
+
+    distinct = dict.fromkeys(errcode_inputs)
+    for code in distinct.keys():
+        try:
+            distinct[code] = find(code)
+        except TypeError:
+            distinct[code] = -1
+    return list(map(distinct.__getitem__, errcode_inputs))
+
+
+#A message with "{field}" placeholders, compiled once when its errcode is
+#registered.
+#Templates that only use plain fields, with at most a !r/!s/!a conversion,
+#are compiled to a printf style string and rendered with the "%" operator,
+#about twice as fast as str.format. Anything else (format specs, attribute
+#or index access) is rendered with str.format. The compiled form calls
+#str() on the values where str.format calls format(value, ""); the two only
+#differ for types that give __format__ a meaning of its own.
+class MessageTemplate:
+    __slots__ = ("text", "fields", "compiled", "mode", "getter")
+
+    def __init__(self, text = None):
+        if text is None:
+            raise ValueError("text cannot be None.")
+
+        import string
+        try:
+            parsed = list(string.Formatter().parse(text))
+        except ValueError as err:
+            raise ErrcodeHandleError("Invalid message template {0!r}: {1}".format(text, err))
+
+        pieces = []
+        fields = []
+        simple = True
+        auto = 0
+        for (literal, field, format_spec, conversion) in parsed:
+            pieces.append(literal.replace("%", "%%"))
+            if field is None:
+                continue
 
+            if field == "":
+                field = str(auto)
+                auto = auto + 1
+            if format_spec or not (field.isidentifier() or field.isdigit()):
+                simple = False
+            pieces.append("%" + (conversion or "s"))
+            fields.append(int(field) if field.isdigit() else field)
+
+        self.text = text
+        self.fields = tuple(fields)
+        self.compiled = "".join(pieces) if simple else None
+        self.getter = None
+        if self.compiled is None:
+            self.mode = "format"
+        elif self.fields == tuple(range(0, len(self.fields))):
+            self.mode = "args"
+        elif all(isinstance(x, str) for x in self.fields):
+            self.mode = "kwargs"
+            if len(self.fields) > 1:
+                self.getter = operator.itemgetter(*self.fields)
+        else:
+            self.mode = "mixed"
+
+    def render(self, *args, **kwargs):
+        return self.renderWith(args, kwargs)
+
+    #render() with the arguments already packed, for callers that received
+    #them as *args and **kwargs themselves.
+    def renderWith(self, args, kwargs):
+        mode = self.mode
+        if mode == "args" and len(args) == len(self.fields):
+            return self.compiled % args
+        elif mode == "kwargs" and self.getter is not None:
+            return self.compiled % self.getter(kwargs)
+        elif mode == "format":
+            return self.text.format(*args, **kwargs)
+        return self.compiled % tuple(args[x] if type(x) is int else kwargs[x] for x in self.fields)
+
+#Message of a templated errcode that is rendered on first use, so error
+#paths that never print it do not pay for the formatting.
+class DeferredMessage:
+    __slots__ = ("template", "args", "kwargs", "rendered")
+
+    def __init__(self, template, args, kwargs):
+        self.template = template
+        self.args = args
+        self.kwargs = kwargs
+        self.rendered = None
+
+    def __str__(self):
+        if self.rendered is None:
+            self.rendered = self.template.renderWith(self.args, self.kwargs)
+        return self.rendered
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __eq__(self, other):
+        return str(self) == other
+
+    def __hash__(self):
+        return hash(str(self))
+
+#Slotted: registries hold one of these per errcode, and a per-instance
+#__dict__ would more than double their size.
+#template: the compiled MessageTemplate of a templated errcode, otherwise None.
 class Errcode:
-    def __init__(self, name = None, message = None, number = None):
+    __slots__ = ("name", "message", "number", "template")
+
+    def __init__(self, name = None, message = None, number = None, template = None):
         if name is None:
             raise ValueError("name cannot be None.")
         
@@ -24,19 +204,366 @@ class Errcode:
         self.name = name
         self.message = message
         self.number = number
+        self.template = template
+
+#Base class of the per-errcode exception classes built by
+#ErrcodeHandler.getErrcodeException. The errcode is stored on the class, so
+#raising one does not copy it, and the message is only formatted, with the
+#raise arguments, when the exception is turned into a string.
+class ErrcodeException(Exception):
+    mod_name = None
+    number = None
+    name = None
+    message = None
+    template = None
+    lightweight = False
+    context = None
+
+    def __init__(self, *args, **context):
+        if context:
+            self.context = context
+
+    def __str__(self):
+        if not self.args and not self.context:
+            return self.message
+
+        try:
+            if self.template is not None:
+                return self.template.renderWith(self.args, self.context or {})
+            return self.message.format(*self.args, **(self.context or {}))
+        except (IndexError, KeyError, ValueError):
+            return "{0} {1!r} {2!r}".format(self.message, self.args, self.context or {})
+
+    def __repr__(self):
+        return "{0}({1}.{2}, {3})".format(type(self).__name__, self.mod_name, self.name, self.number)
+
+    #The classes are built at runtime and cannot be found by name, so an
+    #exception is unpickled through the class the receiving process builds
+    #from ErrcodeHandler.instance.
+    def __reduce__(self):
+        return (_rebuildErrcodeException, (self.mod_name, self.number, self.lightweight, self.args, self.context))
+
+def _rebuildErrcodeException(mod_name, number, lightweight, args, context):
+    exception_class = ErrcodeHandler.instance.getErrcodeException(mod_name, number, lightweight)
+    if context:
+        return exception_class(*args, **context)
+    return exception_class(*args)
+
+#Base of the lightweight classes: no Python code runs when one is created,
+#as BaseException stores the positional arguments by itself. Keyword
+#context is not supported.
+class LightweightErrcodeException(ErrcodeException):
+    __init__ = Exception.__init__
+    lightweight = True
 
 class ErrcodeModule:
     def __init__(self):
         self.errcodes = {}
         self.errcodes_key_name = {}
 
+    def copy(self):
+        retval = ErrcodeModule()
+        retval.errcodes = dict(self.errcodes)
+        retval.errcodes_key_name = dict(self.errcodes_key_name)
+        return retval
+
+    def getMessage(self, errcode_input):
+        if isinstance(errcode_input, str):
+            if not errcode_input in self.errcodes_key_name:
+                raise ValueError("errcode_input is not registered with any errcode.")
+
+            index = self.errcodes_key_name[errcode_input]
+
+        elif isinstance(errcode_input, numbers.Number):
+            index = errcode_input
+        else:
+            raise ValueError("errcode is neither a valid name nor is it a number.")
+
+        return self.errcodes[index].message
+
+    #Batch form of getMessage for errcode numbers. Returns (messages, indices),
+    #where indices holds a position in messages per input code, or -1 for an
+    #unknown one. Each distinct code is looked up once.
+    def getMessageIndices(self, errcode_inputs):
+        messages = []
+        errcodes = self.errcodes
+
+        def find(number):
+            errcode = errcodes.get(number)
+            if errcode is None:
+                return -1
+            messages.append(errcode.message)
+            return len(messages) - 1
+
+        return messages, _findDistinct(errcode_inputs, find)
+
+#Read-only, compiled form of an ErrcodeModule, built by ErrcodeHandler.freeze().
+#Errcodes are stored as parallel columns sorted by number, and two slot tables
+#map numbers and names to a column index. No Errcode objects are kept, and
+#every slot table entry shares the same index objects.
+#"errcodes" and "errcodes_key_name" are read-only views that behave like the
+#dicts of ErrcodeModule.
+class FrozenErrcodeModule:
+
+    class _ErrcodesView(collections.abc.Mapping):
+        def __init__(self, module):
+            self.module = module
+
+        def __getitem__(self, number):
+            slot = self.module.findNumber(number)
+            if slot < 0:
+                raise KeyError(number)
+            return Errcode(self.module.names[slot], self.module.messages[slot], self.module.numbers[slot],
+                           self.module.templates.get(slot))
+
+        def __iter__(self):
+            return iter(self.module.numbers)
+
+        def __len__(self):
+            return len(self.module.numbers)
+
+        def __contains__(self, number):
+            return self.module.findNumber(number) >= 0
+
+    class _NamesView(collections.abc.Mapping):
+        def __init__(self, module):
+            self.module = module
+
+        def __getitem__(self, name):
+            slot = self.module.findName(name)
+            if slot < 0:
+                raise KeyError(name)
+            return self.module.numbers[slot]
+
+        def __iter__(self):
+            return iter(self.module.name_slots)
+
+        def __len__(self):
+            return len(self.module.name_slots)
+
+        def __contains__(self, name):
+            return self.module.findName(name) >= 0
+
+    def __init__(self, module = None):
+        if module is None:
+            raise ValueError("module cannot be None.")
+
+        try:
+            ordered = sorted(module.errcodes.keys())
+        except TypeError:
+            raise ErrcodeHandleError("Errcode numbers must be orderable to freeze a module.")
 
-class ErrcodeHandler:
+        #Unsigned 64 bit numbers fit in a flat array; anything else stays a tuple.
+        try:
+            self.numbers = array.array("Q", ordered)
+        except (OverflowError, TypeError):
+            self.numbers = tuple(ordered)
+
+        self.names = tuple(module.errcodes[number].name for number in ordered)
+        self.messages = tuple(module.errcodes[number].message for number in ordered)
+        #Templates are rare, so they are kept by slot rather than as a column.
+        self.templates = {
+            slot: module.errcodes[ordered[slot]].template
+            for slot in range(0, len(ordered))
+            if module.errcodes[ordered[slot]].template is not None
+        }
+
+        slots = list(range(0, len(ordered)))
+        self.number_slots = dict(zip(ordered, slots))
+        self.name_slots = dict(zip(self.names, slots))
+
+        self.errcodes = self._ErrcodesView(self)
+        self.errcodes_key_name = self._NamesView(self)
+
+    #Both return -1 when nothing matches, including for unhashable keys.
+    def findNumber(self, number):
+        try:
+            return self.number_slots.get(number, -1)
+        except TypeError:
+            return -1
+
+    def findName(self, name):
+        try:
+            return self.name_slots.get(name, -1)
+        except TypeError:
+            return -1
+
+    def getMessage(self, errcode_input):
+        if isinstance(errcode_input, str):
+            slot = self.name_slots.get(errcode_input)
+            if slot is None:
+                raise ValueError("errcode_input is not registered with any errcode.")
+
+        elif isinstance(errcode_input, numbers.Number):
+            slot = self.number_slots.get(errcode_input)
+            if slot is None:
+                raise KeyError(errcode_input)
+        else:
+            raise ValueError("errcode is neither a valid name nor is it a number.")
+
+        return self.messages[slot]
+
+    #See ErrcodeModule.getMessageIndices. The indices are slots, so the
+    #messages column is returned as it is.
+    def getMessageIndices(self, errcode_inputs):
+        numpy = _numpyFor(errcode_inputs)
+        if numpy is not None:
+            slots = None
+            if type(self.numbers) is array.array:
+                slots = _searchSortedColumn(numpy, self.numbers, errcode_inputs)
+            if slots is None:
+                slots = _findDistinct(errcode_inputs, self.findNumber)
+            return self.messages, slots
+
+        try:
+            return self.messages, list(map(self.number_slots.get, errcode_inputs, itertools.repeat(-1)))
+        except TypeError:
+            return self.messages, list(map(self.findNumber, errcode_inputs))
+
+#Allocators hand out errcode numbers for errcodes registered without one.
+#allocate() must return a number that is not yet used in "module".
+#Allocators that keep state between calls return it from getState(), so a
+#registration that fails after allocating can hand it back to restoreState()
+#and leave no gap behind.
+class ErrcodeAllocator:
+    def allocate(self, mod_name = None, name = None, module = None):
+        raise NotImplementedError("sharedlib.error_handling.ErrcodeAllocator: allocate() must be implemented by subclasses.")
+
+    def getState(self):
+        return None
+
+    def restoreState(self, state = None):
+        pass
+
+#The original behaviour: random numbers, retried against the used set.
+#Not stable across runs.
+class RandomErrcodeAllocator(ErrcodeAllocator):
+    def allocate(self, mod_name = None, name = None, module = None):
+        return ErrcodeHandler.generateErrcode(module)
+
+#Hands out start, start + 1, ... per module, skipping numbers that were
+#registered explicitly. Stable across runs as long as the registration
+#order is stable.
+class SequentialErrcodeAllocator(ErrcodeAllocator):
+    def __init__(self, start = 1):
+        if start is None:
+            raise ValueError("start cannot be None.")
+
+        if start < ErrcodeHandler.RNG_MIN_INT_VALUE or start > ErrcodeHandler.RNG_MAX_INT_VALUE:
+            raise ValueError("start is outside of the errcode range.")
+
+        self.start = start
+        self.cursors = {}
+
+    def allocate(self, mod_name = None, name = None, module = None):
+        if module is None:
+            raise ValueError("module cannot be None.")
+
+        candidate = self.cursors.get(mod_name, self.start)
+        used = module.errcodes
+        while candidate in used:
+            candidate = candidate + 1
+
+        if candidate > ErrcodeHandler.RNG_MAX_INT_VALUE:
+            raise ErrcodeHandleError("Errcode range exhausted for module: {0}".format(mod_name))
+
+        self.cursors[mod_name] = candidate + 1
+        return candidate
+
+    def getState(self):
+        return dict(self.cursors)
+
+    def restoreState(self, state = None):
+        if state is None:
+            raise ValueError("state cannot be None.")
+
+        self.cursors = dict(state)
+
+#Derives the number from a hash of (mod_name, name), so an errcode keeps its
+#number across runs and deployments no matter the registration order.
+#Collisions are resolved by probing to the next free number.
+class HashErrcodeAllocator(ErrcodeAllocator):
+    DIGEST_SIZE = 8 #64 bits, matching RNG_MAX_INT_VALUE.
+
+    @staticmethod
+    def hashName(mod_name = None, name = None):
+        if mod_name is None:
+            raise ValueError("mod_name cannot be None.")
+
+        if name is None:
+            raise ValueError("name cannot be None.")
+
+        key = "{0}\0{1}".format(mod_name, name).encode("utf-8")
+        digest = hashlib.blake2b(key, digest_size = HashErrcodeAllocator.DIGEST_SIZE).digest()
+        return int.from_bytes(digest, "big")
+
+    def allocate(self, mod_name = None, name = None, module = None):
+        if module is None:
+            raise ValueError("module cannot be None.")
+
+        candidate = HashErrcodeAllocator.hashName(mod_name, name)
+        used = module.errcodes
+        while candidate in used:
+            if candidate >= ErrcodeHandler.RNG_MAX_INT_VALUE:
+                candidate = ErrcodeHandler.RNG_MIN_INT_VALUE
+            else:
+                candidate = candidate + 1
+
+        return candidate
+
+
+#Packs a module id, derived from a hash of mod_name, into the top
+#"module_bits" bits of every generated errcode; the low bits come from a hash
+#of the errcode name. Generated codes from different modules therefore never
+#collide unless their module ids do, and the module of a bare code can be
+#read straight from its high bits.
+class ModulePackedErrcodeAllocator(ErrcodeAllocator):
+    def __init__(self, module_bits = 16):
+        if module_bits is None:
+            raise ValueError("module_bits cannot be None.")
+
+        if module_bits <= 0 or module_bits >= 64:
+            raise ValueError("module_bits must be between 1 and 63.")
+
+        self.module_bits = module_bits
+        self.code_bits = 64 - module_bits
+        self.code_mask = (1 << self.code_bits) - 1
+
+    def getModuleId(self, mod_name = None):
+        return HashErrcodeAllocator.hashName(mod_name, "") >> self.code_bits
+
+    #Returns (module id, per-module part) for a packed errcode.
+    def splitErrcode(self, number = None):
+        if number is None:
+            raise ValueError("number cannot be None.")
+
+        return number >> self.code_bits, number & self.code_mask
+
+    def allocate(self, mod_name = None, name = None, module = None):
+        if module is None:
+            raise ValueError("module cannot be None.")
+
+        high = self.getModuleId(mod_name) << self.code_bits
+        low = HashErrcodeAllocator.hashName(mod_name, name) & self.code_mask
+        candidate = high | low
+        used = module.errcodes
+        while candidate in used:
+            low = (low + 1) & self.code_mask
+            candidate = high | low
+
+        return candidate
+
+class ErrcodeHandler(Freezable):
 
     RNG_MAX_INT_VALUE=18446744073709551615 #(2^64) - 1; Arbitrarily chosen.
     RNG_MIN_INT_VALUE=0 
     RNG_LOOP_COUNT_LIMIT=10
 
+    #Interning shares one copy of equal names and messages across errcodes
+    #and modules, at the cost of an entry in the interpreter's intern table
+    #per distinct string. Worth it when many errcodes repeat the same text.
+    INTERN_STRINGS=False
+
     instance = None
 
     @staticmethod
@@ -44,7 +571,10 @@ class ErrcodeHandler:
         if module is None:
             raise ValueError("module cannot be None.")
 
-        random.seed() #Needed in order to get any entropy for RNG.
+        #The random module seeds itself from the OS once at import.
+        #Reseeding here would pull fresh entropy on every call.
+        import random
+
         candidate = None
         retval = None
         count = 0
@@ -67,14 +597,75 @@ class ErrcodeHandler:
         return retval
 
 
-    def __init__(self):
+    @staticmethod
+    def internString(value):
+        if type(value) is str:
+            return sys.intern(value)
+        return value
+
+    #unique_numbers: refuse to register a number that another module already
+    #uses. Otherwise such numbers are allowed, but findErrcode reports them
+    #as ambiguous.
+    def __init__(self, allocator = None, unique_numbers = False):
+        if allocator is None:
+            allocator = HashErrcodeAllocator()
+
         self.modules = {}
+        self.allocator = allocator
+        self.frozen = False
+        self.unique_numbers = unique_numbers
+
+        #Reverse index over all modules: number -> mod_name of the first
+        #module that registered it. Numbers used by more than one module
+        #are also listed in errcode_collisions.
+        self.errcode_index = {}
+        self.errcode_collisions = {}
+
+        #(mod_name, number, lightweight) -> class; see getErrcodeException.
+        self.exception_classes = {}
+
+        self.locale_catalogs = None
+        self.template_cache = {}
+
+    #Compiles every module into a FrozenErrcodeModule. Lookups keep working,
+    #registration raises ImmutableObjectWriteError from then on.
+    #compact: pack the whole registry into an in-memory errcode catalog
+    #instead. That stores a fixed-size record per errcode plus each distinct
+    #string once, for a fraction of the memory, but lookups binary-search the
+    #packed tables and are several times slower. Requires str module names
+    #and unsigned 64 bit errcode numbers.
+    def freeze(self, compact = False):
+        if self.frozen:
+            return
+
+        if compact:
+            from . import errcode_catalog
+            catalog = errcode_catalog.ErrcodeCatalog(errcode_catalog.buildCatalog(self))
+            #Catalogs store messages only; templates are carried over by slot.
+            for (mod_name, module) in self.modules.items():
+                catalog_module = catalog.modules[mod_name]
+                for errcode in module.errcodes.values():
+                    if errcode.template is not None:
+                        catalog_module.templates[catalog_module.findNumber(errcode.number)] = errcode.template
+            self.modules = dict(catalog.modules)
+        else:
+            self.modules = {mod_name: FrozenErrcodeModule(module) for (mod_name, module) in self.modules.items()}
+        self.frozen = True
+
+    def isFrozen(self):
+        return self.frozen
 
     #We return the errcode for two reasons:
     #1.) It may be a generated value.
     #2.) It lets the module author dictate how errcode information
     #    is indexed for their module.
-    def registerErrcode(self, mod_name=None, name=None, message=None, number=None):
+    #template: the message is a template with "{field}" placeholders, filled
+    #in by renderMessage or deferMessage. It is compiled here, so a bad
+    #template is rejected at registration.
+    def registerErrcode(self, mod_name=None, name=None, message=None, number=None, template=False):
+        if self.frozen:
+            raise ImmutableObjectWriteError()
+
         if mod_name is None:
             raise ValueError("mod_name cannot be None.")
 
@@ -84,24 +675,255 @@ class ErrcodeHandler:
         if message is None:
             raise ValueError("message cannot be None.")
 
-        module = self.modules.get(mod_name)
+        if self.INTERN_STRINGS:
+            name = ErrcodeHandler.internString(name)
+            message = ErrcodeHandler.internString(message)
 
-        if module is None:
+        compiled = MessageTemplate(message) if template else None
+
+        #A new module is only inserted once its number has been accepted, so
+        #a rejected registration leaves no empty module behind.
+        module = self.modules.get(mod_name)
+        existing = module is not None
+        if not existing:
             module = ErrcodeModule()
-            self.modules[mod_name] = module
 
         if name in module.errcodes_key_name:
             raise ValueError("An errcode with this name has already been registered.")
          
+        allocator_state = None
         if number is None:
-            number = ErrcodeHandler.generateErrcode(module)
+            allocator_state = self.allocator.getState()
+            number = self.allocator.allocate(mod_name, name, module)
 
+        owner = self.errcode_index.get(number)
+        if owner is None:
+            self.errcode_index[number] = mod_name
+        elif owner != mod_name:
+            if self.unique_numbers:
+                if allocator_state is not None:
+                    self.allocator.restoreState(allocator_state)
+                raise ErrcodeHandleError("Errcode {0} is already registered by module: {1}".format(number, owner))
+            self.errcode_collisions.setdefault(number, {owner}).add(mod_name)
+
+        if not existing:
+            self.modules[mod_name] = module
         module.errcodes_key_name[name] = number
-        module.errcodes[number] = Errcode(name,message,number)
+        module.errcodes[number] = Errcode(name,message,number,compiled)
 
         return number
 
-    def getMessage(self, mod_name=None, errcode_input = None):
+    #Bulk version of registerErrcode.
+    #Each row is (mod_name, name, message) or (mod_name, name, message, number).
+    #The whole batch is validated before anything is inserted, and if any
+    #row is rejected nothing is registered at all.
+    #Returns the errcode numbers in row order.
+    #templates: every message of the batch is a template; see registerErrcode.
+    def registerErrcodes(self, rows=None, templates=False):
+        if self.frozen:
+            raise ImmutableObjectWriteError()
+
+        if rows is None:
+            raise ValueError("rows cannot be None.")
+
+        rows = list(rows)
+        if len(rows) == 0:
+            return []
+
+        #Work on columns rather than rows so most of the checks below run in C.
+        lengths = set(map(len, rows))
+        if not lengths.issubset((3, 4)):
+            raise ValueError("Rows must be (mod_name, name, message[, number]).")
+        mod_names, names, messages = [
+            list(map(operator.itemgetter(i), rows)) for i in range(0, 3)
+        ]
+        if lengths == {4}:
+            numbers_column = list(map(operator.itemgetter(3), rows))
+        elif lengths == {3}:
+            numbers_column = [None] * len(rows)
+        else:
+            numbers_column = [row[3] if len(row) == 4 else None for row in rows]
+
+        mod_name_set = set(mod_names)
+        if None in mod_name_set:
+            raise ValueError("Row {0}: mod_name cannot be None.".format(mod_names.index(None)))
+
+        if None in messages:
+            raise ValueError("Row {0}: message cannot be None.".format(messages.index(None)))
+
+        if self.INTERN_STRINGS:
+            names = list(map(ErrcodeHandler.internString, names))
+            messages = list(map(ErrcodeHandler.internString, messages))
+
+        if len(mod_name_set) == 1:
+            groups = [(mod_names[0], None, names, messages, numbers_column)]
+        else:
+            grouped = {}
+            for index in range(0, len(rows)):
+                indices = grouped.get(mod_names[index])
+                if indices is None:
+                    indices = []
+                    grouped[mod_names[index]] = indices
+                indices.append(index)
+            groups = [
+                (mod_name,
+                 indices,
+                 [names[i] for i in indices],
+                 [messages[i] for i in indices],
+                 [numbers_column[i] for i in indices])
+                for (mod_name, indices) in grouped.items()
+            ]
+
+        #The staged dicts double as the duplicate checks: a batch without
+        #duplicates maps one key per row.
+        plan = []
+        batch_owners = {}
+        for (mod_name, indices, group_names, group_messages, group_numbers) in groups:
+            module = self.modules.get(mod_name)
+
+            staged_names = dict(zip(group_names, group_numbers))
+            if None in staged_names:
+                raise ValueError("Row {0}: name cannot be None.".format(
+                    self.__rowIndex(indices, group_names.index(None))))
+
+            if len(staged_names) != len(group_names) or (
+                module is not None and not module.errcodes_key_name.keys().isdisjoint(staged_names)
+            ):
+                raise ValueError("Row {0}: An errcode with this name has already been registered.".format(
+                    self.__rowIndex(indices, self.__findDuplicate(group_names, module, "errcodes_key_name"))))
+
+            if None in group_numbers:
+                explicit = [i for i in range(0, len(group_numbers)) if group_numbers[i] is not None]
+                generated = [i for i in range(0, len(group_numbers)) if group_numbers[i] is None]
+                explicit_names = [group_names[i] for i in explicit]
+                explicit_messages = [group_messages[i] for i in explicit]
+                explicit_numbers = [group_numbers[i] for i in explicit]
+            else:
+                generated = []
+                explicit_names = group_names
+                explicit_messages = group_messages
+                explicit_numbers = group_numbers
+
+            if templates:
+                staged_errcodes = dict(zip(explicit_numbers,
+                    map(Errcode, explicit_names, explicit_messages, explicit_numbers,
+                        map(MessageTemplate, explicit_messages))))
+            else:
+                staged_errcodes = dict(zip(explicit_numbers,
+                    map(Errcode, explicit_names, explicit_messages, explicit_numbers)))
+            if len(staged_errcodes) != len(explicit_numbers) or (
+                module is not None and not module.errcodes.keys().isdisjoint(staged_errcodes)
+            ):
+                duplicate = self.__findDuplicate(explicit_numbers, module, "errcodes")
+                raise ValueError("Row {0}: An errcode with this number has already been registered.".format(
+                    self.__rowIndex(indices, group_numbers.index(explicit_numbers[duplicate]))))
+
+            if self.unique_numbers:
+                for number in staged_errcodes.keys():
+                    self.__checkUniqueNumber(mod_name, number, batch_owners)
+
+            plan.append((mod_name, module, indices, group_names, group_messages,
+                         staged_names, staged_errcodes, generated))
+
+        retval = list(numbers_column)
+        created = []
+        inserted = []
+        added = []
+        allocator_state = self.allocator.getState()
+        try:
+            for (mod_name, module, indices, group_names, group_messages,
+                 staged_names, staged_errcodes, generated) in plan:
+                existing = module is not None
+                allocated = []
+                if existing:
+                    inserted.append((module, staged_errcodes, allocated))
+                    module.errcodes.update(staged_errcodes)
+                else:
+                    #A new module can take the staged dicts as they are.
+                    module = ErrcodeModule()
+                    module.errcodes_key_name = staged_names
+                    module.errcodes = staged_errcodes
+                    self.modules[mod_name] = module
+                    created.append(mod_name)
+
+                #Explicit numbers are already in, so the allocator sees them as taken.
+                errcodes = module.errcodes
+                for index in generated:
+                    name = group_names[index]
+                    number = self.allocator.allocate(mod_name, name, module)
+                    if self.unique_numbers:
+                        self.__checkUniqueNumber(mod_name, number, batch_owners)
+                    message = group_messages[index]
+                    errcodes[number] = Errcode(name, message, number,
+                                               MessageTemplate(message) if templates else None)
+                    allocated.append(number)
+                    staged_names[name] = number
+                    retval[index if indices is None else indices[index]] = number
+
+                #Names go in last, so a failed batch never leaves a name behind
+                #in a module that already existed.
+                if existing:
+                    module.errcodes_key_name.update(staged_names)
+
+                added.append((mod_name, staged_errcodes.keys(), allocated if existing else ()))
+        except BaseException:
+            for (module, staged_errcodes, allocated) in inserted:
+                for number in staged_errcodes.keys():
+                    module.errcodes.pop(number, None)
+                for number in allocated:
+                    module.errcodes.pop(number, None)
+            for mod_name in created:
+                self.modules.pop(mod_name, None)
+            if allocator_state is not None:
+                self.allocator.restoreState(allocator_state)
+            raise
+
+        for (mod_name, staged_numbers, allocated) in added:
+            self.__indexErrcodes(mod_name, staged_numbers)
+            self.__indexErrcodes(mod_name, allocated)
+
+        return retval
+
+    def __checkUniqueNumber(self, mod_name, number, batch_owners):
+        owner = self.errcode_index.get(number)
+        if owner is None:
+            owner = batch_owners.setdefault(number, mod_name)
+        if owner != mod_name:
+            raise ErrcodeHandleError("Errcode {0} is already registered by module: {1}".format(number, owner))
+
+    def __indexErrcodes(self, mod_name, numbers_added):
+        index = self.errcode_index
+        if index.keys().isdisjoint(numbers_added):
+            index.update(dict.fromkeys(numbers_added, mod_name))
+            return
+
+        for number in numbers_added:
+            owner = index.setdefault(number, mod_name)
+            if owner != mod_name:
+                self.errcode_collisions.setdefault(number, {owner}).add(mod_name)
+
+    @staticmethod
+    def __rowIndex(indices, index):
+        if indices is None:
+            return index
+        return indices[index]
+
+    #Only used to build an error message once a batch is known to be bad.
+    @staticmethod
+    def __findDuplicate(column, module, attribute):
+        seen = set()
+        existing = {} if module is None else getattr(module, attribute)
+        for index in range(0, len(column)):
+            value = column[index]
+            if value in seen or value in existing:
+                return index
+            seen.add(value)
+        return -1
+
+    #locale: return the message translated for this locale when the
+    #catalogs set with setLocaleCatalogs have it, and the registered
+    #message otherwise. See errcode_locale.
+    def getMessage(self, mod_name=None, errcode_input = None, locale = None):
 
         if mod_name is None:
             raise ValueError("mod_name cannot be None")
@@ -109,31 +931,388 @@ class ErrcodeHandler:
         if errcode_input is None:
             raise ValueError("errcode_input cannot be None.")
         
-        index = -1;
         module = self.modules.get(mod_name)
 
         if module is None:
             raise ErrcodeHandleError("mod_name is not associated with a registered module.")
 
+        if locale is None:
+            return module.getMessage(errcode_input)
+
         if isinstance(errcode_input, str):
             if not errcode_input in module.errcodes_key_name:
                 raise ValueError("errcode_input is not registered with any errcode.")
+            errcode_input = module.errcodes_key_name[errcode_input]
+        elif not isinstance(errcode_input, numbers.Number):
+            raise ValueError("errcode is neither a valid name nor is it a number.")
 
-            index = module.errcodes_key_name[errcode_input]
+        errcode = module.errcodes[errcode_input]
+        if self.locale_catalogs is not None:
+            message = self.locale_catalogs.getMessage(locale, mod_name, errcode.name)
+            if message is not None:
+                return message
+        return errcode.message
 
-        elif isinstance(errcode_input, numbers.Number):
-            index = errcode_input
+    def setLocaleCatalogs(self, locale_catalogs = None):
+        self.locale_catalogs = locale_catalogs
+
+    #Errcodes never change once registered, so templates are cached by the
+    #(mod_name, errcode_input) they were asked for with.
+    def __getTemplate(self, mod_name, errcode_input):
+        key = (mod_name, errcode_input)
+        template = self.template_cache.get(key)
+        if template is not None:
+            return template
+
+        errcode = self.getErrcode(mod_name, errcode_input)
+        if errcode.template is None:
+            raise ErrcodeHandleError("Errcode {0} of module {1} was not registered as a template.".format(
+                errcode.name, mod_name))
+        self.template_cache[key] = errcode.template
+        return errcode.template
+
+    #Fills in the template of an errcode registered with template=True.
+    #mod_name and errcode_input are positional only, so templates are free
+    #to use those names as fields.
+    def renderMessage(self, mod_name=None, errcode_input=None, /, *args, **kwargs):
+        return self.__getTemplate(mod_name, errcode_input).renderWith(args, kwargs)
+
+    #Like renderMessage, but returns a DeferredMessage that is only
+    #rendered when it is turned into a string.
+    def deferMessage(self, mod_name=None, errcode_input=None, /, *args, **kwargs):
+        return DeferredMessage(self.__getTemplate(mod_name, errcode_input), args, kwargs)
+
+    #Batch lookups for many errcode numbers of one module, e.g. when
+    #post-processing logs. errcode_inputs is a sequence or a NumPy array.
+    #The arguments are checked and the module looked up once per batch, and
+    #integer NumPy arrays against frozen modules are resolved without a
+    #Python level loop.
+
+    #Returns (messages, indices). indices has one entry per input: a
+    #position in messages, or -1 for an unknown code. It is an int64 array
+    #of the same shape for NumPy input, otherwise a list.
+    def getMessageIndices(self, mod_name=None, errcode_inputs=None):
+        if mod_name is None:
+            raise ValueError("mod_name cannot be None")
+
+        if errcode_inputs is None:
+            raise ValueError("errcode_inputs cannot be None.")
+
+        module = self.modules.get(mod_name)
+
+        if module is None:
+            raise ErrcodeHandleError("mod_name is not associated with a registered module.")
+
+        return module.getMessageIndices(errcode_inputs)
+
+    #Returns the list of messages in input order.
+    #strict: raise UnknownErrcodesError listing every unknown code of the
+    #batch. Otherwise unknown codes resolve to "default".
+    def getMessages(self, mod_name=None, errcode_inputs=None, default=None, strict=True):
+        messages, indices = self.getMessageIndices(mod_name, errcode_inputs)
+        return ErrcodeHandler.resolveMessages(mod_name, errcode_inputs, messages, indices, default, strict)
+
+    #Turns the result of getMessageIndices into a list of messages.
+    @staticmethod
+    def resolveMessages(mod_name, errcode_inputs, messages, indices, default = None, strict = True):
+        numpy = _numpyFor(indices)
+        if numpy is not None:
+            errcode_inputs = numpy.ravel(errcode_inputs)
+            positions = numpy.flatnonzero(indices < 0).tolist()
+            indices = indices.ravel().tolist()
+        elif -1 in indices:
+            positions = [i for i in range(0, len(indices)) if indices[i] < 0]
         else:
-            raise ValueError("errcode is neither a valid name nor is it a number.")
+            positions = []
+
+        if len(positions) == 0:
+            return list(map(messages.__getitem__, indices))
+
+        if strict:
+            unknown = [errcode_inputs[i] for i in positions]
+            if numpy is not None:
+                unknown = [x.item() for x in unknown]
+            raise UnknownErrcodesError(mod_name, positions, unknown)
 
-        return module.errcodes[index].message
+        return [default if i < 0 else messages[i] for i in indices]
+
+    def getErrcode(self, mod_name=None, errcode_input=None):
+        if mod_name is None:
+            raise ValueError("mod_name cannot be None")
+
+        if errcode_input is None:
+            raise ValueError("errcode_input cannot be None.")
+
+        module = self.modules.get(mod_name)
+
+        if module is None:
+            raise ErrcodeHandleError("mod_name is not associated with a registered module.")
+
+        if isinstance(errcode_input, str):
+            if not errcode_input in module.errcodes_key_name:
+                raise ValueError("errcode_input is not registered with any errcode.")
+            errcode_input = module.errcodes_key_name[errcode_input]
+
+        return module.errcodes[errcode_input]
+
+    #Returns the exception class of an errcode, a subclass of
+    #ErrcodeException named after the errcode and carrying its module,
+    #number, name and message. Classes are built once and cached, so the
+    #same errcode always gives the same class and can be caught by it.
+    #lightweight: subclass LightweightErrcodeException instead, for hot
+    #error paths that create many exceptions and rarely print them.
+    #Positional raise arguments fill in "{0}" style fields of the message.
+    def getErrcodeException(self, mod_name=None, errcode_input=None, lightweight=False):
+        if isinstance(errcode_input, numbers.Number):
+            retval = self.exception_classes.get((mod_name, errcode_input, lightweight))
+            if retval is not None:
+                return retval
+
+        errcode = self.getErrcode(mod_name, errcode_input)
+        key = (mod_name, errcode.number, lightweight)
+        retval = self.exception_classes.get(key)
+        if retval is None:
+            class_name = errcode.name if errcode.name.isidentifier() else "Errcode{0}".format(errcode.number)
+            base = LightweightErrcodeException if lightweight else ErrcodeException
+            retval = type(class_name, (base,), {
+                "__module__": __name__,
+                "mod_name": mod_name,
+                "number": errcode.number,
+                "name": errcode.name,
+                "message": errcode.message,
+                "template": errcode.template,
+            })
+            #Another thread may have built the class first; keep one.
+            retval = self.exception_classes.setdefault(key, retval)
+        return retval
+
+    def raiseErrcode(self, mod_name=None, errcode_input=None, *args, **context):
+        raise self.getErrcodeException(mod_name, errcode_input)(*args, **context)
+
+    #Reverse lookup of a bare errcode number across all modules.
+    #Returns (mod_name, Errcode).
+    def findErrcode(self, number = None):
+        if number is None:
+            raise ValueError("number cannot be None.")
+
+        #The index is read before the modules. ConcurrentErrcodeHandler
+        #publishes modules first, so the modules read here are never older
+        #than the index.
+        mod_name = self.errcode_index.get(number)
+        if mod_name is None:
+            raise ValueError("number is not registered with any errcode.")
+
+        owners = self.errcode_collisions.get(number)
+        if owners is not None:
+            raise ErrcodeHandleError("Errcode {0} is registered by more than one module: {1}".format(
+                number, ", ".join(sorted(str(x) for x in owners))))
+
+        return mod_name, self.modules[mod_name].errcodes[number]
 
 ErrcodeHandler.instance = ErrcodeHandler()
 
-def die(mod_name = None, errcode = None):
+#Registry for threaded programs that keep registering errcodes while other
+#threads look them up.
+#"modules" always points at a published snapshot that is never mutated again,
+#so readers just read the reference and never lock. Writers serialize on a
+#lock, register into a private copy of the modules they touch and publish the
+#result with a single reference store. A write costs a copy of the touched
+#modules, so prefer registerErrcodes for large batches.
+class ConcurrentErrcodeHandler(ErrcodeHandler):
+    def __init__(self, allocator = None, unique_numbers = False):
+        super().__init__(allocator, unique_numbers)
+        self.write_lock = threading.Lock()
+
+    def __stage(self, mod_names):
+        staging = ErrcodeHandler(self.allocator, self.unique_numbers)
+        staging.modules = dict(self.modules)
+        for mod_name in mod_names:
+            module = staging.modules.get(mod_name)
+            if module is not None:
+                staging.modules[mod_name] = module.copy()
+        staging.errcode_index = dict(self.errcode_index)
+        staging.errcode_collisions = {number: set(owners) for (number, owners) in self.errcode_collisions.items()}
+        return staging
+
+    #Modules go out first; see findErrcode.
+    def __publish(self, staging):
+        self.modules = staging.modules
+        self.errcode_collisions = staging.errcode_collisions
+        self.errcode_index = staging.errcode_index
+
+    def freeze(self, compact = False):
+        with self.write_lock:
+            super().freeze(compact)
+
+    def registerErrcode(self, mod_name=None, name=None, message=None, number=None, template=False):
+        with self.write_lock:
+            if self.frozen:
+                raise ImmutableObjectWriteError()
+
+            staging = self.__stage((mod_name,))
+            number = staging.registerErrcode(mod_name, name, message, number, template)
+            self.__publish(staging)
+        return number
+
+    def registerErrcodes(self, rows=None, templates=False):
+        if rows is None:
+            raise ValueError("rows cannot be None.")
+
+        rows = list(rows)
+        mod_names = set(row[0] for row in rows if len(row) in (3, 4))
+        with self.write_lock:
+            if self.frozen:
+                raise ImmutableObjectWriteError()
+
+            staging = self.__stage(mod_names)
+            retval = staging.registerErrcodes(rows, templates)
+            self.__publish(staging)
+        return retval
+
+    #For callers that need several lookups against one consistent state.
+    def getSnapshot(self):
+        return self.modules
+
+#Callables run by die() before the process exits, e.g. to flush buffered
+#output. Hooks run concurrently, each on its own thread, under the deadline
+#of die(). A hook may also be a coroutine function; it then runs in an
+#event loop of its own.
+shutdown_hooks = []
+
+#Seconds die() waits for the shutdown hooks, all together.
+SHUTDOWN_TIMEOUT = 10.0
+
+#Serializes die() calls coming from several threads.
+shutdown_lock = threading.RLock()
+
+#Timing of the hooks run by the last die(), see runShutdownHooks.
+last_shutdown_report = []
+
+def registerShutdownHook(hook = None):
+    if hook is None:
+        raise ValueError("hook cannot be None.")
+
+    shutdown_hooks.append(hook)
+
+def unregisterShutdownHook(hook = None):
+    try:
+        shutdown_hooks.remove(hook)
+    except ValueError:
+        pass
+
+def _runShutdownHook(hook, record, done):
+    start = time.perf_counter()
+    try:
+        result = hook()
+        if isinstance(result, collections.abc.Awaitable):
+            import asyncio
+            asyncio.run(_awaitResult(result))
+        record["status"] = "done"
+    except BaseException:
+        #A failing hook must not keep the process from exiting.
+        import traceback
+        record["status"] = "failed"
+        traceback.print_exc()
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        done.release()
+
+async def _awaitResult(result):
+    return await result
+
+#Runs every shutdown hook concurrently and waits until they are done or
+#"timeout" seconds have passed. Hooks still running then are abandoned; they
+#run on daemon threads, so they do not hold the process up.
+#Returns a record per hook, in registration order:
+#{"hook": name, "status": "done" | "failed" | "timeout", "seconds": elapsed}.
+def runShutdownHooks(timeout = None):
+    if timeout is None:
+        timeout = SHUTDOWN_TIMEOUT
+
+    hooks = list(shutdown_hooks)
+    done = threading.Semaphore(0)
+    records = []
+    for hook in hooks:
+        record = {"hook": getattr(hook, "__qualname__", repr(hook)), "status": "timeout", "seconds": None}
+        records.append(record)
+        threading.Thread(target = _runShutdownHook, args = (hook, record, done),
+                         name = "shutdown-hook", daemon = True).start()
+
+    deadline = time.monotonic() + timeout
+    for i in range(0, len(hooks)):
+        if not done.acquire(timeout = max(deadline - time.monotonic(), 0)):
+            break
+    return [dict(x) for x in records]
+
+#Maps an errcode number into the 0-255 range of process exit codes. Numbers
+#outside of it wrap around, but never onto 0, which would report success.
+def exitCode(errcode = None):
+    if errcode is None:
+        raise ValueError("errcode cannot be None")
+
+    if 0 <= errcode <= 255:
+        return errcode
+    return errcode % 256 or 1
+
+def _resolveExitCode(mod_name, errcode):
+    try:
+        errcode = ErrcodeHandler.instance.getErrcode(mod_name, errcode)
+    except (ErrcodeHandleError, KeyError, TypeError, ValueError):
+        pass
+
+    if isinstance(errcode, Errcode):
+        if errcode.number != 0:
+            sys.stderr.write("{0}: {1}: {2}\n".format(mod_name, errcode.name, errcode.message))
+        errcode = errcode.number
+    if isinstance(errcode, numbers.Integral):
+        return exitCode(int(errcode))
+    sys.stderr.write("{0}: {1}\n".format(mod_name, errcode))
+    return 1
+
+def _flushOutputs():
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except (AttributeError, OSError, ValueError):
+            pass
+
+#Exits the process with the errcode "errcode" of module "mod_name", given by
+#number or name. The errcode is reported on stderr, the shutdown hooks run
+#(see runShutdownHooks) and buffered output is flushed first.
+#In the main thread die() raises SystemExit. Any other thread, asyncio tasks
+#running outside of the main thread included, cannot make the process exit
+#that way, so there the process ends with os._exit() once the hooks are
+#done, without running atexit handlers.
+#timeout: seconds to wait for the hooks, SHUTDOWN_TIMEOUT by default.
+#report: called with the hook records before exiting, e.g. to log them.
+def die(mod_name = None, errcode = None, timeout = None, report = None):
+    global last_shutdown_report
+
     if mod_name is None:
         raise ValueError("mod_name cannot be None")
     if errcode is None:
         raise ValueError("errcode cannot be None")
-    quit(errcode)
 
+    with shutdown_lock:
+        code = _resolveExitCode(mod_name, errcode)
+        last_shutdown_report = runShutdownHooks(timeout)
+        for record in last_shutdown_report:
+            if record["status"] == "timeout":
+                sys.stderr.write("Shutdown hook {0} did not finish in time\n".format(record["hook"]))
+        if report is not None:
+            try:
+                report(last_shutdown_report)
+            except Exception:
+                import traceback
+                traceback.print_exc()
+        _flushOutputs()
+
+        if threading.current_thread() is threading.main_thread():
+            raise SystemExit(code)
+
+        #atexit handlers do not run after os._exit(), logging's among them.
+        logging = sys.modules.get("logging")
+        if logging is not None:
+            logging.shutdown()
+        _flushOutputs()
+    os._exit(code)
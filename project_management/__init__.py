@@ -3,10 +3,11 @@ import enum
 import pathlib
 import pyrsistent
 import sys
-import unittest.mock
 
 #from .. import conflict_resolution
+from ..conflict_resolution import CommitFailure as CommitFailure
 from ..conflict_resolution import ImmutableObjectWriteError as ImmutableObjectWriteError
+from ..conflict_resolution import ReadOnlyMapping as ReadOnlyMapping
 from ..conflict_resolution import ReadOnlyAfterCommitCommittable as ReadOnlyAfterCommitCommittable
 
 class ProjectManagementError(Exception):
@@ -234,12 +235,8 @@ class Project(ReadOnlyAfterCommitCommittable):
 
         """.format(self.__persistent_metadata.name, self.__persistent_metadata.path))
 
-        if not isinstance(required_nodes, pyrsistent.PMap):
-            required_nodes = copy.copy(self.__hard_required_filesystem_nodes)
-
-        #Keep in mind that PMap is going to quietly create a new list structure here containing a deep copy
-        #of "required_nodes" in addition to the results of the list comprehension.
-        required_nodes.append([x for x in self.__supplemental_filesystem_nodes if x.required == True])
+        required_nodes = list(self.__hard_required_filesystem_nodes.values())
+        required_nodes.extend([x for x in self.__supplemental_filesystem_nodes.values() if x.required == True])
 
         buffer.append('********************Required Filesystem Nodes********************')
         for var in required_nodes:
@@ -247,7 +244,7 @@ class Project(ReadOnlyAfterCommitCommittable):
 
         required_nodes = None
         buffer.append('*******************Supplemental Filesystem Nodes********************')
-        buffer.append([x.__str__() for x in self.__supplemental_filesystem_nodes if x.required == False])
+        buffer.extend([x.__str__() for x in self.__supplemental_filesystem_nodes.values() if x.required == False])
 
         return("""
         """.join(buffer))
@@ -292,15 +289,24 @@ class Project(ReadOnlyAfterCommitCommittable):
         if not self.__in_workable_state:
             retval = self.checkProjectTree()
             if retval is not None:
-                raise conflict_resolution.CommitFailure("""
+                raise CommitFailure("""
 Missing optional dependencies, or optional dependencies are not of the
 correct type according or project spec. If you want to force a commit,
 you can work around this by calling Project.checkProjectTree() before
 calling Project.commit()
 """)
-        self.__supplemental_filesystem_nodes = pyrsistent.freeze(self.__supplemental_filesystem_nodes)
-        self.__hard_required_filesystem_nodes =  pyrsistent.freeze(self.__supplemental_filesystem_nodes)
-
+        #The nodes are immutable PClass records, so read-only views of the
+        #dicts are enough; nothing is copied.
+        self.__supplemental_filesystem_nodes = ReadOnlyMapping(self.__supplemental_filesystem_nodes)
+        self.__hard_required_filesystem_nodes = ReadOnlyMapping(self.__hard_required_filesystem_nodes)
+
+    #Usability is left out: it can still change after the commit.
+    def getContentState(self):
+        return (
+            self.__persistent_metadata,
+            self.__hard_required_filesystem_nodes,
+            self.__supplemental_filesystem_nodes
+            )
 
     #If a required filesystem node is missing, we throw an exception.
     #If an optional filesystem node is missing, we just return tuple: success, arr_of_missing_paths:
@@ -342,19 +348,16 @@ calling Project.commit()
             return None
         return self.__supplemental_filesystem_nodes[self.persistent_metadata.third_party_dir_name].path
 
+    #Before the commit, a copy the caller may change freely.
+    #After the commit, the committed ReadOnlyMapping itself: reading it
+    #copies nothing, and writing to it raises ImmutableObjectWriteError.
+    #Call copy() on it for a mutable dict.
     def getSupplementalFilesystemNodes(self):
         retval = None
         if not self.isCommitted():
             retval = copy.copy(self.__supplemental_filesystem_nodes)
         else:
-            #When an object of this class is "committed",
-            #the type of "self.__supplemental_filesystem_nodes"
-            #changes to "PMap" (a part of Pyrsistent),
-            #which automatically deep-copies itself
-            #when one attempts to save a reference to it, or
-            #assign it to a variable.
             retval = self.__supplemental_filesystem_nodes
-            retval = pyrsistent.thaw(retval)
 
         return retval
 
@@ -363,14 +366,7 @@ calling Project.commit()
         if not self.isCommitted():
             retval = copy.copy(self.__hard_required_filesystem_nodes)
         else:
-            #When an object of this class is "committed",
-            #the type of "self.__hard_required_filesystem_nodes"
-            #changes to "PMap" (a part of Pyrsistent),
-            #which automatically deep-copies itself
-            #when one attempts to save a reference to it, or
-            #assign it to a variable.
             retval = self.__hard_required_filesystem_nodes
-            retval = pyrsistent.thaw(retval)
 
         return retval
 
@@ -244,6 +244,35 @@ class TestProjectVerificationLogic(TestProjectClassWithSupplementalNodeInfo):
             self.assertEqual(retval[0][0].name, "TestFile")
             self.assertEqual(retval[0][1], prjmgt.FilesystemNode.CheckErrcodes.CHECK_ERRCODE_INCORRECT_TYPE)
 
+    def test_commit_failure_optional_missing(self):
+        with mock.patch('pathlib.Path') as MockPath:
+            instance = MockPath.return_value
+            instance.exists.return_value=True
+            instance.is_dir.return_value=True
+            instance.is_file.return_value=False
+            instance.__truediv__.return_value=pathlib.Path()
+
+            project = prjmgt.Project(
+                    name = self.name,
+                    path = pathlib.Path(self.path.__str__()),
+                    script_dir_name = self.scripts_dir_name,
+                    source_dir_name = self.source_dir_name
+                    )
+            project.registerSupplementalFilesystemNode(
+                                                       name = "TestFile",
+                                                       path = pathlib.Path("test_file"),
+                                                       node_type = prjmgt.FilesystemNodeType.FILE
+                                                       )
+
+            with self.assertRaises(conflict_resolution.CommitFailure):
+                project.commit()
+            self.assertFalse(project.isCommitted())
+
+            #Forcing the commit as the error message describes.
+            project.checkProjectTree()
+            project.commit()
+            self.assertTrue(project.isCommitted())
+
 class TestProjectRecordPersistence(TestProjectClassWithSupplementalNodeInfo):
     def setUp(self):
         super().setUp()
@@ -374,5 +403,77 @@ class TestProjectCommit(TestProjectClassWithSupplementalNodeInfo):
             copy.pop(key)
             self.assertTrue((self.project.getSupplementalFilesystemNodes()).get(key, None) is not None)
 
+    def test_commit_read_only_views(self):
+        with mock.patch('pathlib.Path') as MockPath:
+            instance = MockPath.return_value
+            instance.exists.return_value=True
+            instance.is_dir.return_value=True
+            instance.is_file.return_value=False
+            instance.__truediv__.return_value=pathlib.Path()
+
+
+            project = prjmgt.Project(
+                    name = self.name, 
+                    path = pathlib.Path(self.path.__str__()),  #Otherwise, we can't mock this path object 
+                    script_dir_name = self.scripts_dir_name, 
+                    source_dir_name = self.source_dir_name
+                    )
+
+            project.commit()
+
+            #No copy per call.
+            hard_required = project.getHardRequiredFilesystemNodes()
+            self.assertIs(hard_required, project.getHardRequiredFilesystemNodes())
+            self.assertIs(project.getSupplementalFilesystemNodes(), project.getSupplementalFilesystemNodes())
+
+            #The hard required nodes survive the commit.
+            self.assertEqual(
+                    sorted(hard_required.keys()),
+                    sorted([project.ROOT_FILESYSTEM_NODE_KEY, project.SCRIPTS_FILESYSTEM_NODE_KEY, project.SOURCE_FILESYSTEM_NODE_KEY])
+                    )
+
+            key = prjmgt.Project.ROOT_FILESYSTEM_NODE_KEY
+            with self.assertRaises(conflict_resolution.ImmutableObjectWriteError):
+                hard_required.pop(key)
+            with self.assertRaises(conflict_resolution.ImmutableObjectWriteError):
+                hard_required[key] = None
+            with self.assertRaises(conflict_resolution.ImmutableObjectWriteError):
+                project.getSupplementalFilesystemNodes().clear()
+
+            copy = hard_required.copy()
+            copy.pop(key)
+            self.assertTrue(hard_required.get(key, None) is not None)
+            self.assertTrue(project.isReadOnly())
+            with self.assertRaises(conflict_resolution.DoubleCommitError):
+                project.commit()
+
+    def test_commit_content_hash(self):
+        with mock.patch('pathlib.Path') as MockPath:
+            instance = MockPath.return_value
+            instance.exists.return_value=True
+            instance.is_dir.return_value=True
+            instance.is_file.return_value=False
+            instance.__truediv__.return_value=pathlib.Path()
+
+            projects = [
+                prjmgt.Project(
+                    name = self.name,
+                    path = pathlib.Path(self.path.__str__()),
+                    script_dir_name = scripts_dir_name,
+                    source_dir_name = self.source_dir_name
+                    )
+                for scripts_dir_name in (self.scripts_dir_name, self.scripts_dir_name, "other")
+                ]
+            for project in projects:
+                project.commit()
+
+            content_hash = projects[0].getContentHash()
+            self.assertTrue(projects[0].contentEquals(projects[1]))
+            self.assertFalse(projects[0].contentEquals(projects[2]))
+
+            #Usability is not part of the content.
+            projects[0].setUsabilityFalse()
+            self.assertEqual(projects[0].getContentHash(), content_hash)
+
 if __name__ == "__main__":
     unittest.main()
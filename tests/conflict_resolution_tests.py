@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+import gc
+import importlib.metadata
+import pathlib
+import sys
+import threading
+import unittest
+import weakref
+
+sys.path.append(pathlib.Path.cwd().parent.parent.__str__())
+from sharedlib import conflict_resolution
+
+class ReadOnlyMappingTest(unittest.TestCase):
+
+    def test_reads(self):
+        data = {"a": 1, "b": 2}
+        view = conflict_resolution.ReadOnlyMapping(data)
+        self.assertEqual(view["a"], 1)
+        self.assertEqual(view.get("c", 3), 3)
+        self.assertEqual(sorted(view.keys()), ["a", "b"])
+        self.assertEqual(len(view), 2)
+        self.assertTrue("b" in view)
+        self.assertEqual(view, data)
+        self.assertEqual(view, conflict_resolution.ReadOnlyMapping(view))
+
+    def test_writes(self):
+        view = conflict_resolution.ReadOnlyMapping({"a": 1})
+        for write in (lambda: view.__setitem__("a", 2), lambda: view.__delitem__("a"), lambda: view.pop("a"),
+                      view.popitem, view.clear, lambda: view.update(a = 2), lambda: view.setdefault("b", 2)):
+            self.assertRaises(conflict_resolution.ImmutableObjectWriteError, write)
+
+        mutable = view.copy()
+        mutable["a"] = 2
+        self.assertEqual(view["a"], 1)
+
+class VersionedCommittableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.committable = conflict_resolution.VersionedCommittable({"a": 1, "b": {"x": [1, 2]}})
+
+    def test_repeated_commits(self):
+        first = self.committable.getSnapshot()
+        self.committable.set("a", 2)
+        self.committable.remove("b")
+        self.committable.set("c", 3)
+        self.assertEqual(self.committable.get("a"), 2)
+        self.assertEqual(first["a"], 1)
+
+        second = self.committable.commit()
+        self.assertEqual(second.version, 1)
+        self.assertIs(second.parent, first)
+        self.assertEqual(dict(second.delta), {
+            "a": (1, 2),
+            "b": ({"x": [1, 2]}, conflict_resolution.MISSING),
+            "c": (conflict_resolution.MISSING, 3),
+        })
+        self.assertEqual(dict(second), {"a": 2, "c": 3})
+
+        self.committable.set("a", 4)
+        third = self.committable.commit()
+        self.assertEqual(self.committable.getVersions(), [0, 1, 2])
+        self.assertIs(self.committable.getSnapshot(1), second)
+        self.assertEqual([x.version for x in third.getLineage()], [2, 1, 0])
+        self.assertRaises(KeyError, self.committable.getSnapshot, 3)
+
+    def test_snapshots_immutable(self):
+        snapshot = self.committable.getSnapshot()
+        self.assertRaises(conflict_resolution.ImmutableObjectWriteError, snapshot.__setitem__, "a", 2)
+
+        #Nested values are frozen as well.
+        with self.assertRaises(TypeError):
+            snapshot["b"]["x"] = 1
+        self.committable.set("d", {"y": 1})
+        with self.assertRaises(TypeError):
+            self.committable.get("d")["y"] = 2
+
+    def test_no_change(self):
+        latest = self.committable.getSnapshot()
+        self.assertIs(self.committable.commit(), latest)
+
+        self.committable.set("a", 1)
+        self.assertFalse(self.committable.getPendingDelta())
+        self.assertIs(self.committable.commit(), latest)
+
+        self.committable.set("a", 5)
+        self.committable.discard()
+        self.assertEqual(self.committable.get("a"), 1)
+        self.assertFalse(self.committable.hasChanges())
+        self.assertIs(self.committable.commit(), latest)
+
+    def test_structural_sharing(self):
+        committable = conflict_resolution.VersionedCommittable({i: i for i in range(0, 1000)})
+        first = committable.getSnapshot()
+        committable.set(5, -5)
+        second = committable.commit()
+        self.assertEqual(first[5], 5)
+        self.assertEqual(second[5], -5)
+        self.assertEqual(len(second.delta), 1)
+
+        #Buckets that hold none of the changed keys are shared.
+        shared = sum(1 for (x, y) in zip(first.data._buckets, second.data._buckets) if x is y)
+        self.assertGreater(shared, len(first.data._buckets) - 2)
+
+    def test_fork(self):
+        self.committable.set("a", 2)
+        base = self.committable.commit()
+        fork = self.committable.fork()
+        fork.set("e", 5)
+        forked = fork.commit()
+        self.assertIs(forked.parent, base)
+        self.assertEqual(forked.version, 2)
+        self.assertEqual(self.committable.getVersion(), 1)
+        self.assertFalse("e" in self.committable)
+
+    def test_prune(self):
+        committable = conflict_resolution.VersionedCommittable({"a": 0})
+        old = [weakref.ref(committable.getSnapshot())]
+        for i in range(1, 10):
+            committable.set("a", i)
+            old.append(weakref.ref(committable.commit()))
+        held = committable.getSnapshot(2)
+
+        self.assertEqual(committable.prune(5), 5)
+        self.assertEqual(committable.getVersions(), [5, 6, 7, 8, 9])
+        self.assertRaises(KeyError, committable.getSnapshot, 4)
+        self.assertIsNone(committable.getSnapshot(5).parent)
+        self.assertEqual([x.version for x in committable.getSnapshot().getLineage()], [9, 8, 7, 6, 5])
+
+        #Snapshots nobody holds are gone; a held one stays readable and
+        #keeps its own parents.
+        gc.collect()
+        self.assertEqual([x() is None for x in old[0:5]], [False, False, False, True, True])
+        self.assertEqual(held["a"], 2)
+        held = None
+        gc.collect()
+        self.assertTrue(all(x() is None for x in old[0:5]))
+
+        #The latest version is never pruned.
+        self.assertEqual(committable.prune(100), 4)
+        self.assertEqual(committable.getVersions(), [9])
+        self.assertEqual(committable.prune(3), 0)
+
+        #A commit built on a pruned version is refused.
+        self.assertEqual(committable.compareAndCommit(9, {"a": 10}).version, 10)
+        committable.prune(10)
+        self.assertIsInstance(committable.compareAndCommit(9, {"a": 11}), conflict_resolution.CommitConflict)
+
+    def test_max_versions(self):
+        committable = conflict_resolution.VersionedCommittable({"a": 0}, max_versions = 3)
+        for i in range(1, 10):
+            committable.set("a", i)
+            committable.commit()
+        self.assertEqual(committable.getVersions(), [7, 8, 9])
+        self.assertEqual(committable.fork().getVersions(), [9])
+        self.assertRaises(ValueError, conflict_resolution.VersionedCommittable, {}, 0)
+
+        #A stale writer whose version was pruned is told who won.
+        committable = conflict_resolution.VersionedCommittable({"a": 1}, max_versions = 1)
+        committable.compareAndCommit(0, {"a": 2})
+        latest = committable.compareAndCommit(1, {"a": 3})
+        conflict = committable.compareAndCommit(0, {"a": 4})
+        self.assertIsInstance(conflict, conflict_resolution.CommitConflict)
+        self.assertEqual(conflict.expected_version, 0)
+        self.assertIs(conflict.snapshot, latest)
+        self.assertRaises(KeyError, committable.compareAndCommit, 7, {"a": 1})
+
+        #So is retryCommit, which then tries again on the latest snapshot.
+        calls = []
+        def update(snapshot):
+            calls.append(snapshot.version)
+            if len(calls) == 1:
+                for i in range(0, 2):
+                    current = committable.getSnapshot()
+                    committable.compareAndCommit(current.version, {"a": current["a"] + 1})
+            return {"a": snapshot["a"] * 10}
+        self.assertEqual(conflict_resolution.retryCommit(committable, update)["a"], 50)
+        self.assertEqual(calls, [2, 4])
+
+    def test_bad_input(self):
+        self.assertRaises(ValueError, self.committable.set, None, 1)
+        self.assertRaises(KeyError, self.committable.remove, "missing")
+        self.assertRaises(ValueError, conflict_resolution.VersionedCommittable.fromSnapshot, None)
+
+class ThreeWayMergeTest(unittest.TestCase):
+
+    def setUp(self):
+        committable = conflict_resolution.VersionedCommittable({i: i for i in range(0, 100)})
+        self.base = committable.getSnapshot()
+        self.ours_committable = committable
+        self.theirs_committable = committable.fork()
+
+    def commitBoth(self, ours, theirs):
+        for (committable, changes) in ((self.ours_committable, ours), (self.theirs_committable, theirs)):
+            for (key, value) in changes.items():
+                if value is conflict_resolution.MISSING:
+                    committable.remove(key)
+                else:
+                    committable.set(key, value)
+        return self.ours_committable.commit(), self.theirs_committable.commit()
+
+    def test_disjoint_changes(self):
+        ours, theirs = self.commitBoth({1: "a", 2: conflict_resolution.MISSING}, {3: "b", 4: conflict_resolution.MISSING, 200: "c"})
+        result = conflict_resolution.threeWayMerge(self.base, ours, theirs)
+        self.assertFalse(result.hasConflicts())
+        self.assertIs(result.snapshot.parent, ours)
+        self.assertEqual(result.applied, {3: (3, "b"), 4: (4, conflict_resolution.MISSING), 200: (conflict_resolution.MISSING, "c")})
+        merged = result.snapshot
+        self.assertEqual((merged[1], merged[3], merged[200]), ("a", "b", "c"))
+        self.assertFalse(2 in merged or 4 in merged)
+
+    def test_same_change(self):
+        ours, theirs = self.commitBoth({1: "a"}, {1: "a"})
+        result = conflict_resolution.threeWayMerge(self.base, ours, theirs)
+        self.assertFalse(result.hasConflicts())
+        self.assertIs(result.snapshot, ours)
+
+    def test_conflicts(self):
+        ours, theirs = self.commitBoth({1: "ours", 2: "ours"}, {1: "theirs", 2: conflict_resolution.MISSING})
+        result = conflict_resolution.threeWayMerge(self.base, ours, theirs)
+        self.assertEqual(result.conflicts, [
+            conflict_resolution.MergeConflict(1, 1, "ours", "theirs"),
+            conflict_resolution.MergeConflict(2, 2, "ours", conflict_resolution.MISSING),
+        ])
+        self.assertEqual(result.snapshot[1], "ours")
+
+        result = conflict_resolution.threeWayMerge(self.base, ours, theirs, conflict_resolution.preferTheirs)
+        self.assertFalse(result.hasConflicts())
+        self.assertEqual([x.key for x in result.resolved], [1, 2])
+        self.assertEqual(result.snapshot[1], "theirs")
+        self.assertFalse(2 in result.snapshot)
+
+        policy = conflict_resolution.keyPolicy({2: conflict_resolution.preferOurs})
+        result = conflict_resolution.threeWayMerge(self.base, ours, theirs, policy)
+        self.assertEqual([x.key for x in result.conflicts], [1])
+        self.assertEqual([x.key for x in result.resolved], [2])
+
+        with self.assertRaises(conflict_resolution.MergeConflictError) as context:
+            conflict_resolution.threeWayMerge(self.base, ours, theirs, conflict_resolution.failOnConflict)
+        self.assertEqual(context.exception.conflicts[0].key, 1)
+
+    def test_diff_paths(self):
+        ours, theirs = self.commitBoth({}, {1: "a", 2: conflict_resolution.MISSING, 300: "b"})
+        expected = {1: (1, "a"), 2: (2, conflict_resolution.MISSING), 300: (conflict_resolution.MISSING, "b")}
+        self.assertEqual(conflict_resolution.diffSnapshots(self.base, theirs), expected)
+        self.assertEqual(conflict_resolution.diffSnapshots(self.base.data, theirs.data), expected)
+        self.assertEqual(conflict_resolution.diffSnapshots(dict(self.base), dict(theirs)), expected)
+        self.assertEqual(conflict_resolution.diffSnapshots(self.base, ours), {})
+        self.assertEqual(conflict_resolution.diffSnapshots(theirs, theirs), {})
+
+        #Changed back: nothing left in the combined delta.
+        self.theirs_committable.set(1, 1)
+        self.assertEqual(1 in conflict_resolution.diffSnapshots(self.base, self.theirs_committable.commit()), False)
+
+    def test_bucket_diff_pyrsistent_version(self):
+        #The PMap diff reads pyrsistent's private PMap._buckets. Check the
+        #layout again before allowing a newer pyrsistent here.
+        version = tuple(int(x) for x in importlib.metadata.version("pyrsistent").split(".")[0:2])
+        self.assertTrue((0, 18) <= version <= (0, 20), "untested pyrsistent version: {0}".format(version))
+        buckets = self.base.data._buckets
+        self.assertTrue(all(x is None or all(len(pair) == 2 for pair in x) for x in buckets))
+
+        #A resized map takes the key by key path and gives the same result.
+        ours, theirs = self.commitBoth({}, {i: i for i in range(100, 1000)})
+        self.assertNotEqual(len(theirs.data._buckets), len(buckets))
+        self.assertEqual(conflict_resolution.diffSnapshots(self.base.data, theirs.data),
+                         conflict_resolution.diffSnapshots(dict(self.base), dict(theirs)))
+
+    def test_plain_mappings(self):
+        result = conflict_resolution.threeWayMerge({"a": 1, "b": 2}, {"a": 5, "b": 2}, {"a": 1, "b": 3})
+        self.assertEqual(dict(result.snapshot), {"a": 5, "b": 3})
+
+    def test_versioned_merge(self):
+        ours, theirs = self.commitBoth({1: "ours"}, {1: "theirs", 5: "theirs"})
+        self.assertIs(conflict_resolution.findCommonAncestor(ours, theirs), self.base)
+
+        result = self.ours_committable.merge(theirs)
+        self.assertEqual([x.key for x in result.conflicts], [1])
+        merged = self.ours_committable.commit()
+        self.assertEqual((merged[1], merged[5]), ("ours", "theirs"))
+        self.assertIs(conflict_resolution.findCommonAncestor(merged, theirs), self.base)
+
+        #5 is already in, so only the conflict on 1 and the new 6 are applied.
+        self.theirs_committable.set(6, "theirs")
+        result = self.ours_committable.merge(self.theirs_committable.commit(), conflict_resolution.preferTheirs)
+        self.assertEqual(result.applied, {1: ("ours", "theirs"), 6: (6, "theirs")})
+
+        self.ours_committable.set(7, 7)
+        self.assertRaises(ValueError, self.ours_committable.merge, theirs)
+        other = conflict_resolution.VersionedCommittable({})
+        self.ours_committable.discard()
+        self.assertRaises(ValueError, self.ours_committable.merge, other.getSnapshot())
+
+class ContentHashTest(unittest.TestCase):
+
+    def test_values(self):
+        contentHash = conflict_resolution.contentHash
+        self.assertEqual(contentHash({"a": [1, 2], "b": {3}}), contentHash({"b": {3}, "a": (1, 2)}))
+        self.assertNotEqual(contentHash({"a": 1}), contentHash({"a": "1"}))
+        self.assertNotEqual(contentHash([1, 2]), contentHash([2, 1]))
+        self.assertNotEqual(contentHash(["ab", "c"]), contentHash(["a", "bc"]))
+        self.assertNotEqual(contentHash({"a": 1, "b": 1}), contentHash({}))
+        self.assertEqual(contentHash(1), contentHash(1))
+        self.assertLess(contentHash("a"), 2 ** (8 * conflict_resolution.HASH_SIZE))
+
+    def test_incremental_snapshots(self):
+        committable = conflict_resolution.VersionedCommittable({i: {"value": i} for i in range(0, 100)})
+        first = committable.getSnapshot()
+        first.getContentHash()
+        committable.set(5, "changed")
+        committable.remove(6)
+        committable.set(200, [1])
+        second = committable.commit()
+
+        #Hashed from the delta at commit time, and the same as hashing it all.
+        self.assertIsNotNone(second.content_hash)
+        self.assertEqual(second.getContentHash(), conflict_resolution.contentHash(dict(second)))
+        self.assertNotEqual(first, second)
+
+        committable.set(5, {"value": 5})
+        committable.set(6, {"value": 6})
+        committable.remove(200)
+        third = committable.commit()
+        self.assertEqual(third.getContentHash(), first.getContentHash())
+        self.assertEqual(third, first)
+        self.assertEqual(len({first, second, third}), 2)
+
+    def test_numbers(self):
+        contentHash = conflict_resolution.contentHash
+        self.assertEqual(contentHash({"x": 1}), contentHash({"x": 1.0}))
+        self.assertEqual(contentHash([True]), contentHash([1]))
+        self.assertNotEqual(contentHash(1.5), contentHash(1))
+
+        committable = conflict_resolution.VersionedCommittable({"x": 1})
+        committable.getSnapshot().getContentHash()
+        committable.set("x", 1.0)
+        snapshot = committable.commit()
+        self.assertEqual(snapshot.version, 1)
+        self.assertIs(type(snapshot["x"]), float)
+        self.assertEqual(snapshot.getContentHash(), contentHash(snapshot.data))
+
+    def test_snapshot_hash_agrees_with_eq(self):
+        committable = conflict_resolution.VersionedCommittable({"a": 1})
+        snapshot = committable.getSnapshot()
+        pmap = snapshot.data.set("a", 2).set("a", 1)
+        self.assertEqual(snapshot, pmap)
+        self.assertEqual(hash(snapshot), hash(pmap))
+        self.assertEqual(len({snapshot, pmap}), 1)
+        self.assertEqual(snapshot, conflict_resolution.Snapshot(pmap, 5))
+
+    #Two 0/1 maps whose XOR hashes collide, found by Gaussian elimination
+    #over GF(2) on the entry hash differences.
+    def collidingMaps(self):
+        keys = ["key{0}".format(i) for i in range(0, 160)]
+        basis = {}
+        for i in range(0, len(keys)):
+            vector = conflict_resolution._entryHash(keys[i], 0) ^ conflict_resolution._entryHash(keys[i], 1)
+            mask = 1 << i
+            while vector:
+                top = vector.bit_length() - 1
+                if top not in basis:
+                    basis[top] = (vector, mask)
+                    break
+                vector = vector ^ basis[top][0]
+                mask = mask ^ basis[top][1]
+            if vector == 0:
+                return ({key: 0 for key in keys},
+                        {keys[j]: (mask >> j) & 1 for j in range(0, len(keys))})
+        self.fail("No collision found.")
+
+    def test_hash_collision(self):
+        first, second = self.collidingMaps()
+        self.assertNotEqual(first, second)
+        self.assertEqual(conflict_resolution.contentHash(first), conflict_resolution.contentHash(second))
+
+        first_snapshot = conflict_resolution.VersionedCommittable(first).getSnapshot()
+        second_snapshot = conflict_resolution.VersionedCommittable(second).getSnapshot()
+        self.assertEqual(first_snapshot.getContentHash(), second_snapshot.getContentHash())
+        self.assertNotEqual(first_snapshot, second_snapshot)
+        self.assertEqual(first_snapshot, conflict_resolution.VersionedCommittable(dict(first)).getSnapshot())
+
+        class Record(conflict_resolution.ReadOnlyAfterCommitCommittable):
+            def onVerifyKwargs(self, **kwargs):
+                return True
+
+            def onInitialize(self, **kwargs):
+                self.values = kwargs["values"]
+
+        self.assertFalse(Record(values = first).contentEquals(Record(values = second)))
+        self.assertTrue(Record(values = first).contentEquals(Record(values = dict(first))))
+
+    def test_committable(self):
+        class Record(conflict_resolution.ReadOnlyAfterCommitCommittable):
+            def onVerifyKwargs(self, **kwargs):
+                return True
+
+            def onInitialize(self, **kwargs):
+                self.values = dict(kwargs)
+
+        first = Record(a = 1, b = [2])
+        second = Record(b = [2], a = 1)
+        self.assertTrue(first.contentEquals(second))
+        second.values["a"] = 3
+        self.assertFalse(first.contentEquals(second))
+
+        first.commit()
+        committed = first.getContentHash()
+        self.assertEqual(committed, conflict_resolution.contentHash({"values": {"a": 1, "b": [2]}}))
+        self.assertRaises(ValueError, first.contentEquals, None)
+
+    def test_committable_cycle(self):
+        class Node(conflict_resolution.ReadOnlyAfterCommitCommittable):
+            def onVerifyKwargs(self, **kwargs):
+                return True
+
+            def onInitialize(self, **kwargs):
+                self.children = []
+
+        first = Node()
+        second = Node()
+        first.children.append(second)
+        second.children.append(first)
+
+        #Hashing is not part of the commit, so the commit goes through.
+        first.commit()
+        self.assertTrue(first.isCommitted())
+        self.assertRaises(conflict_resolution.DoubleCommitError, first.commit)
+        self.assertRaises(ValueError, first.getContentHash)
+        self.assertRaises(ValueError, first.getContentHash)
+
+        second.children.pop()
+        second.commit()
+        self.assertEqual(first.getContentHash(), first.getContentHash())
+
+class CompareAndCommitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.committable = conflict_resolution.VersionedCommittable({"a": 1, "b": 2})
+
+    def test_compare_and_commit(self):
+        first = self.committable.compareAndCommit(0, {"a": 5, "b": conflict_resolution.MISSING, "c": [3]})
+        self.assertEqual(first.version, 1)
+        self.assertEqual(dict(first), {"a": 5, "c": [3]})
+        self.assertEqual(dict(first.delta), {"a": (1, 5), "b": (2, conflict_resolution.MISSING), "c": (conflict_resolution.MISSING, [3])})
+        self.assertIs(self.committable.getSnapshot(), first)
+
+        #A stale writer loses and is told who won.
+        conflict = self.committable.compareAndCommit(0, {"a": 6})
+        self.assertIsInstance(conflict, conflict_resolution.CommitConflict)
+        self.assertEqual(conflict.expected_version, 0)
+        self.assertIs(conflict.snapshot, first)
+        self.assertEqual(self.committable.get("a"), 1)
+
+        self.assertIs(self.committable.compareAndCommit(1, {"a": 5}), first)
+        self.assertRaises(KeyError, self.committable.compareAndCommit, 7, {"a": 1})
+        self.assertRaises(ValueError, self.committable.compareAndCommit, 1, None)
+
+    def test_working_copy_rebase(self):
+        #Changes to other keys are rebased onto the new snapshot.
+        self.committable.set("a", 10)
+        self.committable.compareAndCommit(0, {"b": 20})
+        committed = self.committable.commit()
+        self.assertEqual(dict(committed), {"a": 10, "b": 20})
+        self.assertEqual(dict(committed.delta), {"a": (1, 10)})
+        self.assertIs(committed.parent, self.committable.getSnapshot(1))
+
+        #So are the same changes made on both sides.
+        self.committable.set("b", 30)
+        self.committable.compareAndCommit(2, {"b": 30})
+        self.assertIs(self.committable.commit(), self.committable.getSnapshot(3))
+        self.assertFalse(self.committable.hasChanges())
+
+    def test_working_copy_conflict(self):
+        self.committable.set("a", 10)
+        self.committable.set("c", 30)
+        self.committable.compareAndCommit(0, {"a": 20})
+        with self.assertRaises(conflict_resolution.CommitConflictError) as context:
+            self.committable.commit()
+        self.assertEqual(context.exception.conflict.snapshot.version, 1)
+        self.assertEqual(context.exception.conflict.keys, ["a"])
+        self.assertEqual(self.committable.get("a"), 10)
+        self.assertTrue(self.committable.hasChanges())
+
+        #Resolved, the kept changes commit on top of the other commit.
+        self.assertIs(self.committable.rebase(conflict_resolution.preferOurs), self.committable.getSnapshot(1))
+        self.assertEqual(self.committable.getPendingDelta(), {"a": (20, 10), "c": (conflict_resolution.MISSING, 30)})
+        self.assertEqual(dict(self.committable.commit()), {"a": 10, "b": 2, "c": 30})
+
+        self.committable.set("a", 11)
+        self.committable.compareAndCommit(2, {"a": 21})
+        self.committable.rebase(conflict_resolution.preferTheirs)
+        self.assertFalse(self.committable.getPendingDelta())
+        self.assertEqual(self.committable.commit().version, 3)
+
+    def test_retry(self):
+        calls = []
+        def increment(snapshot):
+            calls.append(snapshot.version)
+            if len(calls) == 1:
+                #Someone else commits between the read and the commit.
+                self.committable.compareAndCommit(snapshot.version, {"a": snapshot["a"] + 100})
+            return {"a": snapshot["a"] + 1}
+
+        snapshot = conflict_resolution.retryCommit(self.committable, increment)
+        self.assertEqual(calls, [0, 1])
+        self.assertEqual(snapshot["a"], 102)
+
+        def conflicting(snapshot):
+            self.committable.compareAndCommit(snapshot.version, {"b": snapshot["b"] + 1})
+            return {"a": 0}
+        self.assertRaises(conflict_resolution.CommitConflictError, conflict_resolution.retryCommit, self.committable, conflicting, 3)
+
+    def test_threads(self):
+        counter = conflict_resolution.VersionedCommittable({"count": 0})
+        def work():
+            for i in range(0, 200):
+                conflict_resolution.retryCommit(counter, lambda x: {"count": x["count"] + 1}, 10000)
+
+        threads = [threading.Thread(target = work) for i in range(0, 8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.get("count"), 0)
+        self.assertEqual(counter.getSnapshot()["count"], 1600)
+        self.assertEqual(counter.getVersion(), 1600)
+        self.assertEqual([x.version for x in counter.getSnapshot().getLineage()], list(range(1600, -1, -1)))
+
+    def test_threads_with_working_copy(self):
+        counter = conflict_resolution.VersionedCommittable({"count": 0, "working": 0})
+        def work():
+            for i in range(0, 200):
+                conflict_resolution.retryCommit(counter, lambda x: {"count": x["count"] + 1}, 10000)
+
+        threads = [threading.Thread(target = work) for i in range(0, 4)]
+        for thread in threads:
+            thread.start()
+        for i in range(1, 201):
+            counter.set("working", i)
+            counter.commit()
+        for thread in threads:
+            thread.join()
+        latest = counter.getSnapshot()
+        self.assertEqual((latest["count"], latest["working"]), (800, 200))
+        self.assertEqual(latest.version, 1000)
+
+    def test_single_commit(self):
+        class Record(conflict_resolution.ReadOnlyAfterCommitCommittable):
+            def onVerifyKwargs(self, **kwargs):
+                return True
+
+            def onInitialize(self, **kwargs):
+                self.commits = 0
+                self.fail = True
+
+            def onCommit(self):
+                if self.fail:
+                    self.fail = False
+                    raise conflict_resolution.CommitFailure("first attempt")
+                self.commits = self.commits + 1
+
+        record = Record()
+        self.assertRaises(conflict_resolution.CommitFailure, record.commit)
+        self.assertFalse(record.isCommitted())
+
+        barrier = threading.Barrier(8)
+        errors = []
+        def commit():
+            barrier.wait()
+            try:
+                record.commit()
+            except conflict_resolution.DoubleCommitError as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target = commit) for i in range(0, 8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(record.commits, 1)
+        self.assertEqual(len(errors), 7)
+        self.assertTrue(record.isCommitted())
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+sys.path.append(pathlib.Path.cwd().parent.parent.__str__())
+from sharedlib import error_handling
+from sharedlib import errcode_catalog
+
+class ErrcodeCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errcode_handler = error_handling.ErrcodeHandler()
+        self.mod_name = "test_mod"
+        self.errcode_handler.registerErrcode(self.mod_name, "Test1", "This is Test 1", 1)
+        self.errcode_handler.registerErrcode(self.mod_name, "Test2", "This is Test 2", 2)
+        self.generated = self.errcode_handler.registerErrcode(self.mod_name, "Generated", "This is generated")
+        self.errcode_handler.registerErrcode("other_mod", "Test1", "Something else", 1)
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "errcodes.catalog")
+        errcode_catalog.writeCatalog(self.errcode_handler, self.path)
+        self.catalog = errcode_catalog.loadCatalog(self.path)
+
+    def tearDown(self):
+        self.catalog.close()
+        self.temp_dir.cleanup()
+        self.errcode_handler = None
+
+    def test_getmessage_number_input(self):
+        self.assertEqual(self.catalog.getMessage(self.mod_name, 2), "This is Test 2")
+        self.assertEqual(self.catalog.getMessage(self.mod_name, self.generated), "This is generated")
+        self.assertEqual(self.catalog.getMessage("other_mod", 1), "Something else")
+
+    def test_getmessage_float_input(self):
+        self.assertEqual(self.catalog.getMessage(self.mod_name, 2.0), "This is Test 2")
+        self.assertRaises(KeyError, self.catalog.getMessage, self.mod_name, 2.5)
+        self.assertRaises(KeyError, self.catalog.getMessage, self.mod_name, float("nan"))
+
+    def test_getmessage_name_input(self):
+        self.assertEqual(self.catalog.getMessage(self.mod_name, "Test1"), "This is Test 1")
+        self.assertEqual(self.catalog.getMessage(self.mod_name, "Generated"), "This is generated")
+
+    def test_geterrcode(self):
+        errcode = self.catalog.getErrcode(self.mod_name, "Generated")
+        self.assertEqual(errcode.number, self.generated)
+        self.assertEqual(errcode.name, "Generated")
+
+    def test_unknown_errcode(self):
+        self.assertRaises(KeyError, self.catalog.getMessage, self.mod_name, 3)
+        self.assertRaises(ValueError, self.catalog.getErrcode, self.mod_name, "Test3")
+        self.assertRaises(ValueError, self.catalog.getMessage, self.mod_name, "Test3")
+        self.assertRaises(error_handling.ErrcodeHandleError, self.catalog.getMessage, "no_mod", 1)
+
+    def test_module_views(self):
+        module = self.catalog.modules[self.mod_name]
+        self.assertEqual(sorted(module.errcodes.keys()), sorted([1, 2, self.generated]))
+        self.assertEqual(sorted(module.errcodes_key_name.keys()), ["Generated", "Test1", "Test2"])
+        self.assertEqual(module.errcodes_key_name["Test2"], 2)
+        self.assertTrue(1 in module.errcodes)
+        self.assertFalse("Test1" in module.errcodes)
+
+    def test_buffer_catalog(self):
+        catalog = errcode_catalog.ErrcodeCatalog(
+            memoryview(errcode_catalog.buildCatalog(self.errcode_handler)))
+        self.assertEqual(catalog.getMessage(self.mod_name, "Test2"), "This is Test 2")
+        self.assertEqual(sorted(catalog.getModuleNames()), ["other_mod", self.mod_name])
+
+    def test_bad_buffer(self):
+        self.assertRaises(errcode_catalog.ErrcodeCatalogError,
+                          errcode_catalog.ErrcodeCatalog,
+                          b"NOPE" + bytes(errcode_catalog.HEADER.size))
+
+    def test_byte_order(self):
+        data = bytearray(errcode_catalog.buildCatalog(self.errcode_handler))
+        magic, version, byte_order, module_count = errcode_catalog.HEADER.unpack_from(data, 0)
+        self.assertEqual(byte_order, errcode_catalog.BYTE_ORDERS[sys.byteorder])
+        other = "big" if sys.byteorder == "little" else "little"
+        errcode_catalog.HEADER.pack_into(data, 0, magic, version, errcode_catalog.BYTE_ORDERS[other], module_count)
+        self.assertRaises(errcode_catalog.ErrcodeCatalogError, errcode_catalog.ErrcodeCatalog, data)
+
+    def test_truncated_file(self):
+        with open(self.path, "rb") as catalog_file:
+            data = catalog_file.read()
+        for size in (0, errcode_catalog.HEADER.size, 200, len(data) // 2):
+            with open(self.path, "wb") as catalog_file:
+                catalog_file.write(data[:size])
+            self.assertRaises(errcode_catalog.ErrcodeCatalogError, errcode_catalog.loadCatalog, self.path)
+
+    def test_truncated_string(self):
+        #Stretch the message of the first record past the end of the buffer.
+        data = bytearray(errcode_catalog.buildCatalog(self.errcode_handler))
+        records_offset = errcode_catalog.MODULE_ENTRY.unpack_from(data, errcode_catalog.HEADER.size)[4]
+        length_offset = records_offset + (3 * errcode_catalog.WORD_SIZE)
+        data[length_offset:length_offset + errcode_catalog.WORD_SIZE] = len(data).to_bytes(errcode_catalog.WORD_SIZE, sys.byteorder)
+        catalog = errcode_catalog.ErrcodeCatalog(data)
+        module = catalog.modules[catalog.getModuleNames()[0]]
+        self.assertRaises(errcode_catalog.ErrcodeCatalogError, module.readMessage, 0)
+        catalog.close()
+
+    def test_unstorable_number(self):
+        self.errcode_handler.registerErrcode(self.mod_name, "Negative", "Negative", -1)
+        self.assertRaises(errcode_catalog.ErrcodeCatalogError,
+                          errcode_catalog.buildCatalog,
+                          self.errcode_handler)
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import io
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+sys.path.append(pathlib.Path.cwd().parent.parent.__str__())
+from sharedlib import error_handling
+from sharedlib import errcode_catalog
+from sharedlib import errcode_decoder
+
+class ErrcodeLogDecoderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errcode_handler = error_handling.ErrcodeHandler()
+        self.mod_name = "test_mod"
+        self.errcode_handler.registerErrcode(self.mod_name, "Test1", "This is Test 1", 1)
+        self.errcode_handler.registerErrcode(self.mod_name, "Test2", "This is Test 2", 2)
+        self.errcode_handler.registerErrcode("other_mod", "Other1", "Something else", 1)
+        self.errcode_handler.registerErrcode("other_mod", "Other3", "Only here", 3)
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.temp_dir.name, "test.log")
+        self.catalog_path = os.path.join(self.temp_dir.name, "errcodes.catalog")
+        errcode_catalog.writeCatalog(self.errcode_handler, self.catalog_path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        self.errcode_handler = None
+
+    def test_decode(self):
+        decoder = errcode_decoder.ErrcodeLogDecoder(self.errcode_handler, self.mod_name)
+        self.assertEqual(decoder.decode(b"start\nfailed errcode=2 here\n"),
+                         b"start\nfailed errcode=2 (test_mod.Test2: This is Test 2) here\n")
+        self.assertEqual(decoder.decode(b"errcode=other_mod:1"),
+                         b"errcode=other_mod:1 (other_mod.Other1: Something else)")
+        self.assertEqual(decoder.decode(b"errcode=9 errcode=no_mod:1"), b"errcode=9 errcode=no_mod:1")
+        self.assertEqual(decoder.decoded, 2)
+        self.assertEqual(decoder.unknown, 2)
+
+    def test_decode_without_module(self):
+        decoder = errcode_decoder.ErrcodeLogDecoder(self.errcode_handler, template = "{name}")
+        #1 is registered by both modules, so it is left alone.
+        self.assertEqual(decoder.decode(b"errcode=3 errcode=1 errcode=2"), b"Other3 errcode=1 Test2")
+
+    def test_decode_catalog(self):
+        with errcode_catalog.loadCatalog(self.catalog_path) as catalog:
+            decoder = errcode_decoder.ErrcodeLogDecoder(catalog, self.mod_name, template = "{name}")
+            self.assertEqual(decoder.decode(memoryview(b"x errcode=1 y")), b"x Test1 y")
+
+    def test_bad_arguments(self):
+        self.assertRaises(ValueError, errcode_decoder.ErrcodeLogDecoder, None)
+        self.assertRaises(errcode_decoder.ErrcodeDecoderError,
+                          errcode_decoder.ErrcodeLogDecoder, self.errcode_handler, "no_mod")
+        self.assertRaises(errcode_decoder.ErrcodeDecoderError,
+                          errcode_decoder.ErrcodeLogDecoder, self.errcode_handler, None, rb"errcode=(\d+)")
+
+    def test_split_lines(self):
+        data = b"aaaa\nbb\ncccccc\nd"
+        ranges = list(errcode_decoder.splitLines(data, 3))
+        self.assertEqual(b"".join(data[start:stop] for (start, stop) in ranges), data)
+        for (start, stop) in ranges[:-1]:
+            self.assertEqual(data[stop - 1:stop], b"\n")
+        self.assertEqual(list(errcode_decoder.splitLines(b"", 3)), [])
+
+    def write_log(self, lines):
+        with open(self.log_path, "wb") as log_file:
+            for i in range(0, lines):
+                log_file.write("line {0} errcode={1} done\n".format(i, (i % 3) + 1).encode("utf-8"))
+
+    def test_decode_file(self):
+        self.write_log(1000)
+        decoder = errcode_decoder.ErrcodeLogDecoder(self.errcode_handler, self.mod_name, template = "{name}")
+        output = io.BytesIO()
+        size, decoded, unknown = errcode_decoder.decodeFile(self.log_path, output, decoder, chunk_size = 100)
+        self.assertEqual(size, os.path.getsize(self.log_path))
+        self.assertEqual((decoded, unknown), (667, 333))
+        lines = output.getvalue().split(b"\n")
+        self.assertEqual(lines[0], b"line 0 Test1 done")
+        self.assertEqual(lines[2], b"line 2 errcode=3 done")
+        self.assertEqual(lines[999], b"line 999 Test1 done")
+
+    def test_decode_file_parallel(self):
+        self.write_log(1000)
+        with errcode_catalog.loadCatalog(self.catalog_path) as catalog:
+            decoder = errcode_decoder.ErrcodeLogDecoder(catalog, self.mod_name)
+            serial = io.BytesIO()
+            errcode_decoder.decodeFile(self.log_path, serial, decoder, chunk_size = 100)
+            parallel = io.BytesIO()
+            result = errcode_decoder.decodeFile(self.log_path, parallel, decoder, 2, 100,
+                                                catalog_path = self.catalog_path)
+        self.assertEqual(parallel.getvalue(), serial.getvalue())
+        self.assertEqual(result[1:], (667, 333))
+
+    def test_main(self):
+        self.write_log(10)
+        output_path = os.path.join(self.temp_dir.name, "decoded.log")
+        self.assertEqual(errcode_decoder.main([self.log_path, "--catalog", self.catalog_path,
+                                               "--module", self.mod_name, "--format", "{message}",
+                                               "-o", output_path]), 0)
+        with open(output_path, "rb") as output_file:
+            self.assertEqual(output_file.readline(), b"line 0 This is Test 1 done\n")
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+import asyncio
+import io
+import json
+import pathlib
+import sys
+import threading
+import time
+import unittest
+
+sys.path.append(pathlib.Path.cwd().parent.parent.__str__())
+from sharedlib import error_handling
+from sharedlib import errcode_events
+
+class ListSink:
+    def __init__(self, delay = 0):
+        self.events = []
+        self.batches = 0
+        self.flushes = 0
+        self.closed = False
+        self.delay = delay
+
+    def __call__(self, batch):
+        time.sleep(self.delay)
+        self.events.extend(batch)
+        self.batches = self.batches + 1
+
+    def flush(self):
+        self.flushes = self.flushes + 1
+
+    def close(self):
+        self.closed = True
+
+class ErrcodeEventPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mod_name = "test_mod"
+        self.sink = ListSink()
+
+    def test_push_and_close(self):
+        with errcode_events.ErrcodeEventPipeline(self.sink, batch_size = 10, flush_interval = 0.01) as pipeline:
+            for i in range(0, 100):
+                self.assertTrue(pipeline.push(self.mod_name, i, {"request": i}))
+        self.assertEqual([x[1] for x in self.sink.events], list(range(0, 100)))
+        self.assertEqual(self.sink.events[5][2], {"request": 5})
+        self.assertTrue(self.sink.closed)
+        self.assertGreaterEqual(self.sink.batches, 10)
+        self.assertEqual(pipeline.getStats(), {"pending": 0, "written": 100, "dropped": 0, "sink_errors": 0})
+        self.assertFalse(pipeline.push(self.mod_name, 1))
+
+    def test_background_batches(self):
+        pipeline = errcode_events.ErrcodeEventPipeline(self.sink, batch_size = 5, flush_interval = 10)
+        pipeline.start()
+        try:
+            for i in range(0, 5):
+                pipeline.push(self.mod_name, i)
+            #Reaching batch_size wakes the consumer long before flush_interval.
+            deadline = time.time() + 5
+            while len(self.sink.events) < 5 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(self.sink.events), 5)
+        finally:
+            pipeline.close()
+
+    def test_drop_oldest(self):
+        pipeline = errcode_events.ErrcodeEventPipeline(self.sink, capacity = 3)
+        for i in range(0, 5):
+            self.assertTrue(pipeline.push(self.mod_name, i))
+        pipeline.close()
+        self.assertEqual([x[1] for x in self.sink.events], [2, 3, 4])
+        self.assertEqual(pipeline.dropped, 2)
+
+    def test_drop_newest(self):
+        pipeline = errcode_events.ErrcodeEventPipeline(self.sink, capacity = 3, policy = errcode_events.DROP_NEWEST)
+        results = [pipeline.push(self.mod_name, i) for i in range(0, 5)]
+        pipeline.close()
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual([x[1] for x in self.sink.events], [0, 1, 2])
+        self.assertEqual(pipeline.dropped, 2)
+
+    def test_block(self):
+        self.sink.delay = 0.01
+        pipeline = errcode_events.ErrcodeEventPipeline(self.sink, capacity = 4, batch_size = 2,
+                                                       policy = errcode_events.BLOCK, flush_interval = 0.01)
+        pipeline.start()
+        for i in range(0, 50):
+            self.assertTrue(pipeline.push(self.mod_name, i))
+        pipeline.close()
+        self.assertEqual([x[1] for x in self.sink.events], list(range(0, 50)))
+        self.assertEqual(pipeline.dropped, 0)
+
+    def test_block_timeout(self):
+        pipeline = errcode_events.ErrcodeEventPipeline(self.sink, capacity = 2, policy = errcode_events.BLOCK,
+                                                       flush_interval = 10, block_timeout = 0.01)
+        pipeline.start()
+        #Hold the consumer off so nothing makes room.
+        with pipeline.drain_lock:
+            results = [pipeline.push(self.mod_name, i) for i in range(0, 3)]
+        pipeline.close()
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(pipeline.dropped, 1)
+
+    def test_sink_errors(self):
+        def failing(batch):
+            raise IOError("disk full")
+
+        pipeline = errcode_events.ErrcodeEventPipeline(failing)
+        pipeline.push(self.mod_name, 1)
+        pipeline.close()
+        self.assertEqual(pipeline.sink_errors, 1)
+        self.assertIsInstance(pipeline.last_sink_error, IOError)
+
+    def test_json_lines_sink(self):
+        output = io.StringIO()
+        pipeline = errcode_events.ErrcodeEventPipeline(errcode_events.JSONLinesEventSink(output = output))
+        pipeline.push(self.mod_name, 7, {"user": "x"})
+        pipeline.flush()
+        record = json.loads(output.getvalue().splitlines()[0])
+        self.assertEqual((record["mod_name"], record["errcode"], record["context"]), (self.mod_name, 7, {"user": "x"}))
+        pipeline.close()
+
+    def test_async(self):
+        async def run():
+            pipeline = errcode_events.ErrcodeEventPipeline(self.sink, flush_interval = 0.01)
+            pipeline.startAsync()
+            for i in range(0, 10):
+                pipeline.push(self.mod_name, i)
+            deadline = time.time() + 5
+            while len(self.sink.events) < 10 and time.time() < deadline:
+                await asyncio.sleep(0.01)
+            pipeline.close()
+
+        asyncio.run(run())
+        self.assertEqual(len(self.sink.events), 10)
+
+    def test_die_flushes(self):
+        pipeline = errcode_events.ErrcodeEventPipeline(self.sink, flush_interval = 10)
+        pipeline.start()
+        try:
+            pipeline.push(self.mod_name, 1)
+            with self.assertRaises(SystemExit):
+                error_handling.die(self.mod_name, 1)
+            self.assertEqual(len(self.sink.events), 1)
+            self.assertEqual(self.sink.flushes, 1)
+        finally:
+            pipeline.close()
+        self.assertFalse(pipeline.flush in error_handling.shutdown_hooks)
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
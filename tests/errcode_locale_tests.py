@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+sys.path.append(pathlib.Path.cwd().parent.parent.__str__())
+from sharedlib import error_handling
+from sharedlib import errcode_locale
+
+class ErrcodeLocaleCatalogsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errcode_handler = error_handling.ErrcodeHandler()
+        self.mod_name = "test_mod"
+        self.errcode_handler.registerErrcode(self.mod_name, "NotFound", "Not found", 1)
+        self.errcode_handler.registerErrcode(self.mod_name, "Denied", "Access denied", 2)
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        errcode_locale.writeLocaleCatalog(os.path.join(self.temp_dir.name, "pt.catalog"), [
+            (self.mod_name, "NotFound", "Não encontrado"),
+            (self.mod_name, "Denied", "Acesso negado"),
+        ])
+        errcode_locale.writeLocaleCatalog(os.path.join(self.temp_dir.name, "pt_BR.catalog"), [
+            (self.mod_name, "NotFound", "Não achado"),
+        ])
+        errcode_locale.writeLocaleCatalog(os.path.join(self.temp_dir.name, "fr.catalog"), [
+            (self.mod_name, "Denied", "Accès refusé"),
+        ])
+        self.catalogs = errcode_locale.ErrcodeLocaleCatalogs(self.temp_dir.name)
+        self.errcode_handler.setLocaleCatalogs(self.catalogs)
+
+    def tearDown(self):
+        self.catalogs.close()
+        self.temp_dir.cleanup()
+        self.errcode_handler = None
+
+    def test_lazy_loading(self):
+        self.assertEqual(self.catalogs.getLocales(), ["fr", "pt", "pt_BR"])
+        self.assertFalse(self.catalogs.isLoaded("fr"))
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, "Denied", locale = "fr"), "Accès refusé")
+        self.assertTrue(self.catalogs.isLoaded("fr"))
+        self.assertFalse(self.catalogs.isLoaded("pt"))
+
+    def test_fallback_chain(self):
+        self.assertEqual(self.catalogs.getFallbackChain("pt-BR.UTF-8"), ("pt_BR", "pt"))
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, 1, locale = "pt_BR"), "Não achado")
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, 2, locale = "pt_BR"), "Acesso negado")
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, 2, locale = "pt_PT"), "Acesso negado")
+
+        #No translation anywhere in the chain: the registered message.
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, 1, locale = "fr"), "Not found")
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, 1, locale = "de"), "Not found")
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, 1), "Not found")
+
+    def test_default_locale_and_fallbacks(self):
+        catalogs = errcode_locale.ErrcodeLocaleCatalogs(self.temp_dir.name, default_locale = "pt")
+        catalogs.setFallbacks("fr_CA", ["fr"])
+        self.assertEqual(catalogs.getFallbackChain("de"), ("pt",))
+        self.assertEqual(catalogs.getFallbackChain("fr_CA"), ("fr", "pt"))
+        self.errcode_handler.setLocaleCatalogs(catalogs)
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, 1, locale = "fr_CA"), "Não encontrado")
+        catalogs.close()
+
+    def test_cache(self):
+        self.errcode_handler.getMessage(self.mod_name, 1, locale = "fr")
+        self.assertEqual(self.catalogs.caches["fr"], {(self.mod_name, "NotFound"): None})
+
+    def test_bad_input(self):
+        self.assertRaises(ValueError, self.errcode_handler.getMessage, self.mod_name, "Missing", "fr")
+        self.assertRaises(KeyError, self.errcode_handler.getMessage, self.mod_name, 3, "fr")
+        self.catalogs.addLocale("xx", os.path.join(self.temp_dir.name, "missing.catalog"))
+        self.assertRaises(errcode_locale.ErrcodeLocaleError, self.errcode_handler.getMessage, self.mod_name, 1, "xx")
+
+    def test_truncated_catalog(self):
+        path = os.path.join(self.temp_dir.name, "pt.catalog")
+        with open(path, "rb") as catalog_file:
+            data = catalog_file.read()
+        with open(path, "wb") as catalog_file:
+            catalog_file.write(data[:len(data) // 2])
+        self.assertRaises(errcode_locale.ErrcodeLocaleError, self.errcode_handler.getMessage, self.mod_name, 1, "pt")
+
+    def test_frozen(self):
+        self.errcode_handler.freeze(compact = True)
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, "Denied", locale = "pt"), "Acesso negado")
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
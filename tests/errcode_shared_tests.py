@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import multiprocessing
+import os
+import pathlib
+import sys
+import unittest
+
+sys.path.append(pathlib.Path.cwd().parent.parent.__str__())
+from sharedlib import conflict_resolution
+from sharedlib import error_handling
+from sharedlib import errcode_shared
+
+#Runs in a spawned worker, which registers nothing itself.
+def lookupInWorker(names):
+    if not errcode_shared.installFromEnvironment():
+        return None
+
+    handler = error_handling.ErrcodeHandler.instance
+    try:
+        return [handler.getMessage("test_mod", x) for x in names]
+    finally:
+        handler.close()
+
+class SharedErrcodeRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errcode_handler = error_handling.ErrcodeHandler()
+        self.mod_name = "test_mod"
+        self.errcode_handler.registerErrcode(self.mod_name, "Test1", "This is Test 1", 1)
+        self.errcode_handler.registerErrcode(self.mod_name, "Test2", "This is Test 2", 2)
+        self.errcode_handler.registerErrcode("other_mod", "Other3", "Only here", 3)
+        self.published = errcode_shared.publishRegistry(self.errcode_handler)
+
+    def tearDown(self):
+        self.published.close()
+        self.errcode_handler = None
+
+    def test_attach(self):
+        self.assertEqual(os.environ[errcode_shared.ENVIRONMENT_VARIABLE], self.published.name)
+        handler = errcode_shared.attachRegistry(self.published.name)
+        self.assertTrue(handler.frozen)
+        self.assertEqual(handler.getMessage(self.mod_name, "Test2"), "This is Test 2")
+        self.assertEqual(handler.getMessage(self.mod_name, 1), "This is Test 1")
+        self.assertEqual(handler.getMessages(self.mod_name, [2, 1]), ["This is Test 2", "This is Test 1"])
+        mod_name, errcode = handler.findErrcode(3)
+        self.assertEqual((mod_name, errcode.name), ("other_mod", "Other3"))
+        self.assertRaises(ValueError, handler.findErrcode, 4)
+        self.assertRaises(conflict_resolution.ImmutableObjectWriteError, handler.registerErrcode, self.mod_name, "Test3", "No", 3)
+        handler.close()
+        handler.close()
+
+    def test_read_only(self):
+        handler = errcode_shared.attachRegistry(self.published.name)
+        with self.assertRaises(TypeError):
+            handler.view[0] = 0
+        handler.close()
+
+    def test_spawned_workers(self):
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(2) as pool:
+            results = pool.map(lookupInWorker, [["Test1"], ["Test2", "Test1"]])
+        self.assertEqual(results, [["This is Test 1"], ["This is Test 2", "This is Test 1"]])
+
+        #Workers exiting must not remove the segment.
+        handler = errcode_shared.attachRegistry(self.published.name)
+        self.assertEqual(handler.getMessage(self.mod_name, 2), "This is Test 2")
+        handler.close()
+
+    def test_close(self):
+        name = self.published.name
+        self.published.close()
+        self.assertNotIn(errcode_shared.ENVIRONMENT_VARIABLE, os.environ)
+        self.assertFalse(errcode_shared.installFromEnvironment())
+        self.assertRaises(errcode_shared.ErrcodeSharedError, errcode_shared.attachRegistry, name)
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import pathlib
+import sys
+import unittest
+
+sys.path.append(pathlib.Path.cwd().parent.parent.__str__())
+from sharedlib import errcode_suppression
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class ErrcodeSuppressorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mod_name = "test_mod"
+        self.clock = FakeClock()
+        self.summaries = []
+
+    def make(self, **kwargs):
+        return errcode_suppression.ErrcodeSuppressor(self.summaries.append, clock = self.clock, **kwargs)
+
+    def test_window(self):
+        suppressor = self.make(window = 10, burst = 2)
+        self.assertEqual([suppressor.allow(self.mod_name, 1) for i in range(0, 5)], [True, True, False, False, False])
+        self.assertTrue(suppressor.allow(self.mod_name, 2))
+        self.assertEqual(suppressor.getSuppressed(self.mod_name, 1), 3)
+
+        self.clock.now = 110.0
+        self.assertTrue(suppressor.allow(self.mod_name, 1))
+        self.assertEqual(self.summaries, [{
+            "mod_name": self.mod_name, "errcode": 1, "suppressed": 3,
+            "window_start": 100.0, "window_end": 110.0,
+        }])
+        self.assertEqual(suppressor.getSuppressed(self.mod_name, 1), 0)
+
+    def test_token_bucket(self):
+        suppressor = self.make(policy = errcode_suppression.TOKEN, rate = 2, burst = 3, window = 60)
+        self.assertEqual([suppressor.allow(self.mod_name, 1) for i in range(0, 5)], [True, True, True, False, False])
+
+        #Two tokens per second: one more after half a second.
+        self.clock.now = 100.5
+        self.assertEqual([suppressor.allow(self.mod_name, 1) for i in range(0, 2)], [True, False])
+
+        #A long pause refills the bucket, but only up to burst.
+        self.clock.now = 130.0
+        self.assertEqual([suppressor.allow(self.mod_name, 1) for i in range(0, 4)], [True, True, True, False])
+        self.assertEqual(self.summaries, [])
+
+        self.clock.now = 160.0
+        self.assertTrue(suppressor.allow(self.mod_name, 1))
+        self.assertEqual(self.summaries[0]["suppressed"], 4)
+
+    def test_collect(self):
+        suppressor = self.make(window = 10)
+        suppressor.allow(self.mod_name, 1)
+        suppressor.allow(self.mod_name, 1)
+        suppressor.allow(self.mod_name, 2)
+
+        suppressor.collect()
+        self.assertEqual(self.summaries, [])
+
+        suppressor.collect(force = True)
+        self.assertEqual([(x["errcode"], x["suppressed"]) for x in self.summaries], [(1, 1)])
+
+        self.clock.now = 111.0
+        suppressor.collect()
+        self.assertEqual(len(self.summaries), 1)
+        self.assertEqual(suppressor.states, {})
+
+    def test_wrap(self):
+        reports = []
+        report = self.make(window = 10).wrap(lambda mod_name, errcode, message: reports.append(message))
+        for i in range(0, 3):
+            report(self.mod_name, 1, "failed {0}".format(i))
+        self.assertEqual(reports, ["failed 0"])
+
+    def test_bad_arguments(self):
+        self.assertRaises(ValueError, self.make, policy = "never")
+        self.assertRaises(ValueError, self.make, window = 0)
+        self.assertRaises(ValueError, self.make, burst = 0)
+        self.assertRaises(ValueError, self.make, policy = errcode_suppression.TOKEN)
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import gc
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.append(pathlib.Path.cwd().parent.parent.__str__())
+from sharedlib import error_handling
+from sharedlib import errcode_telemetry
+
+class ErrcodeTelemetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errcode_handler = error_handling.ErrcodeHandler()
+        self.mod_name = "test_mod"
+        self.errcode_handler.registerErrcode(self.mod_name, "Test1", "This is Test 1", 1)
+        self.errcode_handler.registerErrcode(self.mod_name, "Test2", "This is \"Test\" 2", 2)
+        self.telemetry = errcode_telemetry.ErrcodeTelemetry(self.errcode_handler)
+
+    def tearDown(self):
+        self.telemetry.disable()
+        self.errcode_handler = None
+
+    def counts(self):
+        return {(x["module"], x["errcode"]): (x["lookups"], x["raises"]) for x in self.telemetry.snapshot()}
+
+    def test_disabled_by_default(self):
+        self.errcode_handler.getMessage(self.mod_name, 1)
+        self.assertFalse(self.telemetry.isEnabled())
+        self.assertEqual(self.telemetry.snapshot(), [])
+        self.assertFalse("getMessage" in vars(self.errcode_handler))
+
+    def test_counts(self):
+        self.telemetry.enable()
+        self.errcode_handler.getMessage(self.mod_name, 1)
+        self.errcode_handler.getMessage(self.mod_name, "Test1")
+        self.errcode_handler.getMessages(self.mod_name, [1, 2, 2])
+        self.assertRaises(error_handling.ErrcodeException, self.errcode_handler.raiseErrcode, self.mod_name, 2)
+        self.assertRaises(KeyError, self.errcode_handler.getMessage, self.mod_name, 3)
+        self.assertEqual(self.counts(), {
+            (self.mod_name, 1): (3, 0),
+            (self.mod_name, 2): (2, 1),
+            (self.mod_name, 3): (1, 0),
+        })
+
+        self.telemetry.disable()
+        self.errcode_handler.getMessage(self.mod_name, 1)
+        self.assertEqual(self.counts()[(self.mod_name, 1)], (3, 0))
+        self.assertFalse("getMessage" in vars(self.errcode_handler))
+
+        self.telemetry.reset()
+        self.assertEqual(self.telemetry.snapshot(), [])
+
+    def test_threads(self):
+        self.telemetry.enable()
+
+        def lookup():
+            for i in range(0, 1000):
+                self.errcode_handler.getMessage(self.mod_name, 1)
+
+        threads = [threading.Thread(target = lookup) for i in range(0, 4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.counts()[(self.mod_name, 1)], (4000, 0))
+
+    def test_exited_threads_retired(self):
+        self.telemetry.enable()
+
+        def lookup():
+            for i in range(0, 10):
+                self.errcode_handler.getMessage(self.mod_name, 1)
+
+        for i in range(0, 20):
+            thread = threading.Thread(target = lookup)
+            thread.start()
+            thread.join()
+        thread = None
+        gc.collect()
+
+        #Only the shard of this thread is left.
+        self.assertLessEqual(len(self.telemetry.lookups.shards), 1)
+        self.assertEqual(self.counts()[(self.mod_name, 1)], (200, 0))
+        self.telemetry.reset()
+        self.assertEqual(self.telemetry.snapshot(), [])
+
+    def test_export(self):
+        self.telemetry.enable()
+        self.errcode_handler.getMessage(self.mod_name, 2)
+        self.assertEqual(json.loads(self.telemetry.toJSON())["errcodes"],
+                         [{"module": self.mod_name, "errcode": 2, "name": "Test2", "lookups": 1, "raises": 0}])
+
+        text = self.telemetry.toPrometheus()
+        self.assertTrue("# TYPE sharedlib_errcode_lookups_total counter" in text)
+        self.assertTrue("sharedlib_errcode_lookups_total{module=\"test_mod\",errcode=\"2\",name=\"Test2\"} 1" in text)
+        self.assertFalse("sharedlib_errcode_raises_total{" in text)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "errcodes.prom")
+            self.telemetry.export(path, "prometheus")
+            with open(path) as export_file:
+                self.assertEqual(export_file.read(), text)
+            self.assertRaises(ValueError, self.telemetry.export, path, "xml")
+
+    def test_double_instrumentation(self):
+        self.telemetry.enable()
+        other = errcode_telemetry.ErrcodeTelemetry(self.errcode_handler)
+        self.assertRaises(errcode_telemetry.ErrcodeTelemetryError, other.enable)
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
@@ -1,8 +1,19 @@
 #!/usr/bin/env python3
+import asyncio
+import os
 import pathlib
+import pickle
+import subprocess
 import sys
+import threading
+import time
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 sys.path.append(pathlib.Path.cwd().parent.parent.__str__())
 from sharedlib import error_handling
 
@@ -147,6 +158,569 @@ class ErrcodeHandlerTest(unittest.TestCase):
         self.assertEqual(message, retval)
 
 
+class ErrcodeAllocatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mod_name = "test_mod"
+
+    def test_hash_allocator_stable(self):
+        first = error_handling.ErrcodeHandler()
+        second = error_handling.ErrcodeHandler()
+        number = first.registerErrcode(self.mod_name, "Test1", "This is Test 1")
+        second.registerErrcode(self.mod_name, "Test2", "This is Test 2")
+        self.assertEqual(number, second.registerErrcode(self.mod_name, "Test1", "This is Test 1"))
+        self.assertEqual(number, error_handling.HashErrcodeAllocator.hashName(self.mod_name, "Test1"))
+
+    def test_hash_allocator_collision(self):
+        allocator = error_handling.HashErrcodeAllocator()
+        module = error_handling.ErrcodeModule()
+        taken = error_handling.HashErrcodeAllocator.hashName(self.mod_name, "Test1")
+        module.errcodes[taken] = error_handling.Errcode("Other", "Other", taken)
+
+        number = allocator.allocate(self.mod_name, "Test1", module)
+        self.assertNotEqual(number, taken)
+        self.assertTrue(number <= error_handling.ErrcodeHandler.RNG_MAX_INT_VALUE)
+
+    def test_sequential_allocator(self):
+        handler = error_handling.ErrcodeHandler(error_handling.SequentialErrcodeAllocator())
+        handler.registerErrcode(self.mod_name, "Test2", "This is Test 2", 2)
+
+        self.assertEqual(handler.registerErrcode(self.mod_name, "Test1", "This is Test 1"), 1)
+        self.assertEqual(handler.registerErrcode(self.mod_name, "Test3", "This is Test 3"), 3)
+        self.assertEqual(handler.registerErrcode("other_mod", "Test1", "This is Test 1"), 1)
+
+    def test_sequential_allocator_rollback(self):
+        handler = error_handling.ErrcodeHandler(error_handling.SequentialErrcodeAllocator(), unique_numbers = True)
+        handler.registerErrcode("other_mod", "Taken", "Taken", 2)
+
+        #Test2 would get 2, which other_mod owns, so the batch is rolled back.
+        self.assertRaises(error_handling.ErrcodeHandleError, handler.registerErrcodes, [
+            (self.mod_name, "Test1", "This is Test 1"),
+            (self.mod_name, "Test2", "This is Test 2")
+        ])
+        self.assertEqual(handler.registerErrcode(self.mod_name, "Test1", "This is Test 1"), 1)
+        self.assertRaises(error_handling.ErrcodeHandleError, handler.registerErrcode, self.mod_name, "Test2", "This is Test 2")
+        self.assertEqual(handler.allocator.cursors[self.mod_name], 2)
+
+    def test_random_allocator(self):
+        handler = error_handling.ErrcodeHandler(error_handling.RandomErrcodeAllocator())
+        number = handler.registerErrcode(self.mod_name, "Test1", "This is Test 1")
+        self.assertEqual(handler.getMessage(self.mod_name, number), "This is Test 1")
+
+
+class ErrcodeBulkRegistrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errcode_handler = error_handling.ErrcodeHandler()
+        self.mod_name = "test_mod"
+
+    def tearDown(self):
+        self.errcode_handler = None
+
+    def test_register_errcodes_success(self):
+        numbers = self.errcode_handler.registerErrcodes([
+            (self.mod_name, "Test1", "This is Test 1", 1),
+            (self.mod_name, "Test2", "This is Test 2"),
+            ("other_mod", "Test1", "This is other Test 1", 1)
+        ])
+
+        self.assertEqual(len(numbers), 3)
+        self.assertEqual(numbers[0], 1)
+        self.assertEqual(numbers[2], 1)
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, numbers[1]), "This is Test 2")
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, "Test2"), "This is Test 2")
+        self.assertEqual(self.errcode_handler.getMessage("other_mod", 1), "This is other Test 1")
+
+    def test_register_errcodes_duplicate_name_in_batch(self):
+        self.assertRaises(ValueError,
+                          self.errcode_handler.registerErrcodes,
+                          [
+                              (self.mod_name, "Test1", "This is Test 1", 1),
+                              (self.mod_name, "Test1", "This is Test 1 again", 2)
+                          ])
+        self.assertEqual(len(self.errcode_handler.modules), 0)
+
+    def test_register_errcodes_duplicate_number_in_batch(self):
+        self.assertRaises(ValueError,
+                          self.errcode_handler.registerErrcodes,
+                          [
+                              (self.mod_name, "Test1", "This is Test 1", 1),
+                              (self.mod_name, "Test2", "This is Test 2", 1)
+                          ])
+        self.assertEqual(len(self.errcode_handler.modules), 0)
+
+    def test_register_errcodes_all_or_nothing(self):
+        self.errcode_handler.registerErrcode(self.mod_name, "Test1", "This is Test 1", 1)
+        self.assertRaises(ValueError,
+                          self.errcode_handler.registerErrcodes,
+                          [
+                              ("other_mod", "Test1", "This is other Test 1", 1),
+                              (self.mod_name, "Test2", "This is Test 2", 2),
+                              (self.mod_name, "Test1", "This is Test 1 again", 3)
+                          ])
+
+        self.assertTrue(self.errcode_handler.modules.get("other_mod") is None)
+        module = self.errcode_handler.modules.get(self.mod_name)
+        self.assertEqual(list(module.errcodes_key_name.keys()), ["Test1"])
+
+    def test_register_errcodes_rollback_on_allocation_failure(self):
+        class FailingAllocator(error_handling.ErrcodeAllocator):
+            def allocate(self, mod_name = None, name = None, module = None):
+                raise error_handling.ErrcodeHandleError("No numbers left.")
+
+        handler = error_handling.ErrcodeHandler(FailingAllocator())
+        self.assertRaises(error_handling.ErrcodeHandleError,
+                          handler.registerErrcodes,
+                          [
+                              (self.mod_name, "Test1", "This is Test 1", 1),
+                              (self.mod_name, "Test2", "This is Test 2")
+                          ])
+        self.assertEqual(len(handler.modules), 0)
+
+    def test_register_errcodes_existing_module_generated(self):
+        handler = error_handling.ErrcodeHandler(error_handling.SequentialErrcodeAllocator())
+        handler.registerErrcode(self.mod_name, "Test1", "This is Test 1", 1)
+        numbers = handler.registerErrcodes([
+            ("other_mod", "Test1", "This is other Test 1"),
+            (self.mod_name, "Test2", "This is Test 2"),
+            (self.mod_name, "Test3", "This is Test 3", 3),
+            (self.mod_name, "Test4", "This is Test 4")
+        ])
+
+        self.assertEqual(numbers, [1, 2, 3, 4])
+        self.assertEqual(handler.getMessage(self.mod_name, "Test4"), "This is Test 4")
+        self.assertEqual(handler.getMessage(self.mod_name, 2), "This is Test 2")
+        self.assertEqual(handler.getMessage("other_mod", "Test1"), "This is other Test 1")
+
+    def test_register_errcodes_none_field(self):
+        self.assertRaises(ValueError,
+                          self.errcode_handler.registerErrcodes,
+                          [(self.mod_name, None, "This is Test 1", 1)])
+        self.assertRaises(ValueError, self.errcode_handler.registerErrcodes, None)
+
+
+class ConcurrentErrcodeHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errcode_handler = error_handling.ConcurrentErrcodeHandler()
+        self.mod_name = "test_mod"
+
+    def tearDown(self):
+        self.errcode_handler = None
+
+    def test_register_and_get(self):
+        number = self.errcode_handler.registerErrcode(self.mod_name, "Test1", "This is Test 1")
+        self.errcode_handler.registerErrcodes([(self.mod_name, "Test2", "This is Test 2", 2)])
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, number), "This is Test 1")
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, "Test2"), "This is Test 2")
+
+    def test_snapshot_is_not_mutated(self):
+        self.errcode_handler.registerErrcode(self.mod_name, "Test1", "This is Test 1", 1)
+        snapshot = self.errcode_handler.getSnapshot()
+        self.errcode_handler.registerErrcode(self.mod_name, "Test2", "This is Test 2", 2)
+
+        self.assertFalse("Test2" in snapshot[self.mod_name].errcodes_key_name)
+        self.assertTrue("Test2" in self.errcode_handler.getSnapshot()[self.mod_name].errcodes_key_name)
+
+    def test_failed_write_is_not_published(self):
+        self.errcode_handler.registerErrcode(self.mod_name, "Test1", "This is Test 1", 1)
+        snapshot = self.errcode_handler.getSnapshot()
+        self.assertRaises(ValueError,
+                          self.errcode_handler.registerErrcode,
+                          self.mod_name,
+                          "Test1",
+                          "This is Test 1 again")
+        self.assertIs(snapshot, self.errcode_handler.getSnapshot())
+
+    def test_concurrent_readers(self):
+        self.errcode_handler.registerErrcode(self.mod_name, "Base", "Base message", 0)
+        stop = threading.Event()
+        errors = []
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    self.errcode_handler.getMessage(self.mod_name, "Base")
+                    self.errcode_handler.getMessage(self.mod_name, 0)
+            except Exception as err:
+                errors.append(err)
+
+        readers = [threading.Thread(target = reader) for i in range(0, 4)]
+        for thread in readers:
+            thread.start()
+        try:
+            for i in range(1, 500):
+                self.errcode_handler.registerErrcode(self.mod_name, "Test{0}".format(i), "Message {0}".format(i), i)
+                self.assertEqual(self.errcode_handler.getMessage(self.mod_name, i), "Message {0}".format(i))
+        finally:
+            stop.set()
+            for thread in readers:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.errcode_handler.getSnapshot()[self.mod_name].errcodes), 500)
+
+
+class ErrcodeHandlerFreezeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errcode_handler = error_handling.ErrcodeHandler()
+        self.mod_name = "test_mod"
+        self.errcode_handler.registerErrcodes([
+            (self.mod_name, "Test3", "This is Test 3", 3),
+            (self.mod_name, "Test1", "This is Test 1", 1),
+            (self.mod_name, "Test2", "This is Test 2", 2),
+            ("other_mod", "Negative", "Negative number", -1)
+        ])
+        self.generated = self.errcode_handler.registerErrcode(self.mod_name, "Generated", "This is generated")
+        self.errcode_handler.freeze()
+
+    def tearDown(self):
+        self.errcode_handler = None
+
+    def test_frozen_lookups(self):
+        self.assertTrue(self.errcode_handler.isFrozen())
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, 2), "This is Test 2")
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, "Test3"), "This is Test 3")
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, self.generated), "This is generated")
+        self.assertEqual(self.errcode_handler.getMessage("other_mod", -1), "Negative number")
+
+    def test_frozen_unknown(self):
+        self.assertRaises(ValueError, self.errcode_handler.getMessage, self.mod_name, "Test4")
+        self.assertRaises(KeyError, self.errcode_handler.getMessage, self.mod_name, 4)
+
+    def test_frozen_views(self):
+        module = self.errcode_handler.modules[self.mod_name]
+        self.assertEqual(module.errcodes_key_name["Test1"], 1)
+        self.assertEqual(module.errcodes[1].name, "Test1")
+        self.assertEqual(len(module.errcodes), 4)
+        self.assertFalse("Test1" in module.errcodes)
+        self.assertEqual(sorted(module.errcodes_key_name.keys()), ["Generated", "Test1", "Test2", "Test3"])
+
+    def test_frozen_rejects_registration(self):
+        self.assertRaises(error_handling.ImmutableObjectWriteError,
+                          self.errcode_handler.registerErrcode,
+                          self.mod_name,
+                          "Test4",
+                          "This is Test 4",
+                          4)
+        self.assertRaises(error_handling.ImmutableObjectWriteError,
+                          self.errcode_handler.registerErrcodes,
+                          [(self.mod_name, "Test4", "This is Test 4", 4)])
+
+    def test_compact_freeze(self):
+        handler = error_handling.ErrcodeHandler()
+        handler.registerErrcodes([
+            (self.mod_name, "Test1", "Shared message", 1),
+            (self.mod_name, "Test2", "Shared message", 2),
+            ("other_mod", "Test1", "Other message", 1)
+        ])
+        handler.freeze(compact = True)
+
+        self.assertEqual(handler.getMessage(self.mod_name, 2), "Shared message")
+        self.assertEqual(handler.getMessage("other_mod", "Test1"), "Other message")
+        self.assertRaises(KeyError, handler.getMessage, self.mod_name, 3)
+        self.assertRaises(ValueError, handler.getMessage, self.mod_name, "Test3")
+        self.assertEqual(handler.modules[self.mod_name].errcodes_key_name["Test2"], 2)
+        self.assertRaises(error_handling.ImmutableObjectWriteError,
+                          handler.registerErrcode,
+                          self.mod_name,
+                          "Test3",
+                          "This is Test 3")
+
+    def test_concurrent_freeze(self):
+        handler = error_handling.ConcurrentErrcodeHandler()
+        handler.registerErrcode(self.mod_name, "Test1", "This is Test 1", 1)
+        handler.freeze()
+        self.assertEqual(handler.getMessage(self.mod_name, 1), "This is Test 1")
+        self.assertRaises(error_handling.ImmutableObjectWriteError,
+                          handler.registerErrcode,
+                          self.mod_name,
+                          "Test2",
+                          "This is Test 2")
+
+
+class ErrcodeReverseIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errcode_handler = error_handling.ErrcodeHandler()
+        self.mod_name = "test_mod"
+
+    def tearDown(self):
+        self.errcode_handler = None
+
+    def test_find_errcode(self):
+        number = self.errcode_handler.registerErrcode(self.mod_name, "Test1", "This is Test 1")
+        self.errcode_handler.registerErrcodes([
+            ("other_mod", "Test2", "This is Test 2", 2),
+            ("other_mod", "Test3", "This is Test 3")
+        ])
+
+        mod_name, errcode = self.errcode_handler.findErrcode(number)
+        self.assertEqual(mod_name, self.mod_name)
+        self.assertEqual(errcode.message, "This is Test 1")
+
+        mod_name, errcode = self.errcode_handler.findErrcode(2)
+        self.assertEqual(mod_name, "other_mod")
+        self.assertEqual(errcode.name, "Test2")
+
+        self.errcode_handler.freeze()
+        self.assertEqual(self.errcode_handler.findErrcode(2)[1].name, "Test2")
+
+    def test_find_errcode_unknown(self):
+        self.assertRaises(ValueError, self.errcode_handler.findErrcode, 1)
+
+    def test_find_errcode_collision(self):
+        self.errcode_handler.registerErrcode(self.mod_name, "Test1", "This is Test 1", 1)
+        self.errcode_handler.registerErrcodes([("other_mod", "Test1", "This is other Test 1", 1)])
+        self.assertRaises(error_handling.ErrcodeHandleError, self.errcode_handler.findErrcode, 1)
+        self.assertEqual(self.errcode_handler.errcode_collisions[1], {self.mod_name, "other_mod"})
+
+    def test_unique_numbers(self):
+        handler = error_handling.ErrcodeHandler(unique_numbers = True)
+        handler.registerErrcode(self.mod_name, "Test1", "This is Test 1", 1)
+        self.assertRaises(error_handling.ErrcodeHandleError,
+                          handler.registerErrcode,
+                          "other_mod",
+                          "Test1",
+                          "This is other Test 1",
+                          1)
+        self.assertTrue(handler.modules.get("other_mod") is None)
+        self.assertRaises(error_handling.ErrcodeHandleError,
+                          handler.registerErrcodes,
+                          [("other_mod", "Test1", "This is other Test 1", 1)])
+        self.assertRaises(error_handling.ErrcodeHandleError,
+                          handler.registerErrcodes,
+                          [("mod_a", "Test1", "A", 5), ("mod_b", "Test1", "B", 5)])
+        self.assertEqual(handler.findErrcode(1)[0], self.mod_name)
+        self.assertTrue(handler.modules.get("mod_a") is None)
+
+    def test_module_packed_allocator(self):
+        allocator = error_handling.ModulePackedErrcodeAllocator()
+        handler = error_handling.ErrcodeHandler(allocator, unique_numbers = True)
+        first = handler.registerErrcode(self.mod_name, "Test1", "This is Test 1")
+        second = handler.registerErrcode("other_mod", "Test1", "This is other Test 1")
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(allocator.splitErrcode(first)[0], allocator.getModuleId(self.mod_name))
+        self.assertEqual(allocator.splitErrcode(second)[0], allocator.getModuleId("other_mod"))
+        self.assertEqual(handler.findErrcode(second)[0], "other_mod")
+
+    def test_concurrent_find_errcode(self):
+        handler = error_handling.ConcurrentErrcodeHandler()
+        number = handler.registerErrcode(self.mod_name, "Test1", "This is Test 1")
+        self.assertEqual(handler.findErrcode(number)[0], self.mod_name)
+
+
+class ErrcodeBatchLookupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errcode_handler = error_handling.ErrcodeHandler()
+        self.mod_name = "test_mod"
+        self.errcode_handler.registerErrcodes([
+            (self.mod_name, "Test{0}".format(i), "This is Test {0}".format(i), i) for i in range(1, 6)
+        ])
+
+    def tearDown(self):
+        self.errcode_handler = None
+
+    def check_all_storage(self, check):
+        check()
+        self.errcode_handler.freeze()
+        check()
+        self.errcode_handler = error_handling.ErrcodeHandler()
+        self.setUp()
+        self.errcode_handler.freeze(compact = True)
+        check()
+
+    def test_get_messages(self):
+        def check():
+            self.assertEqual(self.errcode_handler.getMessages(self.mod_name, [3, 1, 3, 5]),
+                             ["This is Test 3", "This is Test 1", "This is Test 3", "This is Test 5"])
+            self.assertEqual(self.errcode_handler.getMessages(self.mod_name, []), [])
+        self.check_all_storage(check)
+
+    def test_get_message_indices(self):
+        def check():
+            messages, indices = self.errcode_handler.getMessageIndices(self.mod_name, [2, 7, 2])
+            self.assertEqual(indices[1], -1)
+            self.assertEqual(indices[0], indices[2])
+            self.assertEqual(messages[indices[0]], "This is Test 2")
+        self.check_all_storage(check)
+
+    def test_unknown_reported_in_bulk(self):
+        def check():
+            try:
+                self.errcode_handler.getMessages(self.mod_name, [1, 8, 2, 9, 8])
+                self.fail("UnknownErrcodesError not raised.")
+            except error_handling.UnknownErrcodesError as err:
+                self.assertEqual(err.mod_name, self.mod_name)
+                self.assertEqual(err.positions, [1, 3, 4])
+                self.assertEqual(err.errcodes, [8, 9, 8])
+
+            self.assertEqual(self.errcode_handler.getMessages(self.mod_name, [1, 8, "Test1"], "?", False),
+                             ["This is Test 1", "?", "?"])
+        self.check_all_storage(check)
+
+    def test_bad_input(self):
+        self.assertRaises(ValueError, self.errcode_handler.getMessages, None, [1])
+        self.assertRaises(ValueError, self.errcode_handler.getMessages, self.mod_name, None)
+        self.assertRaises(error_handling.ErrcodeHandleError, self.errcode_handler.getMessages, "no_mod", [1])
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed.")
+    def test_numpy_input(self):
+        def check():
+            for dtype in (numpy.uint64, numpy.int64, numpy.int32):
+                codes = numpy.array([5, 0, 1, 5, 6], dtype = dtype)
+                messages, indices = self.errcode_handler.getMessageIndices(self.mod_name, codes)
+                self.assertIsInstance(indices, numpy.ndarray)
+                self.assertEqual(list(indices < 0), [False, True, False, False, True])
+                self.assertEqual(messages[indices[0]], "This is Test 5")
+                self.assertEqual(self.errcode_handler.getMessages(self.mod_name, codes[[0, 2]]),
+                                 ["This is Test 5", "This is Test 1"])
+                with self.assertRaises(error_handling.UnknownErrcodesError) as context:
+                    self.errcode_handler.getMessages(self.mod_name, codes)
+                self.assertEqual(context.exception.positions, [1, 4])
+                self.assertEqual(context.exception.errcodes, [0, 6])
+
+            #Negative codes must not wrap around to large unsigned ones.
+            codes = numpy.array([-1, 1], dtype = numpy.int64)
+            self.assertEqual(list(self.errcode_handler.getMessageIndices(self.mod_name, codes)[1] < 0), [True, False])
+        self.check_all_storage(check)
+
+class ErrcodeExceptionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errcode_handler = error_handling.ErrcodeHandler()
+        self.mod_name = "test_mod"
+        self.errcode_handler.registerErrcode(self.mod_name, "InvalidField", "Field {0} is invalid", 1)
+        self.errcode_handler.registerErrcode(self.mod_name, "not an identifier", "Plain {message}", 2)
+
+    def tearDown(self):
+        self.errcode_handler = None
+
+    def test_exception_class(self):
+        exception_class = self.errcode_handler.getErrcodeException(self.mod_name, "InvalidField")
+        self.assertTrue(issubclass(exception_class, error_handling.ErrcodeException))
+        self.assertEqual(exception_class.__name__, "InvalidField")
+        self.assertEqual((exception_class.mod_name, exception_class.number, exception_class.name),
+                         (self.mod_name, 1, "InvalidField"))
+        self.assertIs(self.errcode_handler.getErrcodeException(self.mod_name, 1), exception_class)
+        self.assertEqual(self.errcode_handler.getErrcodeException(self.mod_name, 2).__name__, "Errcode2")
+
+    def test_raise_errcode(self):
+        exception_class = self.errcode_handler.getErrcodeException(self.mod_name, 1)
+        with self.assertRaises(exception_class) as context:
+            self.errcode_handler.raiseErrcode(self.mod_name, "InvalidField", "name")
+        self.assertEqual(str(context.exception), "Field name is invalid")
+        self.assertEqual(context.exception.number, 1)
+
+        with self.assertRaises(error_handling.ErrcodeException) as context:
+            self.errcode_handler.raiseErrcode(self.mod_name, 2)
+        self.assertEqual(str(context.exception), "Plain {message}")
+
+        #A message that cannot take the arguments is still readable.
+        with self.assertRaises(error_handling.ErrcodeException) as context:
+            self.errcode_handler.raiseErrcode(self.mod_name, 2, "x")
+        self.assertTrue(str(context.exception).startswith("Plain {message}"))
+
+    def test_lightweight(self):
+        exception_class = self.errcode_handler.getErrcodeException(self.mod_name, 1, lightweight = True)
+        self.assertTrue(issubclass(exception_class, error_handling.LightweightErrcodeException))
+        self.assertIsNot(exception_class, self.errcode_handler.getErrcodeException(self.mod_name, 1))
+        with self.assertRaises(error_handling.ErrcodeException) as context:
+            raise exception_class("name")
+        self.assertEqual(str(context.exception), "Field name is invalid")
+
+    def test_unknown_errcode(self):
+        self.assertRaises(ValueError, self.errcode_handler.getErrcodeException, self.mod_name, "Missing")
+        self.assertRaises(KeyError, self.errcode_handler.getErrcodeException, self.mod_name, 3)
+        self.assertRaises(error_handling.ErrcodeHandleError,
+                          self.errcode_handler.getErrcodeException, "no_mod", 1)
+
+    def test_pickle(self):
+        handler = error_handling.ErrcodeHandler.instance
+        if "pickle_mod" not in handler.modules:
+            handler.registerErrcode("pickle_mod", "Failed", "{0} failed: {reason}", 5)
+
+        for lightweight in (False, True):
+            exception_class = handler.getErrcodeException("pickle_mod", 5, lightweight)
+            context = {} if lightweight else {"reason": "timeout"}
+            exception = exception_class("job", **context)
+            copy = pickle.loads(pickle.dumps(exception))
+            self.assertIs(type(copy), exception_class)
+            self.assertEqual((copy.args, copy.context), (("job",), exception.context))
+            self.assertEqual(str(copy), str(exception))
+
+    def test_frozen(self):
+        exception_class = self.errcode_handler.getErrcodeException(self.mod_name, 1)
+        self.errcode_handler.freeze()
+        self.assertIs(self.errcode_handler.getErrcodeException(self.mod_name, "InvalidField"), exception_class)
+        self.assertEqual(self.errcode_handler.getErrcodeException(self.mod_name, 2).message, "Plain {message}")
+
+class MessageTemplateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errcode_handler = error_handling.ErrcodeHandler()
+        self.mod_name = "test_mod"
+        self.errcode_handler.registerErrcode(self.mod_name, "OpenFailed", "Cannot open {path}: {reason!r} (100%)", 1, template = True)
+        self.errcode_handler.registerErrcode(self.mod_name, "Positional", "{} of {}", 2, template = True)
+        self.errcode_handler.registerErrcode(self.mod_name, "Formatted", "{0}: {count:>4}", 3, template = True)
+        self.errcode_handler.registerErrcode(self.mod_name, "Plain", "Plain {message}", 4)
+
+    def tearDown(self):
+        self.errcode_handler = None
+
+    def test_compiled_modes(self):
+        self.assertEqual(self.errcode_handler.getErrcode(self.mod_name, 1).template.mode, "kwargs")
+        self.assertEqual(self.errcode_handler.getErrcode(self.mod_name, 2).template.mode, "args")
+        self.assertEqual(self.errcode_handler.getErrcode(self.mod_name, 3).template.mode, "format")
+        self.assertIsNone(self.errcode_handler.getErrcode(self.mod_name, 4).template)
+
+    def test_render(self):
+        self.assertEqual(self.errcode_handler.renderMessage(self.mod_name, "OpenFailed", path = "/tmp/x", reason = "gone"),
+                         "Cannot open /tmp/x: 'gone' (100%)")
+        self.assertEqual(self.errcode_handler.renderMessage(self.mod_name, 2, 1, 3), "1 of 3")
+        self.assertEqual(self.errcode_handler.renderMessage(self.mod_name, 3, "x", count = 7), "x:    7")
+        self.assertEqual(self.errcode_handler.getMessage(self.mod_name, 1), "Cannot open {path}: {reason!r} (100%)")
+        self.assertRaises(KeyError, self.errcode_handler.renderMessage, self.mod_name, 1, path = "/tmp/x")
+        self.assertRaises(error_handling.ErrcodeHandleError, self.errcode_handler.renderMessage, self.mod_name, 4)
+
+    def test_deferred(self):
+        calls = []
+        class Path:
+            def __str__(self):
+                calls.append(1)
+                return "/tmp/x"
+
+        message = self.errcode_handler.deferMessage(self.mod_name, 1, path = Path(), reason = "gone")
+        self.assertEqual(calls, [])
+        self.assertEqual(str(message), "Cannot open /tmp/x: 'gone' (100%)")
+        self.assertEqual(str(message), "Cannot open /tmp/x: 'gone' (100%)")
+        self.assertEqual(calls, [1])
+
+    def test_bad_template(self):
+        self.assertRaises(error_handling.ErrcodeHandleError, self.errcode_handler.registerErrcode,
+                          self.mod_name, "Bad", "Unclosed {path", 5, True)
+        self.assertFalse("Bad" in self.errcode_handler.modules[self.mod_name].errcodes_key_name)
+
+    def test_bulk_and_frozen(self):
+        self.errcode_handler.registerErrcodes([(self.mod_name, "Bulk", "Bulk {0}", 6), (self.mod_name, "Generated", "Gen {0}")],
+                                              templates = True)
+        for compact in (False, True):
+            handler = error_handling.ErrcodeHandler()
+            handler.registerErrcodes([(self.mod_name, "Bulk", "Bulk {0}", 6), (self.mod_name, "Plain", "{0}", 7)])
+            handler.registerErrcode(self.mod_name, "Templated", "Templated {name}", 8, template = True)
+            handler.freeze(compact = compact)
+            self.assertEqual(handler.renderMessage(self.mod_name, "Templated", name = "x"), "Templated x")
+            self.assertRaises(error_handling.ErrcodeHandleError, handler.renderMessage, self.mod_name, 6, "x")
+        self.assertEqual(self.errcode_handler.renderMessage(self.mod_name, "Generated", "x"), "Gen x")
+
+    def test_exception_uses_template(self):
+        with self.assertRaises(error_handling.ErrcodeException) as context:
+            self.errcode_handler.raiseErrcode(self.mod_name, 1, path = "/tmp/x", reason = "gone")
+        self.assertEqual(str(context.exception), "Cannot open /tmp/x: 'gone' (100%)")
+
 class DieFunctionText(unittest.TestCase):
 
     def setUp(self):
@@ -178,6 +752,78 @@ class DieFunctionText(unittest.TestCase):
         with self.assertRaises(SystemExit):
             error_handling.die(self.mod_name, self.errcode_name)
 
+    def test_shutdown_hooks(self):
+        calls = []
+        def failing():
+            calls.append("failing")
+            raise RuntimeError("hook failed")
+        def flushing():
+            calls.append("flushing")
+
+        error_handling.registerShutdownHook(failing)
+        error_handling.registerShutdownHook(flushing)
+        try:
+            with self.assertRaises(SystemExit):
+                error_handling.die(self.mod_name, self.errcode_number)
+        finally:
+            error_handling.unregisterShutdownHook(failing)
+            error_handling.unregisterShutdownHook(flushing)
+        self.assertCountEqual(calls, ["failing", "flushing"])
+        self.assertEqual([x["status"] for x in error_handling.last_shutdown_report], ["failed", "done"])
+        self.assertFalse(flushing in error_handling.shutdown_hooks)
+
+    def test_hooks_concurrent_and_bounded(self):
+        release = threading.Event()
+        def slow():
+            time.sleep(0.2)
+        def stuck():
+            release.wait(5)
+        async def closing():
+            await asyncio.sleep(0.2)
+
+        reports = []
+        for hook in (slow, stuck, closing):
+            error_handling.registerShutdownHook(hook)
+        start = time.monotonic()
+        try:
+            with self.assertRaises(SystemExit):
+                error_handling.die(self.mod_name, self.errcode_number, timeout = 0.5, report = reports.append)
+        finally:
+            release.set()
+            for hook in (slow, stuck, closing):
+                error_handling.unregisterShutdownHook(hook)
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertEqual([(x["hook"].split(".")[-1], x["status"]) for x in reports[0]],
+                         [("slow", "done"), ("stuck", "timeout"), ("closing", "done")])
+        self.assertGreaterEqual(reports[0][0]["seconds"], 0.2)
+
+    def test_exit_code(self):
+        self.assertEqual(error_handling.exitCode(0), 0)
+        self.assertEqual(error_handling.exitCode(255), 255)
+        self.assertEqual(error_handling.exitCode(257), 1)
+        self.assertEqual(error_handling.exitCode(512), 1)
+        self.assertEqual(error_handling.exitCode(-1), 255)
+        with self.assertRaises(SystemExit) as context:
+            error_handling.die(self.mod_name, self.errcode_name)
+        self.assertEqual(context.exception.code, self.errcode_number)
+        with self.assertRaises(SystemExit) as context:
+            error_handling.die("unknown_mod", "Unknown")
+        self.assertEqual(context.exception.code, 1)
+
+    def test_die_from_thread(self):
+        code = ("import threading\n"
+                "from sharedlib import error_handling\n"
+                "error_handling.ErrcodeHandler.instance.registerErrcode('worker_mod', 'Failed', 'Worker failed', 300)\n"
+                "error_handling.registerShutdownHook(lambda: print('hook ran'))\n"
+                "thread = threading.Thread(target = error_handling.die, args = ('worker_mod', 'Failed'))\n"
+                "thread.start()\n"
+                "thread.join()\n"
+                "print('not reached')\n")
+        env = dict(os.environ, PYTHONPATH = os.pathsep.join(sys.path))
+        result = subprocess.run([sys.executable, "-c", code], capture_output = True, text = True, env = env, timeout = 30)
+        self.assertEqual(result.returncode, 300 % 256)
+        self.assertEqual(result.stdout, "hook ran\n")
+        self.assertIn("worker_mod: Failed: Worker failed", result.stderr)
 
     def test_mod_name_none(self):
         self.assertRaises(ValueError,
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.append(pathlib.Path.cwd().parent.parent.__str__())
+import sharedlib
+
+class ProjectHeadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.temp_dir.name).resolve()
+        self.project_dir = self.root / "proj"
+        self.deep_dir = self.project_dir / "a" / "b" / "c"
+        self.deep_dir.mkdir(parents=True)
+        sharedlib.clear_project_head_cache()
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        self.temp_dir.cleanup()
+        sharedlib.clear_project_head_cache()
+
+    def test_get_project_head_found(self):
+        os.chdir(self.deep_dir)
+        found, path = sharedlib.get_project_head("proj")
+        self.assertTrue(found)
+        self.assertEqual(path, self.project_dir)
+
+    def test_get_project_head_deepest_match(self):
+        nested = self.deep_dir / "proj" / "d"
+        nested.mkdir(parents=True)
+        os.chdir(nested)
+        found, path = sharedlib.get_project_head("proj")
+        self.assertTrue(found)
+        self.assertEqual(path, self.deep_dir / "proj")
+
+    def test_get_project_head_not_found(self):
+        os.chdir(self.deep_dir)
+        self.assertEqual(sharedlib.get_project_head("not_a_dir_name"), (False, None))
+
+    def test_get_project_head_none(self):
+        self.assertRaises(ValueError, sharedlib.get_project_head, None)
+
+    def test_get_project_head_cache_invalidated_on_chdir(self):
+        os.chdir(self.deep_dir)
+        first = sharedlib.get_project_head("a")
+        self.assertIs(first, sharedlib.get_project_head("a"))
+
+        os.chdir(self.project_dir)
+        self.assertEqual(sharedlib.get_project_head("a"), (False, None))
+
+    def test_find_project_root_marker(self):
+        (self.project_dir / "pyproject.toml").touch()
+        os.chdir(self.deep_dir)
+        found, path = sharedlib.find_project_root()
+        self.assertTrue(found)
+        self.assertEqual(path, self.project_dir)
+
+    def test_find_project_root_custom_marker(self):
+        (self.deep_dir.parent / "setup.cfg").touch()
+        os.chdir(self.deep_dir)
+        found, path = sharedlib.find_project_root("setup.cfg")
+        self.assertTrue(found)
+        self.assertEqual(path, self.deep_dir.parent)
+
+    def test_find_project_root_empty_markers(self):
+        self.assertRaises(ValueError, sharedlib.find_project_root, [])
+
+class LazyImportTest(unittest.TestCase):
+
+    #Modules in sys.modules after running "code" in a fresh interpreter.
+    def importedBy(self, code):
+        env = dict(os.environ, PYTHONPATH = os.pathsep.join(sys.path))
+        result = subprocess.run([sys.executable, "-c", code + "\nimport sys\nprint(' '.join(sys.modules))"],
+                                capture_output = True, text = True, env = env, check = True)
+        return set(result.stdout.split())
+
+    def test_package_import(self):
+        imported = self.importedBy("import sharedlib")
+        for name in ("pathlib", "pyrsistent", "sharedlib.error_handling", "sharedlib.project_management"):
+            self.assertNotIn(name, imported)
+
+    def test_error_handling_import(self):
+        imported = self.importedBy("import sharedlib.error_handling")
+        self.assertNotIn("pyrsistent", imported)
+        self.assertIn("sharedlib.conflict_resolution", imported)
+
+    def test_submodule_attribute(self):
+        imported = self.importedBy("import sharedlib\nsharedlib.error_handling.ErrcodeHandler")
+        self.assertIn("sharedlib.error_handling", imported)
+        self.assertIn("error_handling", dir(sharedlib))
+        self.assertRaises(AttributeError, getattr, sharedlib, "missing")
+
+if __name__ == "__main__":
+    unittest.main(exit=False)